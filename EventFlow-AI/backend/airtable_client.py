@@ -0,0 +1,220 @@
+"""Shared Airtable API client for EventFlow-AI
+
+All Airtable traffic goes through one AirtableClient so that requests reuse
+keep-alive connections, stay under Airtable's per-base rate limit and retry
+on 429/5xx responses with exponential backoff. Requests go through the
+``airtable`` circuit breaker and are cut short by the caller's deadline (see
+resilience.py).
+"""
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional
+
+import resilience
+from config_loader import load_config
+from rate_limit import TokenBucket
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+AIRTABLE_API_URL = "https://api.airtable.com/v0"
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+MAX_RECORDS_PER_REQUEST = 10
+
+
+class AirtableError(Exception):
+    """Raised when an Airtable request fails after all retries"""
+
+
+class AirtableCircuitOpen(AirtableError, resilience.CircuitOpen):
+    """Raised without sending while the ``airtable`` circuit breaker is open
+
+    Caught as either an ``AirtableError`` or a ``CircuitOpen``; jobs that let
+    it through are postponed rather than failed (see jobs.py).
+    """
+
+
+class AirtableClient:
+    """Pooled, rate-limited client for a single Airtable base"""
+
+    def __init__(self, api_key: Optional[str], base_id: Optional[str], rate_limit: float = 5,
+                 timeout: float = 30, retry_attempts: int = 3, pool_size: int = 10,
+                 base_url: str = AIRTABLE_API_URL):
+        self.api_key = api_key
+        self.base_id = base_id
+        self.timeout = timeout
+        self.retry_attempts = retry_attempts
+        self.base_url = base_url.rstrip('/')
+        self.limiter = TokenBucket(rate_limit)
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> 'requests.Session':
+        """Pooled HTTP session, created on first use to keep startup fast"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    session.headers.update({
+                        "Authorization": f"Bearer {self.api_key}",
+                        "Content-Type": "application/json"
+                    })
+                    self._session = session
+        return self._session
+
+    @classmethod
+    def from_config(cls, api_key: Optional[str], base_id: Optional[str], **kwargs) -> 'AirtableClient':
+        """Build a client using ``api_settings`` from config/airtable_config.json"""
+        settings = load_config('airtable_config.json').get('airtable', {}).get('api_settings', {})
+        options = {
+            'rate_limit': settings.get('rate_limit', 5),
+            'timeout': settings.get('timeout', 30),
+            'retry_attempts': settings.get('retry_attempts', 3)
+        }
+        options.update(kwargs)
+        return cls(api_key, base_id, **options)
+
+    @property
+    def configured(self) -> bool:
+        """Whether credentials are available"""
+        return bool(self.api_key and self.base_id)
+
+    def table_url(self, table: str, record_id: Optional[str] = None) -> str:
+        url = f"{self.base_url}/{self.base_id}/{table}"
+        if record_id:
+            url = f"{url}/{record_id}"
+        return url
+
+    def request(self, method: str, table: str, record_id: Optional[str] = None,
+                timeout: Optional[float] = None, **kwargs) -> 'requests.Response':
+        """Send a rate-limited request, retrying 429/5xx and connection errors
+
+        Retries stop early when the current deadline leaves no time for the
+        backoff and another attempt.
+
+        Returns:
+            The final response; callers check ``status_code`` themselves
+
+        Raises:
+            AirtableCircuitOpen: If the circuit breaker is open
+            AirtableError: If every attempt failed with a connection error
+                or the deadline has passed
+        """
+        import requests
+
+        url = self.table_url(table, record_id)
+        timeout = timeout if timeout is not None else self.timeout
+        last_error = None
+        response = None
+
+        for attempt in range(self.retry_attempts + 1):
+            self.limiter.acquire()
+            response = None
+            try:
+                call_timeout = resilience.timeout(timeout)
+                with resilience.guarded_call('airtable', f"{method} {table}") as call:
+                    response = self.session.request(method, url, timeout=call_timeout, **kwargs)
+                    call.status = response.status_code
+            except resilience.CircuitOpen as e:
+                raise AirtableCircuitOpen(e.dependency, e.retry_after) from e
+            except resilience.DeadlineExceeded as e:
+                raise AirtableError(f"Airtable {method} {table} not sent: {str(e)}") from e
+            except requests.RequestException as e:
+                last_error = e
+                logger.warning(f"Airtable {method} {table} failed (attempt {attempt + 1}): {str(e)}")
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.retry_attempts:
+                    return response
+                logger.warning(f"Airtable {method} {table} returned {response.status_code} (attempt {attempt + 1})")
+
+            if attempt < self.retry_attempts:
+                delay = self._backoff(attempt, response)
+                if not resilience.can_wait(delay):
+                    break
+                time.sleep(delay)
+
+        if response is not None:
+            return response
+        raise AirtableError(f"Airtable {method} {table} failed: {last_error}")
+
+    @staticmethod
+    def _backoff(attempt: int, response: Optional['requests.Response']) -> float:
+        """Seconds to wait before the next attempt, honouring Retry-After"""
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return min(30.0, 0.5 * 2 ** attempt)
+
+    def create(self, table: str, fields: Dict[str, Any], **kwargs) -> 'requests.Response':
+        """Create a single record"""
+        return self.request('POST', table, json={"fields": fields}, **kwargs)
+
+    def update(self, table: str, record_id: str, fields: Dict[str, Any], **kwargs) -> 'requests.Response':
+        """Patch a single record"""
+        return self.request('PATCH', table, record_id, json={"fields": fields}, **kwargs)
+
+    def create_records(self, table: str, fields_list: List[Dict[str, Any]], **kwargs) -> 'requests.Response':
+        """Create up to 10 records in a single request"""
+        if len(fields_list) > MAX_RECORDS_PER_REQUEST:
+            raise ValueError(f"Airtable accepts at most {MAX_RECORDS_PER_REQUEST} records per request")
+        records = [{"fields": fields} for fields in fields_list]
+        return self.request('POST', table, json={"records": records}, **kwargs)
+
+    def update_records(self, table: str, updates: List[Dict[str, Any]], **kwargs) -> 'requests.Response':
+        """Patch up to 10 records, each given as ``{"id": ..., "fields": {...}}``"""
+        if len(updates) > MAX_RECORDS_PER_REQUEST:
+            raise ValueError(f"Airtable accepts at most {MAX_RECORDS_PER_REQUEST} records per request")
+        return self.request('PATCH', table, json={"records": updates}, **kwargs)
+
+    def list_page(self, table: str, fields: Optional[List[str]] = None, page_size: int = 100,
+                  offset: Optional[str] = None, **params) -> Dict[str, Any]:
+        """Fetch one page of records
+
+        Returns:
+            The Airtable response body: ``records`` plus ``offset`` if more pages remain
+
+        Raises:
+            AirtableError: If Airtable returns an error status
+        """
+        query: Dict[str, Any] = {"pageSize": min(page_size, 100)}
+        if fields:
+            query["fields[]"] = fields
+        if offset:
+            query["offset"] = offset
+        query.update(params)
+        response = self.request('GET', table, params=query)
+        if response.status_code != 200:
+            raise AirtableError(f"Airtable error: {response.text}")
+        return response.json()
+
+    def iter_records(self, table: str, fields: Optional[List[str]] = None, **params) -> Iterator[Dict[str, Any]]:
+        """Lazily yield every record in a table, following ``offset`` cursors"""
+        offset = None
+        while True:
+            page = self.list_page(table, fields=fields, offset=offset, **params)
+            yield from page.get('records', [])
+            offset = page.get('offset')
+            if not offset:
+                return
+
+    def find(self, table: str, formula: str, **kwargs) -> List[Dict[str, Any]]:
+        """Return records matching an Airtable formula"""
+        response = self.request('GET', table, params={"filterByFormula": formula}, **kwargs)
+        if response.status_code != 200:
+            logger.error(f"Airtable error: {response.text}")
+            return []
+        return response.json().get('records', [])
@@ -0,0 +1,197 @@
+"""Background synchronisation between the local store and Airtable
+
+Each cycle pushes locally changed rows through the batch writer, then pulls
+records Airtable reports as modified since the previous pull using
+``LAST_MODIFIED_TIME()``.
+"""
+import logging
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows; only single-process servers are supported there
+    fcntl = None
+
+from local_store import LocalStore
+from write_buffer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+# Re-read a little before the last pull to cover clock skew with Airtable
+PULL_OVERLAP = timedelta(seconds=30)
+
+
+class ProcessLock:
+    """Advisory file lock held by at most one process at a time"""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        if not self.path or fcntl is None:
+            return True
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a')
+        try:
+            fcntl.flock(self._file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            self._file.close()
+            self._file = None
+            return False
+        return True
+
+    def release(self):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class AirtableSyncer:
+    """Keeps a LocalStore and an Airtable base in step
+
+    When several processes share the store, give each the same ``lock_path``
+    so only one of them syncs at a time; otherwise they would push the same
+    unsynced rows concurrently and create duplicates in Airtable.
+
+    ``on_pull(table, local_id, record)`` is called for every local row a pull
+    changes, and ``on_push(table, local_id, record)`` with the Airtable record
+    returned for every row a push sends.
+    """
+
+    def __init__(self, store: LocalStore, client, writer: BatchWriter, interval: float = 5,
+                 push_batch: int = 100, lock_path: Optional[str] = None,
+                 on_pull: Optional[Callable[[str, int, Dict[str, Any]], None]] = None,
+                 on_push: Optional[Callable[[str, int, Dict[str, Any]], None]] = None):
+        self.store = store
+        self.client = client
+        self.writer = writer
+        self.interval = interval
+        self.push_batch = push_batch
+        self.on_pull = on_pull
+        self.on_push = on_push
+        self.last_sync: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._sync_lock = threading.Lock()
+        self._process_lock = ProcessLock(lock_path)
+
+    def push(self, table: str) -> int:
+        """Send unpushed local changes for one table
+
+        Returns:
+            The number of records pushed
+        """
+        pushed = 0
+        while True:
+            records = self.store.dirty(table, limit=self.push_batch)
+            if not records:
+                return pushed
+            pending = []
+            for record in records:
+                if record['airtableId']:
+                    future = self.writer.update(table, record['airtableId'], record['fields'])
+                else:
+                    future = self.writer.create(table, record['fields'])
+                pending.append((record, future))
+
+            failed = 0
+            for record, future in pending:
+                try:
+                    remote = future.result(timeout=self.client.timeout * 2)
+                except Exception as e:
+                    failed += 1
+                    logger.error(f"Error pushing {table} record {record['localId']}: {str(e)}")
+                    continue
+                self.store.mark_synced(table, record['localId'], record['version'], remote['id'])
+                pushed += 1
+                if self.on_push is not None:
+                    self.on_push(table, record['localId'], remote)
+            if failed:
+                # Leave the rest for the next cycle rather than spinning on errors
+                return pushed
+
+    def pull(self, table: str) -> int:
+        """Apply records modified in Airtable since the last pull
+
+        Returns:
+            The number of local records changed
+        """
+        state_key = f"pull:{table}"
+        since = self.store.get_state(state_key)
+        started = datetime.now(timezone.utc)
+        params: Dict[str, Any] = {}
+        if since:
+            params['filterByFormula'] = f"IS_AFTER(LAST_MODIFIED_TIME(), '{since}')"
+
+        changed = 0
+        for record in self.client.iter_records(table, **params):
+            local_id = self.store.apply_remote(table, record)
+            if local_id is None:
+                continue
+            changed += 1
+            if self.on_pull is not None:
+                self.on_pull(table, local_id, record)
+        self.store.set_state(state_key, (started - PULL_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z'))
+        return changed
+
+    def sync_once(self):
+        """Push then pull every table, unless another process is already syncing"""
+        with self._sync_lock:
+            if not self._process_lock.acquire(blocking=False):
+                return
+            try:
+                for table in self.store.schemas:
+                    try:
+                        self.push(table)
+                        self.pull(table)
+                    except Exception as e:
+                        self.last_error = f"{table}: {str(e)}"
+                        logger.error(f"Error syncing {table}: {str(e)}")
+                self.last_sync = datetime.now().isoformat()
+            finally:
+                self._process_lock.release()
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                self.sync_once()
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name='eventflow-airtable-sync', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 30.0):
+        """Stop the sync thread after a final push of local changes"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        with self._sync_lock:
+            self._process_lock.acquire()
+            try:
+                for table in self.store.schemas:
+                    try:
+                        self.push(table)
+                    except Exception as e:
+                        logger.error(f"Error pushing {table} on shutdown: {str(e)}")
+            finally:
+                self._process_lock.release()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'running': self._thread is not None,
+            'lastSync': self.last_sync,
+            'lastError': self.last_error,
+            'unsynced': self.store.dirty_count()
+        }
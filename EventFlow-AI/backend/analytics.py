@@ -0,0 +1,273 @@
+"""Daily Analytics rollup for EventFlow-AI
+
+The webhook handlers write call, SMS and analysis events to the event log
+(event_log.py). ``AnalyticsRollup`` tails that log in a background thread
+and folds each event into running totals for its day: sums and counts, plus
+a bounded top-k sketch of the detected categories, so memory stays the same
+however busy the day. Once a day is over its totals are written as one row
+of the Analytics table (through the local store, synced to Airtable like
+every other table). Any past day still in the event log can be recomputed.
+
+Fields, per local calendar day:
+
+- ``TotalCalls`` / ``TotalSMS``: inbound calls and messages
+- ``TranscriptionsProcessed`` / ``AvgConfidence``: call transcripts stored
+  and their mean confidence
+- ``TopCategories``: the most frequently detected categories
+- ``ResponseTime``: mean milliseconds taken to answer the voice and SMS
+  webhooks
+
+Recompute from the command line:
+    python analytics.py --recompute 2024-06-01 --until 2024-06-07
+"""
+import argparse
+import logging
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from airtable_sync import ProcessLock
+from event_log import EventLog
+from local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'Analytics'
+CURSOR_STATE = 'analytics:cursor'
+EVENT_TYPES = ('incoming_call', 'incoming_sms', 'call_transcribed', 'lead_analyzed')
+
+
+class TopK:
+    """Space-Saving sketch of the most frequent keys
+
+    Tracks at most ``capacity`` keys. When a new key arrives and the sketch
+    is full it replaces the least frequent one, inheriting its count, so the
+    counts of frequent keys are exact or slightly over.
+    """
+
+    def __init__(self, capacity: int = 32):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+
+    def add(self, key: str, count: int = 1):
+        if key in self.counts or len(self.counts) < self.capacity:
+            self.counts[key] = self.counts.get(key, 0) + count
+            return
+        smallest = min(self.counts, key=self.counts.__getitem__)
+        self.counts[key] = self.counts.pop(smallest) + count
+
+    def top(self, n: int) -> List[Tuple[str, int]]:
+        """The ``n`` most frequent keys, most frequent first"""
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:n]
+
+
+class DayTotals:
+    """Running totals for one day"""
+
+    def __init__(self, day: date, sketch_size: int = 32):
+        self.day = day
+        self.calls = 0
+        self.sms = 0
+        self.transcriptions = 0
+        self.confidence_sum = 0.0
+        self.confidence_count = 0
+        self.response_sum = 0.0
+        self.response_count = 0
+        self.categories = TopK(sketch_size)
+
+    def add(self, event: Dict[str, Any]):
+        kind = event['type']
+        data = event.get('data') or {}
+        if kind in ('incoming_call', 'incoming_sms'):
+            if kind == 'incoming_call':
+                self.calls += 1
+            else:
+                self.sms += 1
+            if data.get('response_ms') is not None:
+                self.response_sum += data['response_ms']
+                self.response_count += 1
+        elif kind == 'call_transcribed':
+            self.transcriptions += 1
+            if data.get('confidence') is not None:
+                self.confidence_sum += data['confidence']
+                self.confidence_count += 1
+        elif kind == 'lead_analyzed':
+            for category in data.get('categories') or []:
+                self.categories.add(category)
+
+    def fields(self, top_categories: int = 5) -> Dict[str, Any]:
+        """The day's Analytics row"""
+        return {
+            'Date': self.day.isoformat(),
+            'TotalCalls': self.calls,
+            'TotalSMS': self.sms,
+            'TranscriptionsProcessed': self.transcriptions,
+            'AvgConfidence': (round(self.confidence_sum / self.confidence_count, 3)
+                              if self.confidence_count else None),
+            'TopCategories': ', '.join(category for category, _ in self.categories.top(top_categories)) or None,
+            'ResponseTime': round(self.response_sum / self.response_count, 1) if self.response_count else None
+        }
+
+
+def day_of(timestamp: float) -> date:
+    return datetime.fromtimestamp(timestamp).date()
+
+
+def day_start(day: date) -> float:
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+class AnalyticsRollup:
+    """Turns the event log into one Analytics row per day
+
+    Events are read ``lag`` seconds behind real time, giving every process
+    time to write its buffered events out first. The read position is kept
+    in the store, so a restart re-reads only the current day. When several
+    processes share the store, give each the same ``lock_path`` so only one
+    of them rolls up.
+    """
+
+    def __init__(self, store: LocalStore, event_log: EventLog, interval: float = 60, lag: float = 10,
+                 top_categories: int = 5, sketch_size: int = 32, lock_path: Optional[str] = None):
+        self.store = store
+        self.event_log = event_log
+        self.interval = interval
+        self.lag = lag
+        self.top_categories = top_categories
+        self.sketch_size = sketch_size
+        self.last_error: Optional[str] = None
+        self._totals: Optional[DayTotals] = None
+        self._cursor: Optional[float] = None
+        self._lock = threading.Lock()
+        self._process_lock = ProcessLock(lock_path)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def save_day(self, totals: DayTotals) -> Dict[str, Any]:
+        """Write a day's row, replacing any earlier row for that date"""
+        fields = totals.fields(self.top_categories)
+        if self.store.update_latest_by(TABLE, 'Date', fields['Date'], fields) is None:
+            self.store.insert(TABLE, fields)
+        return fields
+
+    def recompute(self, day: date) -> Dict[str, Any]:
+        """Rebuild one day's row from the stored events
+
+        Returns:
+            The fields written
+        """
+        totals = DayTotals(day, self.sketch_size)
+        since = day_start(day)
+        until = day_start(day + timedelta(days=1))
+        for event in self.event_log.query(EVENT_TYPES, since, until):
+            if event['time'] < until:
+                totals.add(event)
+        return self.save_day(totals)
+
+    def _consume(self, events: Iterable[Dict[str, Any]], until: float):
+        for event in events:
+            if event['time'] <= self._cursor:
+                continue
+            day = day_of(event['time'])
+            if self._totals is None or day != self._totals.day:
+                self._roll_over(day)
+            self._totals.add(event)
+        # Days that passed without events still get a row
+        if self._totals is None or day_of(until) != self._totals.day:
+            self._roll_over(day_of(until))
+        self._cursor = until
+        self.store.set_state(CURSOR_STATE, repr(until))
+
+    def _roll_over(self, day: date):
+        if self._totals is not None:
+            self.save_day(self._totals)
+            for missing in range(1, (day - self._totals.day).days):
+                self.save_day(DayTotals(self._totals.day + timedelta(days=missing)))
+        self._totals = DayTotals(day, self.sketch_size)
+
+    def run_once(self) -> bool:
+        """Fold in the events logged since the last run
+
+        Returns:
+            False if another process holds the rollup lock
+        """
+        with self._lock:
+            if not self._process_lock.acquire(blocking=False):
+                # Whoever holds it moves the cursor; start over from the store when it is ours again
+                self._totals = self._cursor = None
+                return False
+            try:
+                if self._cursor is None:
+                    saved = self.store.get_state(CURSOR_STATE)
+                    resume = float(saved) if saved else time.time() - self.lag
+                    # Re-read the day so far to rebuild its totals
+                    self._totals = None
+                    self._cursor = day_start(day_of(resume)) - 1e-6
+                until = time.time() - self.lag
+                if until > self._cursor:
+                    self._consume(self.event_log.query(EVENT_TYPES, self._cursor, until), until)
+                self.last_error = None
+                return True
+            except Exception as e:
+                self.last_error = str(e)
+                self._totals = self._cursor = None
+                raise
+            finally:
+                self._process_lock.release()
+
+    def today(self) -> Optional[Dict[str, Any]]:
+        """Totals for the day in progress, as of the last run"""
+        with self._lock:
+            return self._totals.fields(self.top_categories) if self._totals is not None else None
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.run_once()
+                except Exception as e:
+                    logger.error(f"Error rolling up analytics: {str(e)}")
+                self._stop.wait(self.interval)
+
+        self._thread = threading.Thread(target=run, name='eventflow-analytics', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+def main():
+    from dotenv import load_dotenv
+    from settings import Settings
+
+    parser = argparse.ArgumentParser(description="Recompute EventFlow AI daily Analytics rows from the event log")
+    parser.add_argument('--recompute', required=True, help="first day to rebuild (YYYY-MM-DD)")
+    parser.add_argument('--until', help="last day to rebuild (default: the same day)")
+    args = parser.parse_args()
+
+    load_dotenv()
+    settings = Settings.from_env()
+    try:
+        first = date.fromisoformat(args.recompute)
+        last = date.fromisoformat(args.until) if args.until else first
+    except ValueError as e:
+        parser.error(str(e))
+    rollup = AnalyticsRollup(LocalStore(settings.local_store_path), EventLog(settings.event_log_dir))
+    day = first
+    while day <= last:
+        fields = rollup.recompute(day)
+        print(f"{fields['Date']}: {fields['TotalCalls']} calls, {fields['TotalSMS']} SMS, "
+              f"{fields['TranscriptionsProcessed']} transcripts, top: {fields['TopCategories'] or '-'}")
+        day += timedelta(days=1)
+    print("\nRows are pushed to Airtable by the running server's sync")
+
+
+if __name__ == "__main__":
+    main()
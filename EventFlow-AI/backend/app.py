@@ -1,79 +1,217 @@
-from flask import Flask, request, jsonify
+"""EventFlow AI API server
+
+``create_app()`` builds the Flask app. Heavy SDKs (AssemblyAI, Twilio TwiML,
+requests) are imported on first use, and the per-process services are
+created by ``init_services()``: immediately for a single-process server, or
+after forking in each worker when run under ``run.py``.
+"""
+from flask import Blueprint, Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-import os
-from dotenv import load_dotenv
-from twilio.twiml.voice_response import VoiceResponse
-import assemblyai as aai
-import requests
+from flask_sock import Sock
+import atexit
+import hmac
 import json
+import logging
+import os
+import time
 from datetime import datetime
-from config_validator import ConfigValidator
+from typing import Optional
+from event_log import parse_time
+from idempotency import IdempotencyCache
+from leads import InvalidQuery
+from metrics import REGISTRY, HTTP_LATENCY, HTTP_REQUESTS
+from reports import ReportQuery
+from resilience import CircuitOpen, breaker, end_deadline, start_deadline
+from services import Services
+from settings import Settings, load_settings
+
+logger = logging.getLogger(__name__)
+
+api = Blueprint('api', __name__)
+sock = Sock()
+webhook_cache = IdempotencyCache()
 
-# Load environment variables
-load_dotenv()
+# This process's services, set by init_services()
+services: Optional[Services] = None
 
-# Validate configuration before starting
-ConfigValidator.validate_or_exit()
+def create_app(settings: Optional[Settings] = None, start_services: bool = True) -> Flask:
+    """Build the Flask app
 
-app = Flask(__name__)
-CORS(app)
+    Args:
+        settings: Configuration; loaded from the environment when omitted
+        start_services: Create this process's services now. Pre-forking
+            servers pass False and call ``init_services`` in each worker.
+    """
+    settings = settings or load_settings()
+    app = Flask(__name__)
+    CORS(app)
+    app.config['SECRET_KEY'] = settings.flask_secret_key
+    app.config['EVENTFLOW_SETTINGS'] = settings
+    app.register_blueprint(api)
+    if start_services:
+        init_services(settings)
+    return app
 
-# Configuration
-TWILIO_ACCOUNT_SID = os.getenv('TWILIO_ACCOUNT_SID')
-TWILIO_AUTH_TOKEN = os.getenv('TWILIO_AUTH_TOKEN')
-TWILIO_PHONE_NUMBER = os.getenv('TWILIO_PHONE_NUMBER')
-ASSEMBLYAI_API_KEY = os.getenv('ASSEMBLYAI_API_KEY')
-AIRTABLE_API_KEY = os.getenv('AIRTABLE_API_KEY')
-AIRTABLE_BASE_ID = os.getenv('AIRTABLE_BASE_ID')
+def init_services(settings: Settings, recover_jobs: bool = True) -> Services:
+    """Create and start this process's services (once per process)"""
+    global services
+    if services is None:
+        services = Services(settings, recover=recover_jobs)
+        webhook_cache.backend = services.webhook_backend
+        services.worker_pool.register('process_recording', process_recording)
+        services.worker_pool.register('complete_transcription', complete_transcription)
+        services.worker_pool.register('resolve_call_transcript', resolve_call_transcript)
+        services.worker_pool.register('process_transcription', process_transcription)
+        services.worker_pool.register('process_sms_message', process_sms_message)
+        services.worker_pool.register('analyze_deferred', analyze_deferred)
+        services.worker_pool.register('update_lead_categories', update_lead_categories)
+        services.media_streams.register(start_live_transcript, update_live_transcript, finish_live_transcript)
+        services.start()
+        atexit.register(services.shutdown)
+    return services
 
-# Initialize AssemblyAI
-aai.settings.api_key = ASSEMBLYAI_API_KEY
+def shutdown_services():
+    """Drain background work before the process exits"""
+    if services is not None:
+        services.shutdown()
 
-@app.route('/')
+def preload_sdks():
+    """Import the heavy SDKs up front, e.g. in a pre-fork master"""
+    import assemblyai  # noqa: F401
+    import requests  # noqa: F401
+    import twilio.rest  # noqa: F401
+    from twilio.twiml.voice_response import VoiceResponse  # noqa: F401
+    from websockets.sync.client import connect  # noqa: F401
+
+@api.before_app_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Twilio waits 15 seconds for a webhook; outbound calls made while
+    # answering one must give up well before that
+    if request.method == 'POST' and request.path.startswith('/webhook/') and services is not None:
+        g.deadline_token = start_deadline(services.settings.webhook_deadline or None)
+
+@api.teardown_app_request
+def end_request_deadline(exc):
+    token = g.pop('deadline_token', None)
+    if token is not None:
+        end_deadline(token)
+
+@api.after_app_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # Label by URL rule, not path, so ids in URLs do not create new series
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route)
+        HTTP_REQUESTS.inc(method=request.method, route=route, status=response.status_code)
+    return response
+
+@api.route('/')
 def home():
     return jsonify({"message": "EventFlow AI API Server", "status": "running"})
 
-@app.route('/webhook/twilio/voice', methods=['POST'])
+@api.route('/webhook/twilio/voice', methods=['POST'])
+@webhook_cache.idempotent('CallSid')
 def twilio_voice_webhook():
     """Handle incoming voice calls from Twilio"""
     try:
+        from twilio.twiml.voice_response import VoiceResponse
+        
         from_number = request.form.get('From')
         call_sid = request.form.get('CallSid')
         
         # Create TwiML response
         response = VoiceResponse()
         response.say("Thank you for calling EventFlow AI. Please tell us about your event planning needs.")
-        response.record(
-            action='/webhook/twilio/recording',
-            method='POST',
-            max_length=60,
-            transcribe=True,
-            transcribe_callback='/webhook/twilio/transcription'
-        )
+        # While AssemblyAI is failing, record the call to transcribe later instead
+        if services.settings.realtime_transcription and not breaker('assemblyai').is_open:
+            from twilio.twiml.voice_response import Connect
+            # Transcribe while the caller talks; Twilio requests the action
+            # URL when the stream ends
+            connect = Connect(action='/webhook/twilio/stream-ended', method='POST')
+            stream = connect.stream(url=media_stream_url())
+            stream.parameter(name='from', value=from_number)
+            response.append(connect)
+        else:
+            record_call(response)
         
         # Log the incoming call
         log_call_event('incoming_call', {
             'from_number': from_number,
             'call_sid': call_sid,
+            'response_ms': response_ms(),
             'timestamp': datetime.now().isoformat()
         })
         
         return str(response)
         
     except Exception as e:
-        app.logger.error(f"Error handling voice webhook: {str(e)}")
+        logger.error(f"Error handling voice webhook: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/webhook/twilio/recording', methods=['POST'])
+def record_call(response):
+    """Add the recording prompt for batch transcription to a TwiML response"""
+    record_options = {}
+    if services.settings.twilio_transcribe:
+        record_options = {'transcribe': True, 'transcribe_callback': '/webhook/twilio/transcription'}
+    response.record(
+        action='/webhook/twilio/recording',
+        method='POST',
+        max_length=60,
+        **record_options
+    )
+
+def media_stream_url():
+    """The wss:// URL Twilio streams call audio to"""
+    base_url = services.settings.public_base_url or request.url_root.rstrip('/')
+    return 'ws' + base_url[len('http'):] + '/webhook/twilio/media-stream'
+
+@sock.route('/webhook/twilio/media-stream', bp=api)
+def twilio_media_stream(websocket):
+    """Relay a call's audio from Twilio Media Streams to live transcription"""
+    services.media_streams.run(websocket)
+
+@api.route('/webhook/twilio/stream-ended', methods=['POST'])
+@webhook_cache.idempotent('CallSid')
+def twilio_stream_ended_webhook():
+    """Finish a streamed call, or record it if live transcription never started"""
+    try:
+        from twilio.twiml.voice_response import VoiceResponse
+        
+        call_sid = request.form.get('CallSid')
+        
+        response = VoiceResponse()
+        if services.local_store.find_by('Transcripts', 'MessageID', call_sid):
+            response.say("Thank you for your message. We'll get back to you shortly.")
+            response.hangup()
+        else:
+            logger.warning(f"No live transcript for {call_sid}; recording the call instead")
+            record_call(response)
+        
+        return str(response)
+        
+    except Exception as e:
+        logger.error(f"Error handling stream end webhook: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/webhook/twilio/recording', methods=['POST'])
+@webhook_cache.idempotent('RecordingSid', 'CallSid')
 def twilio_recording_webhook():
     """Handle recording completion"""
     try:
+        from twilio.twiml.voice_response import VoiceResponse
+        
         recording_url = request.form.get('RecordingUrl')
         call_sid = request.form.get('CallSid')
         from_number = request.form.get('From')
         
-        # Process recording with AssemblyAI
-        process_recording(recording_url, call_sid, from_number)
+        # Process recording with AssemblyAI in the background
+        services.job_queue.enqueue('process_recording', {
+            'recording_url': recording_url,
+            'call_sid': call_sid,
+            'from_number': from_number
+        })
         
         response = VoiceResponse()
         response.say("Thank you for your message. We'll get back to you shortly.")
@@ -82,10 +220,11 @@ def twilio_recording_webhook():
         return str(response)
         
     except Exception as e:
-        app.logger.error(f"Error handling recording webhook: {str(e)}")
+        logger.error(f"Error handling recording webhook: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/webhook/twilio/transcription', methods=['POST'])
+@api.route('/webhook/twilio/transcription', methods=['POST'])
+@webhook_cache.idempotent('TranscriptionSid', 'CallSid')
 def twilio_transcription_webhook():
     """Handle transcription results"""
     try:
@@ -93,17 +232,46 @@ def twilio_transcription_webhook():
         call_sid = request.form.get('CallSid')
         confidence = request.form.get('Confidence')
         
-        if transcription_text and float(confidence) > 0.7:
-            # Process the transcription
-            process_transcription(transcription_text, call_sid)
+        if services.settings.twilio_transcribe:
+            accepted = transcription_text and float(confidence) > 0.7
+            # Process the transcription in the background; rejected ones are
+            # reported too, so the call need not wait for them
+            services.job_queue.enqueue('process_transcription', {
+                'text': transcription_text if accepted else None,
+                'call_sid': call_sid,
+                'confidence': float(confidence) if accepted else None,
+                'from_number': request.form.get('From')
+            })
         
         return jsonify({"status": "success"})
         
     except Exception as e:
-        app.logger.error(f"Error handling transcription webhook: {str(e)}")
+        logger.error(f"Error handling transcription webhook: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/webhook/twilio/sms', methods=['POST'])
+@api.route('/webhook/assemblyai/transcript', methods=['POST'])
+def assemblyai_transcript_webhook():
+    """Handle AssemblyAI transcript completion callbacks"""
+    try:
+        secret = services.settings.assemblyai_webhook_secret
+        if secret and not hmac.compare_digest(request.args.get('token', ''), secret):
+            return jsonify({"error": "Invalid token"}), 403
+
+        data = request.get_json(silent=True) or {}
+        transcript_id = data.get('transcript_id')
+        if not transcript_id:
+            return jsonify({"error": "transcript_id is required"}), 400
+
+        # Unknown ids are acknowledged so AssemblyAI does not keep retrying
+        known = services.transcriptions.handle_callback(transcript_id, data.get('status'))
+        return jsonify({"status": "success" if known else "ignored"})
+
+    except Exception as e:
+        logger.error(f"Error handling AssemblyAI webhook: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/webhook/twilio/sms', methods=['POST'])
+@webhook_cache.idempotent('MessageSid')
 def twilio_sms_webhook():
     """Handle incoming SMS messages"""
     try:
@@ -111,241 +279,567 @@ def twilio_sms_webhook():
         message_body = request.form.get('Body')
         message_sid = request.form.get('MessageSid')
         
-        # Process SMS message
-        process_sms_message(message_body, from_number, message_sid)
+        # Process SMS message in the background
+        services.job_queue.enqueue('process_sms_message', {
+            'text': message_body,
+            'from_number': from_number,
+            'message_sid': message_sid
+        })
         
         # Auto-respond
         response = f"Thanks for your message! We'll get back to you shortly about your event planning needs."
         
+        log_call_event('incoming_sms', {
+            'from_number': from_number,
+            'message_sid': message_sid,
+            'response_ms': response_ms(),
+            'timestamp': datetime.now().isoformat()
+        })
+        
         return jsonify({"message": response})
         
     except Exception as e:
-        app.logger.error(f"Error handling SMS webhook: {str(e)}")
+        logger.error(f"Error handling SMS webhook: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
 def process_recording(recording_url, call_sid, from_number):
-    """Process voice recording with AssemblyAI"""
+    """Normalize a voice recording and submit it to AssemblyAI
+
+    Recordings transcribed before (by content) are answered from the
+    transcript cache. Otherwise this returns once AssemblyAI has accepted
+    the recording; the transcript is stored by ``complete_transcription``
+    after AssemblyAI calls back or the poller finds it finished.
+    """
+    settings = services.settings
+    cache = services.transcript_cache
+    normalize = settings.audio_normalize and services.recordings.available
+    if not normalize and cache is None:
+        # Nothing to do locally: let AssemblyAI fetch the recording itself
+        transcript_id = services.transcriptions.submit(recording_url, call_sid, from_number)
+        logger.info(f"Submitted recording for {call_sid} as transcript {transcript_id}")
+        return
+
+    path, digest = services.recordings.prepare(recording_url, normalize=normalize)
+    if path is None:
+        logger.info(f"Recording for {call_sid} is silent; not transcribing")
+        reconcile_voice_transcript(call_sid, 'assemblyai', None, from_number=from_number)
+        return
+
     try:
-        # Configure AssemblyAI
-        config = aai.TranscriptionConfig(
-            speaker_labels=True,
-            language_code='en_us'
-        )
-        
-        # Transcribe the recording
-        transcriber = aai.Transcriber()
-        transcript = transcriber.transcribe(recording_url, config)
-        
-        if transcript.status == aai.TranscriptStatus.error:
-            app.logger.error(f"Transcription error: {transcript.error}")
-            return
-        
-        # Store transcription and process
-        store_transcription(transcript.text, call_sid, from_number, 'voice')
-        analyze_transcription(transcript.text, call_sid)
-        
-    except Exception as e:
-        app.logger.error(f"Error processing recording: {str(e)}")
+        cache_key = None
+        if cache is not None:
+            cache_key = cache.key(digest, services.recordings.fingerprint(normalize),
+                                  services.transcriptions.transcriber.CONFIG)
+            cached = cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Transcript for {call_sid} served from cache")
+                reconcile_voice_transcript(call_sid, 'assemblyai', cached['text'], cached.get('confidence'),
+                                           from_number)
+                return
+
+        transcript_id = services.transcriptions.submit(recording_url, call_sid, from_number,
+                                                       upload_path=path, cache_key=cache_key)
+    finally:
+        os.remove(path)
+    logger.info(f"Submitted recording for {call_sid} as transcript {transcript_id}")
+
+def reconcile_voice_transcript(call_sid, source, text, confidence=None, from_number=None):
+    """Report one source's transcript of a call (``text=None``: none)
+
+    The call is stored once every transcription source has reported, or
+    when ``resolve_call_transcript`` runs after the hold.
+    """
+    chosen = services.reconciler.add(call_sid, source, text, confidence, from_number)
+    if chosen is not None:
+        save_voice_transcript(chosen, call_sid)
+
+def resolve_call_transcript(call_sid):
+    """Store the best transcript received for a call without waiting longer"""
+    chosen = services.reconciler.resolve(call_sid)
+    if chosen is not None:
+        save_voice_transcript(chosen, call_sid)
+
+def save_voice_transcript(transcript, call_sid):
+    """Store and analyze the transcript chosen for a call"""
+    logger.info(f"Storing {transcript['source']} transcript for {call_sid}")
+    store_transcription(transcript['text'], call_sid, transcript['from_number'], 'voice',
+                        confidence=transcript['confidence'])
+    log_transcribed(call_sid, transcript['source'], transcript['confidence'])
+    analyze_transcription(transcript['text'], call_sid)
+
+def complete_transcription(transcript_id):
+    """Store and analyze a finished AssemblyAI transcript"""
+    transcript = services.transcriptions.fetch(transcript_id)
+    if transcript['status'] == 'error':
+        logger.error(f"Transcription error: {transcript['error']}")
+        services.transcriptions.finish(transcript_id, error=transcript['error'] or 'error')
+        reconcile_voice_transcript(transcript['callSid'], 'assemblyai', None, from_number=transcript['fromNumber'])
+        return
+
+    if transcript['cacheKey'] and services.transcript_cache is not None and transcript['text'] is not None:
+        services.transcript_cache.put(transcript['cacheKey'], transcript['text'], {
+            'confidence': transcript['confidence'],
+            'duration': transcript['duration'],
+            'transcriptId': transcript_id
+        })
+    reconcile_voice_transcript(transcript['callSid'], 'assemblyai', transcript['text'], transcript['confidence'],
+                               transcript['fromNumber'])
+    services.transcriptions.finish(transcript_id)
 
-def process_transcription(text, call_sid):
-    """Process completed transcription"""
+def process_transcription(text, call_sid, confidence=None, from_number=None):
+    """Process completed Twilio transcription; errors propagate so the job is retried"""
+    # Stored only if it beats the AssemblyAI transcript of the same call
+    reconcile_voice_transcript(call_sid, 'twilio', text, confidence, from_number)
+
+def start_live_transcript(call_sid, parameters):
+    """Create the lead for a call as soon as its audio starts streaming"""
     try:
-        # Store the transcription
-        store_transcription(text, call_sid, None, 'voice')
-        # Analyze for event planning keywords
-        analyze_transcription(text, call_sid)
-        
+        store_transcription('', call_sid, parameters.get('from'), 'voice')
     except Exception as e:
-        app.logger.error(f"Error processing transcription: {str(e)}")
+        logger.error(f"Error storing live transcript: {str(e)}")
+    log_call_event('stream_started', {
+        'call_sid': call_sid,
+        'timestamp': datetime.now().isoformat()
+    })
 
-def process_sms_message(text, from_number, message_sid):
-    """Process incoming SMS message"""
+def update_live_transcript(call_sid, live):
+    """Save the categories detected so far while the caller is talking"""
+    categories = live.categories
+    if not categories:
+        return
+    if services.shedder.should_shed():
+        # Optional under load: finish_live_transcript stores the final categories
+        return
     try:
-        # Store SMS message
-        store_transcription(text, message_sid, from_number, 'sms')
-        # Analyze for event planning keywords
-        analyze_transcription(text, message_sid)
-        
+        # Category stats are counted once, by finish_live_transcript
+        services.local_store.update_latest_by('Transcripts', 'MessageID', call_sid, {
+            "Transcription": live.text,
+            "Categories": ", ".join(categories),
+            "Status": "analyzed"
+        })
+        log_call_event('live_categories', {
+            'call_sid': call_sid,
+            'categories': categories,
+            'timestamp': datetime.now().isoformat()
+        })
     except Exception as e:
-        app.logger.error(f"Error processing SMS: {str(e)}")
+        logger.error(f"Error updating live transcript: {str(e)}")
 
-def store_transcription(text, message_id, from_number, source):
-    """Store transcription in Airtable"""
+def finish_live_transcript(call_sid, live):
+    """Store a streamed call's full transcript and analyze it"""
     try:
-        if not AIRTABLE_API_KEY or not AIRTABLE_BASE_ID:
-            app.logger.warning("Airtable credentials not configured")
-            return
-        
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/Transcripts"
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "fields": {
-                "MessageID": message_id,
-                "FromNumber": from_number,
-                "Transcription": text,
-                "Source": source,
-                "Timestamp": datetime.now().isoformat(),
-                "Status": "new"
-            }
-        }
+        text = live.text
+        fields = {"Transcription": text}
+        if live.confidence is not None:
+            fields["Confidence"] = live.confidence
+        services.local_store.update_latest_by('Transcripts', 'MessageID', call_sid, fields)
+        if text:
+            log_transcribed(call_sid, 'realtime', live.confidence)
+        analyze_transcription(text, call_sid)
         
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code != 200:
-            app.logger.error(f"Airtable error: {response.text}")
-            
     except Exception as e:
-        app.logger.error(f"Error storing transcription: {str(e)}")
+        logger.error(f"Error finishing live transcript: {str(e)}")
+
+def process_sms_message(text, from_number, message_sid):
+    """Process incoming SMS message
+
+    Errors propagate so the job queue retries the message; a retry does not
+    store it a second time.
+    """
+    # Store SMS message
+    if not services.local_store.find_by('Transcripts', 'MessageID', message_sid):
+        store_transcription(text, message_sid, from_number, 'sms')
+    # Analyze for event planning keywords
+    analyze_transcription(text, message_sid)
+
+def store_transcription(text, message_id, from_number, source, confidence=None):
+    """Store transcription in the local store (synced to Airtable)"""
+    phone = services.lead_index.normalize(from_number)
+    if phone is not None:
+        attach_lead(phone, source)
+    fields = {
+        "MessageID": message_id,
+        "FromNumber": phone or from_number,
+        "Transcription": text,
+        "Source": source,
+        "Timestamp": datetime.now().isoformat(),
+        "Status": "new"
+    }
+    if confidence is not None:
+        fields["Confidence"] = confidence
+    
+    local_id = services.local_store.insert('Transcripts', fields)
+    services.stats.record_transcript(source)
+    return local_id
+
+def attach_lead(phone, source):
+    """Find the caller's lead by normalized number, creating it on first contact"""
+    _, created = services.lead_index.find_or_create(phone, {
+        "Source": source,
+        "Status": "new",
+        "Timestamp": datetime.now().isoformat()
+    })
+    if created:
+        services.stats.record_lead('new')
+        services.lead_lister.invalidate()
 
 def analyze_transcription(text, message_id):
-    """Analyze transcription for event planning keywords"""
-    try:
-        # Simple keyword analysis for event planning
-        keywords = {
-            'wedding': 'Wedding Planning',
-            'corporate': 'Corporate Event',
-            'birthday': 'Birthday Party',
-            'conference': 'Conference',
-            'meeting': 'Business Meeting',
-            'party': 'Social Party',
-            'venue': 'Venue Booking',
-            'catering': 'Catering Services',
-            'entertainment': 'Entertainment',
-            'photography': 'Photography Services'
-        }
-        
-        detected_categories = []
-        text_lower = text.lower()
-        
-        for keyword, category in keywords.items():
-            if keyword in text_lower:
-                detected_categories.append(category)
-        
-        # Update Airtable with analysis results
+    """Analyze transcription for event planning keywords and lead details
+
+    While the server is saturated the analysis is put off as a delayed
+    ``analyze_deferred`` job; the transcript itself is already stored.
+    """
+    if services.shedder.should_shed():
+        services.job_queue.enqueue('analyze_deferred', {'text': text, 'message_id': message_id},
+                                   delay=services.settings.shed_defer_seconds)
+        return
+    analyze_transcriptions([(text, message_id, None)])
+
+def analyze_deferred(text, message_id):
+    """Analyze a transcription put off under load"""
+    analyze_transcriptions([(text, message_id, None)])
+
+def analyze_transcriptions(messages):
+    """Classify a batch of messages and extract their guest count, date and budget
+
+    Args:
+        messages: ``(text, message_id, said_on)`` tuples, where ``said_on``
+            is the date relative dates are read from (None for today)
+    """
+    texts = [text for text, _, _ in messages]
+    categories = services.classifier.classify_many(texts)
+    attributes = services.extractor.extract_many(texts, [said_on for _, _, said_on in messages])
+    
+    # Update Airtable with analysis results
+    for (_, message_id, _), detected_categories, details in zip(messages, categories, attributes):
+        if detected_categories or details:
+            update_lead_categories(message_id, detected_categories, details)
         if detected_categories:
-            update_lead_categories(message_id, detected_categories)
-            
-    except Exception as e:
-        app.logger.error(f"Error analyzing transcription: {str(e)}")
+            log_call_event('lead_analyzed', {
+                'message_id': message_id,
+                'categories': detected_categories
+            })
+
+def defer_lead_categories(message_id, categories, attributes, delay):
+    """Put off an Airtable category patch as a delayed ``update_lead_categories`` job"""
+    services.job_queue.enqueue('update_lead_categories', {
+        'message_id': message_id,
+        'categories': categories,
+        'attributes': attributes,
+        'deferred': True
+    }, delay=delay)
+
+def update_lead_categories(message_id, categories, attributes=None, deferred=False):
+    """Update lead categories and extracted details in the local store (synced to Airtable)
 
-def update_lead_categories(message_id, categories):
-    """Update lead categories in Airtable"""
+    Messages only in Airtable are patched there directly; under load or
+    while Airtable's circuit breaker is open that patch is put off once, as
+    a delayed ``update_lead_categories`` job. That job lets ``CircuitOpen``
+    through, so the worker pool postpones it until the breaker closes.
+    """
     try:
-        if not AIRTABLE_API_KEY or not AIRTABLE_BASE_ID:
-            return
-        
-        # First, find the record by MessageID
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/Transcripts"
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-            "Content-Type": "application/json"
+        fields = {
+            "Status": "analyzed"
         }
+        if categories:
+            fields["Categories"] = ", ".join(categories)
+        fields.update(attributes or {})
         
-        params = {
-            "filterByFormula": f"{{MessageID}} = '{message_id}'"
-        }
+        if services.local_store.update_latest_by('Transcripts', 'MessageID', message_id, fields) is not None:
+            services.stats.record_categories(categories)
+            return
         
-        response = requests.get(url, headers=headers, params=params)
-        if response.status_code == 200:
-            records = response.json().get('records', [])
+        # Not in the local store (created elsewhere and not pulled yet):
+        # patch Airtable directly, looking the record up by MessageID
+        if not services.airtable.configured:
+            return
+        if not deferred and services.shedder.should_shed('airtable'):
+            defer_lead_categories(message_id, categories, attributes,
+                                  max(services.settings.shed_defer_seconds, breaker('airtable').retry_after()))
+            return
+        
+        record_id = services.record_index.get(message_id)
+        if record_id is None:
+            records = services.airtable.find('Transcripts', f"{{MessageID}} = '{message_id}'")
             if records:
                 record_id = records[0]['id']
+                services.record_index.put(message_id, record_id)
+        
+        if record_id:
+            # Update the record
+            services.airtable_writer.update('Transcripts', record_id, fields)
+            services.stats.record_categories(categories)
                 
-                # Update the record
-                update_url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/Transcripts/{record_id}"
-                update_data = {
-                    "fields": {
-                        "Categories": ", ".join(categories),
-                        "Status": "analyzed"
-                    }
-                }
-                
-                requests.patch(update_url, headers=headers, json=update_data)
-                
+    except CircuitOpen as e:
+        if deferred:
+            raise
+        # The breaker opened after the check above; the message itself is already stored
+        defer_lead_categories(message_id, categories, attributes,
+                              max(services.settings.shed_defer_seconds, e.retry_after))
     except Exception as e:
-        app.logger.error(f"Error updating lead categories: {str(e)}")
+        logger.error(f"Error updating lead categories: {str(e)}")
+
+def log_transcribed(call_sid, source, confidence):
+    """Log a call transcript as stored, for the Analytics rollup"""
+    log_call_event('call_transcribed', {
+        'call_sid': call_sid,
+        'source': source,
+        'confidence': confidence
+    })
+
+def response_ms():
+    """Milliseconds since the current request arrived"""
+    started = g.get('request_started')
+    return round((time.perf_counter() - started) * 1000, 1) if started is not None else None
 
 def log_call_event(event_type, data):
     """Log call events for monitoring"""
     try:
-        print(f"[{datetime.now()}] {event_type}: {json.dumps(data)}")
+        # Buffered; written to EVENT_LOG_DIR by a background thread
+        services.event_log.log(event_type, data)
     except Exception as e:
-        app.logger.error(f"Error logging event: {str(e)}")
-@app.route('/api/leads', methods=['POST'])
+        logger.error(f"Error logging event: {str(e)}")
+
+@api.route('/api/leads', methods=['POST'])
 def add_lead():
     """Add a manual lead"""
     try:
         data = request.get_json()
-        # Store in Airtable
-        url = f"https://api.airtable.com/v0/{AIRTABLE_BASE_ID}/Leads"
-        headers = {
-            "Authorization": f"Bearer {AIRTABLE_API_KEY}",
-            "Content-Type": "application/json"
+        phone = services.lead_index.normalize(data.get('phoneNumber'))
+        # Store locally; the syncer pushes it to Airtable
+        lead_fields = {
+            "Name": data.get('name'),
+            "PhoneNumber": phone or data.get('phoneNumber'),
+            "EventType": data.get('eventType'),
+            "Status": data.get('status', 'new'),
+            "Timestamp": datetime.now().isoformat()
         }
-        lead_data = {
-            "fields": {
-                "Name": data.get('name'),
-                "PhoneNumber": data.get('phoneNumber'),
-                "EventType": data.get('eventType'),
-                "Status": data.get('status', 'new'),
-                "Timestamp": datetime.now().isoformat()
-            }
-        }
-        response = requests.post(url, headers=headers, json=lead_data)
-        return jsonify(response.json()), response.status_code
+        if phone is None:
+            local_id, created = services.local_store.insert('Leads', lead_fields), True
+        else:
+            local_id, created = services.lead_index.find_or_create(phone, lead_fields)
+        if created:
+            services.stats.record_lead(lead_fields['Status'])
+        else:
+            # A known number: fill in the existing lead instead of adding a duplicate
+            updates = {name: value for name, value in lead_fields.items()
+                       if name in ('Name', 'EventType') and value}
+            if 'status' in data:
+                updates['Status'] = data['status']
+            if updates:
+                services.local_store.update('Leads', local_id, updates)
+        services.lead_lister.invalidate()
+        return jsonify(services.local_store.get('Leads', local_id)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/sms/bulk', methods=['POST'])
+@api.route('/api/sms/bulk', methods=['POST'])
 def send_bulk_sms():
-    """Send bulk SMS"""
+    """Start a bulk SMS campaign; sending happens in the background"""
     try:
-        data = request.get_json()
-        # Add Twilio SMS sending logic here
-        return jsonify({"message": "SMS sent", "count": len(data.get('recipients', []))})
+        data = request.get_json() or {}
+        message = data.get('message')
+        recipients = data.get('recipients')
+        if not message or not isinstance(recipients, list):
+            return jsonify({"error": "message and a list of recipients are required"}), 400
+        
+        campaign = services.campaigns.start(message, recipients)
+        return jsonify({
+            "message": "SMS campaign started",
+            "campaignId": campaign['id'],
+            "count": campaign['total']
+        }), 202
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/reports', methods=['GET'])
+@api.route('/api/sms/bulk/<campaign_id>', methods=['GET'])
+def get_bulk_sms_status(campaign_id):
+    """Get campaign progress; ?recipients=1 adds per-recipient status"""
+    try:
+        progress = services.campaigns.progress(
+            campaign_id, include_recipients=request.args.get('recipients') == '1'
+        )
+        if progress is None:
+            return jsonify({"error": "Campaign not found"}), 404
+        return jsonify(progress)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/sms/bulk/<campaign_id>/events', methods=['GET'])
+def stream_bulk_sms_status(campaign_id):
+    """Stream campaign progress as server-sent events until it completes"""
+    if services.campaigns.progress(campaign_id) is None:
+        return jsonify({"error": "Campaign not found"}), 404
+    
+    def events():
+        while True:
+            progress = services.campaigns.progress(campaign_id)
+            if progress is None:
+                # Dropped from the campaign history
+                return
+            yield f"data: {json.dumps(progress)}\n\n"
+            if progress['status'] == 'completed':
+                return
+            services.campaigns.wait_for_change(timeout=1.0)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
+@api.route('/webhook/twilio/sms/status', methods=['POST'])
+def twilio_sms_status_webhook():
+    """Handle delivery status callbacks for campaign messages"""
+    try:
+        services.campaigns.record_status(
+            request.form.get('MessageSid'),
+            request.form.get('MessageStatus'),
+            request.form.get('ErrorCode')
+        )
+        return '', 204
+    except Exception as e:
+        logger.error(f"Error handling SMS status webhook: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@api.route('/api/reports', methods=['GET'])
 def generate_report():
-    """Generate a report"""
+    """Export leads or transcripts as a streamed CSV or NDJSON download
+
+    Query parameters: ``type`` (``leads`` or ``transcripts``), ``format``
+    (``csv`` or ``ndjson``), ``since``/``until`` (ISO dates), ``status`` and
+    ``category`` (repeatable) and ``gzip``.
+    """
     try:
-        # Add report logic here
-        return jsonify({"report": "Generated successfully", "timestamp": datetime.now().isoformat()})
+        query = ReportQuery.from_args(request.args)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return Response(stream_with_context(services.reports.export(query)), mimetype=query.content_type,
+                        headers={'Content-Disposition': f'attachment; filename="{query.filename}"',
+                                 'Cache-Control': 'no-cache'})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/stats', methods=['GET'])
+@api.route('/api/stats', methods=['GET'])
 def get_stats():
     """Get dashboard stats"""
     try:
-        # Query Airtable for stats
+        # Served from in-memory counters, reconciled against Airtable in the background
+        return jsonify(services.stats.snapshot())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/jobs', methods=['GET'])
+def get_jobs_status():
+    """Get background worker pool and job queue status"""
+    try:
+        status = services.worker_pool.status()
+        status['transcriptions'] = services.transcriptions.counts()
+        status['callTranscripts'] = services.reconciler.counts()
+        if services.transcript_cache is not None:
+            status['transcriptCache'] = services.transcript_cache.stats()
+        return jsonify(status)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the status of a single background job"""
+    try:
+        job = services.job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found"}), 404
+        return jsonify(job)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/leads', methods=['GET'])
+def list_leads():
+    """List leads a page at a time
+
+    Query parameters: ``limit`` (max 100), ``cursor`` (from ``nextCursor``),
+    ``fields`` (comma-separated) and ``sort`` (e.g. ``-timestamp``).
+    """
+    try:
+        page = services.lead_lister.list(
+            limit=request.args.get('limit', 20, type=int),
+            cursor=request.args.get('cursor'),
+            fields=request.args.get('fields'),
+            sort=request.args.get('sort')
+        )
+        return jsonify(page)
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/sync', methods=['GET'])
+def get_sync_status():
+    """Get local store to Airtable sync status"""
+    try:
+        return jsonify(services.airtable_syncer.status())
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/api/analytics', methods=['GET'])
+def get_analytics():
+    """Daily Analytics rows, newest first, plus today's totals so far
+
+    Query parameters: ``days`` (default 30, max 100).
+    """
+    try:
+        days = max(1, min(request.args.get('days', 30, type=int), 100))
+        page = services.local_store.list_page('Analytics', page_size=days, **{
+            'sort[0][field]': 'Date', 'sort[0][direction]': 'desc'
+        })
         return jsonify({
-            "totalLeads": 10,
-            "newLeads": 5,
-            "convertedLeads": 3,
-            "activeEvents": 2
+            "today": services.analytics.today(),
+            "days": [record['fields'] for record in page['records']]
         })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/leads/recent', methods=['GET'])
+@api.route('/api/events', methods=['GET'])
+def get_events():
+    """Search the call-event log
+
+    Query parameters: ``type`` (repeatable), ``since`` and ``until`` (ISO 8601
+    or epoch seconds) and ``limit`` (default 100, max 1000).
+    """
+    try:
+        since = parse_time(request.args.get('since'))
+        until = parse_time(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        limit = max(1, min(request.args.get('limit', 100, type=int), 1000))
+        events = list(services.event_log.query(request.args.getlist('type') or None, since, until, limit))
+        return jsonify({"events": events})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@api.route('/api/leads/recent', methods=['GET'])
 def get_recent_leads():
     """Get recent leads"""
     try:
-        # Query Airtable
-        return jsonify([
-            {"id": 1, "name": "John Doe", "phoneNumber": "+1234567890", "eventType": "Wedding", "status": "new", "timestamp": datetime.now().isoformat()}
-        ])
+        return jsonify(services.lead_lister.list(limit=request.args.get('limit', 5, type=int))['leads'])
+    except InvalidQuery as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def __getattr__(name):
+    # ``from app import app`` and ``gunicorn app:app`` build the app on first access
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True)
-
-
+    # Development server; use run.py for production
+    settings = load_settings()
+    # No reloader: it would run a second copy of the background services
+    create_app(settings).run(host='0.0.0.0', port=settings.port, debug=settings.debug, use_reloader=False)
@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+"""
+Hermetic load test for the EventFlow AI backend
+
+Starts local stand-ins for Airtable, AssemblyAI and Twilio (stub_servers.py),
+boots the API against them in a subprocess, replays a mix of Twilio webhooks
+built from the ``testing`` block of config/twilio_config.json alongside
+dashboard reads, then reports per-route throughput and latency percentiles
+plus the outbound calls each stand-in received.
+
+Usage:
+    python benchmark.py                         # run and print the report
+    python benchmark.py --write-baseline        # record benchmark_baseline.json
+    python benchmark.py --check                 # fail if worse than the baseline
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from config_loader import load_config
+from stub_servers import start_all
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'benchmark_baseline.json')
+
+# Relative weight of each request type in the replayed mix
+MIX = {
+    'sms': 40,
+    'voice': 15,
+    'recording': 10,
+    'transcription': 10,
+    'stats': 15,
+    'leads': 10
+}
+# Share of webhooks sent a second time, as Twilio does on slow responses
+REPLAY_RATE = 0.05
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def build_requests(count, stubs, seed=0):
+    """Build the request mix as (route label, method, path, form data) tuples"""
+    testing = load_config('twilio_config.json').get('testing', {})
+    numbers = testing.get('test_numbers') or ['+15555550100']
+    messages = testing.get('test_messages') or ['Planning an event']
+    rng = random.Random(seed)
+    ids = itertools.count(1)
+    kinds = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+
+    planned = []
+    # Twilio transcribes recorded calls too; pair transcriptions with earlier recordings
+    recorded_calls = []
+    for kind in kinds:
+        n = next(ids)
+        number = rng.choice(numbers)
+        if kind == 'sms':
+            item = ('POST /webhook/twilio/sms', 'POST', '/webhook/twilio/sms',
+                    {'From': number, 'Body': rng.choice(messages), 'MessageSid': f"SMBENCH{n:08d}"})
+        elif kind == 'voice':
+            item = ('POST /webhook/twilio/voice', 'POST', '/webhook/twilio/voice',
+                    {'From': number, 'CallSid': f"CABENCH{n:08d}", 'CallStatus': 'ringing'})
+        elif kind == 'recording':
+            item = ('POST /webhook/twilio/recording', 'POST', '/webhook/twilio/recording',
+                    {'From': number, 'CallSid': f"CABENCH{n:08d}", 'RecordingSid': f"REBENCH{n:08d}",
+                     'RecordingUrl': f"{stubs['twilio'].url}/recordings/REBENCH{n:08d}"})
+            recorded_calls.append(f"CABENCH{n:08d}")
+        elif kind == 'transcription':
+            call_sid = recorded_calls.pop(0) if recorded_calls else f"CABENCH{n:08d}"
+            item = ('POST /webhook/twilio/transcription', 'POST', '/webhook/twilio/transcription',
+                    {'CallSid': call_sid, 'TranscriptionSid': f"TRBENCH{n:08d}",
+                     'TranscriptionText': rng.choice(messages), 'Confidence': '0.9'})
+        elif kind == 'stats':
+            item = ('GET /api/stats', 'GET', '/api/stats', None)
+        else:
+            item = ('GET /api/leads', 'GET', '/api/leads?limit=20', None)
+        planned.append(item)
+        if item[1] == 'POST' and rng.random() < REPLAY_RATE:
+            planned.append(item)
+    return planned
+
+
+def start_server(stubs, data_dir, port):
+    env = dict(os.environ)
+    env.update({
+        'TWILIO_ACCOUNT_SID': 'ACbenchmark',
+        'TWILIO_AUTH_TOKEN': 'benchmark',
+        'TWILIO_PHONE_NUMBER': '+15555550100',
+        'ASSEMBLYAI_API_KEY': 'benchmark',
+        'AIRTABLE_API_KEY': 'benchmark',
+        'AIRTABLE_BASE_ID': 'appBenchmark',
+        'FLASK_SECRET_KEY': 'benchmark',
+        'AIRTABLE_API_URL': f"{stubs['airtable'].url}/v0",
+        'ASSEMBLYAI_API_URL': stubs['assemblyai'].url,
+        'ASSEMBLYAI_POLLING_INTERVAL': '0.05',
+        'TWILIO_API_BASE_URL': stubs['twilio'].url,
+        # AssemblyAI stand-in calls back here when transcripts complete
+        'PUBLIC_BASE_URL': f"http://127.0.0.1:{port}",
+        'DATA_DIR': data_dir,
+        'JOB_QUEUE_PATH': os.path.join(data_dir, 'jobs.db'),
+        'LOCAL_STORE_PATH': os.path.join(data_dir, 'eventflow.db'),
+        'IDEMPOTENCY_PATH': os.path.join(data_dir, 'idempotency.db'),
+        'AIRTABLE_SYNC_INTERVAL': '1',
+        'STATS_RECONCILE_INTERVAL': '3600',
+        'TRANSCRIPT_HOLD_SECONDS': '1'
+    })
+    env.pop('RECORD_INDEX_PATH', None)
+    server = subprocess.Popen(
+        [sys.executable, '-c',
+         f"import logging; logging.disable(logging.WARNING); from app import create_app; "
+         f"create_app().run(host='127.0.0.1', port={port}, threaded=True)"],
+        cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("API server exited during startup")
+        try:
+            requests.get(base_url, timeout=1)
+            return server, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("API server did not start within 30 seconds")
+
+
+def drive(base_url, planned, concurrency):
+    """Send every planned request and collect latencies per route"""
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    local = threading.local()
+
+    def send(item):
+        label, method, path, data = item
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        started = time.perf_counter()
+        try:
+            response = session.request(method, base_url + path, data=data, timeout=30)
+            failed = response.status_code >= 400
+        except requests.RequestException:
+            failed = True
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies[label].append(elapsed)
+            if failed:
+                errors[label] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, planned))
+    return latencies, errors, time.perf_counter() - started
+
+
+def wait_for_drain(base_url, timeout):
+    """Wait until background jobs and transcripts are done and local writes reached Airtable
+
+    Returns:
+        Seconds spent waiting, or None if the timeout was reached
+    """
+    started = time.time()
+    while time.time() - started < timeout:
+        status = requests.get(f"{base_url}/api/jobs", timeout=5).json()
+        jobs, transcriptions = status['jobs'], status['transcriptions']
+        sync = requests.get(f"{base_url}/api/sync", timeout=5).json()
+        if (jobs['queued'] == 0 and jobs['running'] == 0 and not sum(sync['unsynced'].values())
+                and transcriptions['pending'] == 0 and transcriptions['completing'] == 0):
+            return round(time.time() - started, 2)
+        time.sleep(0.25)
+    return None
+
+
+def run(args):
+    stubs = start_all(airtable_latency=args.airtable_latency, airtable_error_rate=args.airtable_429_rate,
+                      texts=load_config('twilio_config.json').get('testing', {}).get('test_messages'))
+    planned = build_requests(args.requests, stubs, seed=args.seed)
+    webhooks = sum(1 for item in planned if item[1] == 'POST')
+
+    with tempfile.TemporaryDirectory(prefix='eventflow-bench-') as data_dir:
+        server, base_url = start_server(stubs, data_dir, free_port())
+        try:
+            latencies, errors, duration = drive(base_url, planned, args.concurrency)
+            drain_seconds = wait_for_drain(base_url, args.drain_timeout)
+            jobs = requests.get(f"{base_url}/api/jobs", timeout=5).json()['jobs']
+        finally:
+            server.terminate()
+            server.wait(30)
+            for stub in stubs.values():
+                stub.stop()
+
+    routes = {}
+    for label in sorted(latencies):
+        values = latencies[label]
+        routes[label] = {
+            'count': len(values),
+            'errors': errors[label],
+            'rps': round(len(values) / duration, 1),
+            'p50_ms': round(percentile(values, 50), 2),
+            'p95_ms': round(percentile(values, 95), 2),
+            'p99_ms': round(percentile(values, 99), 2)
+        }
+    outbound = {name: dict(sorted(stub.calls.items())) for name, stub in stubs.items()}
+    airtable_calls = sum(count for route, count in stubs['airtable'].calls.items() if not route.endswith('429'))
+    return {
+        'settings': {
+            'requests': len(planned),
+            'concurrency': args.concurrency,
+            'airtableLatency': args.airtable_latency,
+            'airtable429Rate': args.airtable_429_rate,
+            'seed': args.seed
+        },
+        'total': {
+            'requests': len(planned),
+            'errors': sum(errors.values()),
+            'seconds': round(duration, 2),
+            'rps': round(len(planned) / duration, 1),
+            'drainSeconds': drain_seconds,
+            'failedJobs': jobs['failed'],
+            'airtableCallsPerWebhook': round(airtable_calls / webhooks, 3) if webhooks else 0.0
+        },
+        'routes': routes,
+        'outbound': outbound
+    }
+
+
+def print_report(result):
+    print(f"{'route':<36}{'count':>7}{'err':>6}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, route in result['routes'].items():
+        print(f"{label:<36}{route['count']:>7}{route['errors']:>6}{route['rps']:>9}"
+              f"{route['p50_ms']:>9}{route['p95_ms']:>9}{route['p99_ms']:>9}")
+    total = result['total']
+    print(f"\n{total['requests']} requests in {total['seconds']}s ({total['rps']} req/s), "
+          f"{total['errors']} errors, drained in {total['drainSeconds']}s, {total['failedJobs']} failed jobs")
+    print(f"Airtable calls per webhook: {total['airtableCallsPerWebhook']}")
+    print("\nOutbound calls:")
+    for name, calls in result['outbound'].items():
+        for route, count in calls.items():
+            print(f"  {name:<12}{route:<32}{count:>7}")
+
+
+def check(result, baseline, tolerance):
+    """Compare a run against the baseline
+
+    Latency and throughput vary with the machine, so only large regressions
+    fail; call counts and errors are deterministic and checked tightly.
+
+    Returns:
+        List of regression messages, empty if the run passes
+    """
+    problems = []
+    total, expected = result['total'], baseline['total']
+    if total['errors']:
+        problems.append(f"{total['errors']} requests failed")
+    if total['failedJobs']:
+        problems.append(f"{total['failedJobs']} background jobs failed")
+    if total['drainSeconds'] is None:
+        problems.append("background work did not drain")
+    limit = expected['airtableCallsPerWebhook'] * (1 + tolerance)
+    if total['airtableCallsPerWebhook'] > limit:
+        problems.append(f"Airtable calls per webhook {total['airtableCallsPerWebhook']} > {limit:.3f}")
+    if total['rps'] < expected['rps'] / 3:
+        problems.append(f"throughput {total['rps']} req/s < a third of baseline {expected['rps']}")
+    for label, route in result['routes'].items():
+        previous = baseline['routes'].get(label)
+        if previous and route['p95_ms'] > max(previous['p95_ms'] * 3, previous['p95_ms'] + 50):
+            problems.append(f"{label} p95 {route['p95_ms']}ms > 3x baseline {previous['p95_ms']}ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the EventFlow AI backend against local stand-ins")
+    parser.add_argument('--requests', type=int, default=500, help="requests to send (before replays)")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--airtable-latency', type=float, default=0.05, help="seconds added to each Airtable call")
+    parser.add_argument('--airtable-429-rate', type=float, default=0.02, help="share of Airtable calls answered 429")
+    parser.add_argument('--drain-timeout', type=float, default=120, help="seconds to wait for background work")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--write-baseline', action='store_true', help="save this run as the baseline")
+    parser.add_argument('--check', action='store_true', help="exit non-zero on regressions against the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed growth in Airtable calls")
+    parser.add_argument('--output', help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+    if args.write_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(result, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline written to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = check(result, baseline, args.tolerance)
+        if problems:
+            print("\nRegressions against baseline:")
+            for problem in problems:
+                print(f"  - {problem}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
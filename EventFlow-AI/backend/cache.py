@@ -0,0 +1,118 @@
+"""Bounded in-process caches for EventFlow-AI"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds
+
+    If ``path`` is given the cache is loaded from that JSON file on start
+    and written back by ``save()``, so entries survive a restart. Values
+    must be JSON-serialisable for persistence to work.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+        if path:
+            self.load()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Return the cached value, refreshing its LRU position"""
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[1] < time.time():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        """Store a value, evicting the least recently used entry when full"""
+        expires_at = time.time() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove and return a value"""
+        with self._lock:
+            entry = self._data.pop(key, _MISSING)
+        if entry is _MISSING or entry[1] < time.time():
+            return default
+        return entry[0]
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters"""
+        with self._lock:
+            size = len(self._data)
+        total = self.hits + self.misses
+        return {
+            'size': size,
+            'maxSize': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / total, 4) if total else 0.0
+        }
+
+    def load(self):
+        """Load unexpired entries from ``path``"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load cache from {self.path}: {str(e)}")
+            return
+        now = time.time()
+        with self._lock:
+            for key, value, expires_at in entries[-self.max_size:]:
+                if expires_at > now:
+                    self._data[key] = (value, expires_at)
+
+    def save(self):
+        """Atomically write unexpired entries to ``path``"""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            entries = [[key, value, expires_at] for key, (value, expires_at) in self._data.items()
+                       if expires_at > now]
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,174 @@
+"""One transcript per call for EventFlow-AI
+
+A recorded call can be transcribed twice: by AssemblyAI and by Twilio's
+built-in transcription. Each source reports its result (or that it has
+none) here. The reconciler holds the first result for up to ``hold``
+seconds, and once every expected source has reported, or the hold expires,
+keeps the most confident text so the call is stored and classified once.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional
+
+from jobs import JobQueue
+
+logger = logging.getLogger(__name__)
+
+STATUS_WAITING = 'waiting'
+STATUS_STORED = 'stored'
+
+# Preferred source when confidences are equal
+SOURCE_PRIORITY = ('assemblyai', 'twilio')
+
+
+def pick_best(candidates: Dict[str, Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Choose the most confident transcript, filling gaps from the others
+
+    Returns:
+        The chosen candidate with ``source`` set, or None if no source
+        produced any text
+    """
+    with_text = [(source, candidate) for source, candidate in candidates.items() if candidate.get('text')]
+    if not with_text:
+        return None
+
+    def rank(item):
+        source, candidate = item
+        priority = SOURCE_PRIORITY.index(source) if source in SOURCE_PRIORITY else len(SOURCE_PRIORITY)
+        return (candidate.get('confidence') or 0, -priority)
+
+    source, best = max(with_text, key=rank)
+    merged = dict(best, source=source)
+    if not merged.get('from_number'):
+        merged['from_number'] = next(
+            (candidate['from_number'] for candidate in candidates.values() if candidate.get('from_number')), None
+        )
+    return merged
+
+
+class TranscriptReconciler:
+    """Collects each call's transcripts and releases the best one once"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS call_transcripts (
+            call_sid TEXT PRIMARY KEY,
+            candidates TEXT NOT NULL,
+            status TEXT NOT NULL,
+            chosen TEXT,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, job_queue: JobQueue, sources: Iterable[str] = ('assemblyai', 'twilio'),
+                 hold: float = 60):
+        self.path = path
+        self.job_queue = job_queue
+        self.sources = frozenset(sources)
+        self.hold = hold
+        self.late = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+
+    def add(self, call_sid: str, source: str, text: Optional[str], confidence: Optional[float] = None,
+            from_number: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Record one source's transcript for a call; ``text=None`` means it has none
+
+        Returns:
+            The transcript to store if this completes the call, else None
+        """
+        candidate = {'text': text, 'confidence': confidence, 'from_number': from_number}
+        now = time.time()
+        first = False
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT candidates, status FROM call_transcripts WHERE call_sid = ?", (call_sid,)
+                ).fetchone()
+                if row is not None and row[1] == STATUS_STORED:
+                    self._conn.execute('COMMIT')
+                    self.late += 1
+                    logger.info(f"Ignoring late {source} transcript for {call_sid}")
+                    return None
+
+                candidates = json.loads(row[0]) if row is not None else {}
+                candidates[source] = candidate
+                complete = self.sources.issubset(candidates)
+                chosen = pick_best(candidates) if complete else None
+                if row is None:
+                    first = True
+                    self._conn.execute(
+                        "INSERT INTO call_transcripts (call_sid, candidates, status, chosen, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (call_sid, json.dumps(candidates), STATUS_STORED if complete else STATUS_WAITING,
+                         json.dumps(chosen), now, now)
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE call_transcripts SET candidates = ?, status = ?, chosen = ?, updated_at = ? "
+                        "WHERE call_sid = ?",
+                        (json.dumps(candidates), STATUS_STORED if complete else STATUS_WAITING,
+                         json.dumps(chosen), now, call_sid)
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+        if first and not complete:
+            # Store whatever has arrived once the hold runs out
+            self.job_queue.enqueue('resolve_call_transcript', {'call_sid': call_sid}, delay=self.hold)
+        return chosen
+
+    def resolve(self, call_sid: str) -> Optional[Dict[str, Any]]:
+        """Stop waiting for a call's other sources
+
+        Returns:
+            The transcript to store, or None if the call was already stored
+            or has no text
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT candidates FROM call_transcripts WHERE call_sid = ? AND status = ?",
+                    (call_sid, STATUS_WAITING)
+                ).fetchone()
+                if row is None:
+                    self._conn.execute('COMMIT')
+                    return None
+                chosen = pick_best(json.loads(row[0]))
+                self._conn.execute(
+                    "UPDATE call_transcripts SET status = ?, chosen = ?, updated_at = ? WHERE call_sid = ?",
+                    (STATUS_STORED, json.dumps(chosen), time.time(), call_sid)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return chosen
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of calls waiting and stored, and late transcripts ignored"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM call_transcripts GROUP BY status").fetchall()
+        counts = {STATUS_WAITING: 0, STATUS_STORED: 0}
+        counts.update(dict(rows))
+        counts['late'] = self.late
+        return counts
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,500 @@
+"""Bulk SMS campaigns for EventFlow-AI
+
+Every campaign a process runs shares one bounded pool of sender threads.
+Progress, per-recipient delivery status and each sending number's next free
+send slot are kept in a SQLite file shared by every worker process
+(CAMPAIGNS_PATH), so no number exceeds its messages-per-second limit however
+many processes send from it, and Twilio's status callbacks are applied
+whichever worker they reach.
+
+The process sending a campaign holds a lease on it. Campaigns whose lease
+runs out, because their process exited, are resumed by another process, or
+by the next one to start.
+"""
+import itertools
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from resilience import CircuitOpen, guarded_call
+
+logger = logging.getLogger(__name__)
+
+# Twilio message statuses that will not change again
+FINAL_STATUSES = {'delivered', 'undelivered', 'failed'}
+
+# Shortest wait before retrying a send refused by the open Twilio breaker
+CIRCUIT_WAIT = 1.0
+
+STATUS_RUNNING = 'running'
+STATUS_COMPLETED = 'completed'
+
+# How long a campaign stays with its process without the lease being renewed
+LEASE_SECONDS = 60
+
+
+class TwilioSmsSender:
+    """Sends single messages through the Twilio REST API
+
+    ``base_url`` points the client at a local Twilio stand-in for testing.
+    Sends fail fast with ``resilience.CircuitOpen`` while Twilio is failing.
+    429s do not count towards opening the breaker: CampaignManager backs off
+    on them itself.
+    """
+
+    def __init__(self, account_sid: str, auth_token: str, base_url: Optional[str] = None, timeout: float = 10):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.http.http_client import TwilioHttpClient
+                    from twilio.rest import Client
+                    client = Client(self.account_sid, self.auth_token,
+                                    http_client=TwilioHttpClient(timeout=self.timeout))
+                    if self.base_url:
+                        client.api.base_url = self.base_url
+                    self._client = client
+        return self._client
+
+    def send(self, to: str, from_number: str, body: str, status_callback: Optional[str] = None) -> str:
+        """Send one SMS
+
+        Returns:
+            The Twilio MessageSid
+        """
+        kwargs = {'to': to, 'from_': from_number, 'body': body}
+        if status_callback:
+            kwargs['status_callback'] = status_callback
+        with guarded_call('twilio', 'messages.create', count_throttled=False) as call:
+            message = self.client.messages.create(**kwargs)
+            call.status = 201
+        return message.sid
+
+
+class CampaignStore:
+    """Campaigns and per-recipient status in a SQLite file
+
+    Every worker process opens the same file, so whichever one receives a
+    progress request or a Twilio status callback sees the campaign, not just
+    the process sending it. Only the last ``history`` campaigns are kept.
+    A running campaign's ``owner`` sends it until ``lease_until`` passes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id TEXT PRIMARY KEY,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL,
+            started_at TEXT NOT NULL,
+            finished_at TEXT,
+            owner TEXT,
+            lease_until REAL NOT NULL DEFAULT 0
+        );
+        CREATE TABLE IF NOT EXISTS campaign_recipients (
+            campaign_id TEXT NOT NULL,
+            number TEXT NOT NULL,
+            status TEXT NOT NULL,
+            sid TEXT,
+            error TEXT,
+            PRIMARY KEY (campaign_id, number)
+        );
+        CREATE INDEX IF NOT EXISTS idx_campaign_recipients_sid ON campaign_recipients (sid);
+        CREATE TABLE IF NOT EXISTS campaign_senders (
+            number TEXT PRIMARY KEY,
+            next_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, history: int = 100):
+        self.path = path
+        self.history = history
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(campaigns)")}
+        if 'owner' not in columns:
+            self._conn.execute("ALTER TABLE campaigns ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE campaigns ADD COLUMN lease_until REAL NOT NULL DEFAULT 0")
+
+    def create(self, campaign_id: str, message: str, recipients: List[str], owner: Optional[str] = None,
+               lease_until: float = 0):
+        """Add a running campaign with every recipient queued, dropping the oldest beyond ``history``"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute(
+                    "INSERT INTO campaigns (id, message, status, started_at, owner, lease_until) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (campaign_id, message, STATUS_RUNNING, datetime.now().isoformat(), owner, lease_until)
+                )
+                self._conn.executemany(
+                    "INSERT INTO campaign_recipients (campaign_id, number, status) VALUES (?, ?, ?)",
+                    [(campaign_id, number, 'queued') for number in recipients]
+                )
+                old = [row[0] for row in self._conn.execute(
+                    "SELECT id FROM campaigns ORDER BY started_at DESC, rowid DESC LIMIT -1 OFFSET ?",
+                    (self.history,)
+                )]
+                for old_id in old:
+                    self._conn.execute("DELETE FROM campaign_recipients WHERE campaign_id = ?", (old_id,))
+                    self._conn.execute("DELETE FROM campaigns WHERE id = ?", (old_id,))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def mark_sent(self, campaign_id: str, number: str, sid: str):
+        with self._lock:
+            # A status callback may already have moved the message on
+            self._conn.execute(
+                "UPDATE campaign_recipients SET sid = ?, status = CASE status WHEN 'queued' THEN 'sent' "
+                "ELSE status END WHERE campaign_id = ? AND number = ?",
+                (sid, campaign_id, number)
+            )
+
+    def mark_failed(self, campaign_id: str, number: str, error: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campaign_recipients SET status = 'failed', error = ? WHERE campaign_id = ? AND number = ?",
+                (error, campaign_id, number)
+            )
+
+    def finish(self, campaign_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campaigns SET status = ?, finished_at = ?, lease_until = 0 WHERE id = ?",
+                (STATUS_COMPLETED, datetime.now().isoformat(), campaign_id)
+            )
+
+    def queued(self, campaign_id: str) -> List[str]:
+        """Recipients of a campaign not yet sent or failed"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT number FROM campaign_recipients WHERE campaign_id = ? AND status = 'queued' "
+                "ORDER BY rowid",
+                (campaign_id,)
+            )]
+
+    def renew(self, owner: str, lease_until: float):
+        """Extend the lease on every running campaign ``owner`` holds"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE campaigns SET lease_until = ? WHERE owner = ? AND status = ?",
+                (lease_until, owner, STATUS_RUNNING)
+            )
+
+    def release(self, owner: str):
+        """Give up ``owner``'s running campaigns so another process resumes them at once"""
+        self.renew(owner, 0)
+
+    def claim_expired(self, owner: str, lease_until: float) -> List[Tuple[str, str]]:
+        """Take over running campaigns whose lease has run out
+
+        Returns:
+            ``(campaign_id, message)`` for each campaign claimed
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, message FROM campaigns WHERE status = ? AND lease_until < ?",
+                    (STATUS_RUNNING, time.time())
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE campaigns SET owner = ?, lease_until = ? WHERE id = ?",
+                    [(owner, lease_until, campaign_id) for campaign_id, _ in rows]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def reserve_send(self, number: str, interval: float) -> float:
+        """Book the next send slot for a sending number
+
+        Slots are ``interval`` seconds apart across every process using
+        the file.
+
+        Returns:
+            The time.time() at which the caller may send
+        """
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    "SELECT next_at FROM campaign_senders WHERE number = ?", (number,)
+                ).fetchone()
+                slot = max(time.time(), row[0] if row else 0)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO campaign_senders (number, next_at) VALUES (?, ?)",
+                    (number, slot + interval)
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return slot
+
+    def record_status(self, message_sid: str, status: str, error_code: Optional[str] = None) -> bool:
+        """Apply a Twilio status callback; final statuses are never overwritten
+
+        Returns:
+            True if the message belongs to a known campaign
+        """
+        final = tuple(FINAL_STATUSES)
+        with self._lock:
+            known = self._conn.execute(
+                "SELECT 1 FROM campaign_recipients WHERE sid = ?", (message_sid,)
+            ).fetchone() is not None
+            if known:
+                self._conn.execute(
+                    "UPDATE campaign_recipients SET status = ?, error = COALESCE(?, error) "
+                    f"WHERE sid = ? AND status NOT IN ({', '.join('?' * len(final))})",
+                    (status, error_code, message_sid) + final
+                )
+        return known
+
+    def progress(self, campaign_id: str, include_recipients: bool = False) -> Optional[Dict[str, Any]]:
+        """A campaign's counts, or None if it is unknown
+
+        ``sent`` counts messages Twilio accepted and ``failed`` the ones it
+        refused; ``delivered`` and ``undelivered`` follow the status callbacks.
+        """
+        with self._lock:
+            campaign = self._conn.execute(
+                "SELECT status, started_at, finished_at FROM campaigns WHERE id = ?", (campaign_id,)
+            ).fetchone()
+            if campaign is None:
+                return None
+            total, sent, failed, delivered, undelivered = self._conn.execute(
+                "SELECT COUNT(*), COUNT(sid), "
+                "SUM(CASE WHEN sid IS NULL AND status = 'failed' THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN status = 'delivered' THEN 1 ELSE 0 END), "
+                "SUM(CASE WHEN sid IS NOT NULL AND status IN ('undelivered', 'failed') THEN 1 ELSE 0 END) "
+                "FROM campaign_recipients WHERE campaign_id = ?",
+                (campaign_id,)
+            ).fetchone()
+            recipients = None
+            if include_recipients:
+                recipients = {
+                    number: {'status': status, 'sid': sid, 'error': error}
+                    for number, status, sid, error in self._conn.execute(
+                        "SELECT number, status, sid, error FROM campaign_recipients WHERE campaign_id = ?",
+                        (campaign_id,)
+                    )
+                }
+        failed, delivered, undelivered = failed or 0, delivered or 0, undelivered or 0
+        result = {
+            'id': campaign_id,
+            'status': campaign[0],
+            'total': total,
+            'sent': sent,
+            'failed': failed,
+            'delivered': delivered,
+            'undelivered': undelivered,
+            'pending': total - sent - failed,
+            'startedAt': campaign[1],
+            'finishedAt': campaign[2]
+        }
+        if recipients is not None:
+            result['recipients'] = recipients
+        return result
+
+
+class CampaignManager:
+    """Runs bulk SMS campaigns in the background
+
+    Sends from every campaign this process runs share ``concurrency``
+    threads. The process that starts a campaign sends it while it holds the
+    lease; its progress lives in the shared CampaignStore. Call ``recover``
+    once the process is up to resume abandoned campaigns and keep leases
+    renewed, and ``shutdown`` before it exits. A recipient being sent to
+    when its process died may get the message twice.
+    """
+
+    def __init__(self, sender: TwilioSmsSender, from_numbers: List[str], store: CampaignStore,
+                 per_number_rate: float = 1.0, concurrency: int = 8, status_callback: Optional[str] = None,
+                 retry_attempts: int = 2, lease_seconds: float = LEASE_SECONDS):
+        if not from_numbers:
+            raise ValueError("At least one sending number is required")
+        self.sender = sender
+        self.from_numbers = from_numbers
+        self.store = store
+        self.send_interval = 1.0 / per_number_rate
+        self.concurrency = concurrency
+        self.status_callback = status_callback
+        self.retry_attempts = retry_attempts
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._executor = ThreadPoolExecutor(concurrency, thread_name_prefix='eventflow-campaign')
+        self._remaining: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Wakes progress streams in this process; changes made by others are seen on their next poll
+        self._changed = threading.Condition()
+
+    def start(self, message: str, recipients: List[str]) -> Dict[str, Any]:
+        """Queue a campaign and return its initial progress immediately"""
+        if self._stop.is_set():
+            raise RuntimeError("Campaigns are shutting down")
+        unique = list(dict.fromkeys(number.strip() for number in recipients if number and number.strip()))
+        campaign_id = uuid.uuid4().hex
+        self.store.create(campaign_id, message, unique, owner=self.owner,
+                          lease_until=time.time() + self.lease_seconds)
+        self._schedule(campaign_id, message, unique)
+        return self.store.progress(campaign_id)
+
+    def _schedule(self, campaign_id: str, message: str, recipients: List[str]):
+        if not recipients:
+            self._finish(campaign_id)
+            return
+        with self._lock:
+            self._remaining[campaign_id] = len(recipients)
+        numbers = itertools.cycle(self.from_numbers)
+        for recipient in recipients:
+            self._executor.submit(self._send_one, campaign_id, message, recipient, next(numbers))
+
+    def _pause(self, seconds: float) -> bool:
+        """Wait ``seconds``; False if the manager is shutting down"""
+        return not self._stop.wait(max(0.0, seconds))
+
+    def _send_one(self, campaign_id: str, message: str, recipient: str, from_number: str):
+        error = None
+        attempt = 0
+        while attempt <= self.retry_attempts:
+            if not self._pause(self.store.reserve_send(from_number, self.send_interval) - time.time()):
+                # Left queued for whichever process resumes the campaign
+                return
+            try:
+                sid = self.sender.send(recipient, from_number, message, self.status_callback)
+            except CircuitOpen as e:
+                # Nothing was sent; wait for the breaker's trial call without using up an attempt
+                error = str(e)
+                if not self._pause(max(e.retry_after, CIRCUIT_WAIT)):
+                    return
+                continue
+            except Exception as e:
+                error = str(e)
+                # Back off on Twilio's "too many requests", give up on anything else
+                if getattr(e, 'status', None) != 429:
+                    break
+                if not self._pause(2 ** attempt):
+                    return
+                attempt += 1
+                continue
+            self.store.mark_sent(campaign_id, recipient, sid)
+            self._sent(campaign_id)
+            return
+
+        logger.error(f"Campaign {campaign_id}: sending to {recipient} failed: {error}")
+        self.store.mark_failed(campaign_id, recipient, error)
+        self._sent(campaign_id)
+
+    def _sent(self, campaign_id: str):
+        """Count one recipient done, finishing the campaign after the last"""
+        with self._lock:
+            self._remaining[campaign_id] -= 1
+            done = self._remaining[campaign_id] == 0
+            if done:
+                del self._remaining[campaign_id]
+        if done:
+            self._finish(campaign_id)
+        else:
+            self._notify()
+
+    def _finish(self, campaign_id: str):
+        self.store.finish(campaign_id)
+        self._notify()
+
+    def recover(self):
+        """Resume campaigns whose process exited, then keep this process's leases renewed"""
+        if self._thread is not None:
+            return
+        self.resume_expired()
+
+        def run():
+            while not self._stop.wait(self.lease_seconds / 3):
+                try:
+                    self.store.renew(self.owner, time.time() + self.lease_seconds)
+                    self.resume_expired()
+                except Exception as e:
+                    logger.error(f"Error renewing campaign leases: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='eventflow-campaign-leases', daemon=True)
+        self._thread.start()
+
+    def resume_expired(self) -> int:
+        """Claim and resume running campaigns whose lease has run out
+
+        Returns:
+            The number of campaigns resumed
+        """
+        claimed = self.store.claim_expired(self.owner, time.time() + self.lease_seconds)
+        for campaign_id, message in claimed:
+            with self._lock:
+                if campaign_id in self._remaining:
+                    # Still sending here; the lease had merely lapsed
+                    continue
+            recipients = self.store.queued(campaign_id)
+            logger.info(f"Resuming campaign {campaign_id} with {len(recipients)} recipients left")
+            self._schedule(campaign_id, message, recipients)
+        return len(claimed)
+
+    def shutdown(self):
+        """Stop sending and release this process's campaigns to the other processes
+
+        Sends in progress finish; recipients not yet sent stay queued.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(5)
+            self._thread = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.store.release(self.owner)
+        self._notify()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def progress(self, campaign_id: str, include_recipients: bool = False) -> Optional[Dict[str, Any]]:
+        return self.store.progress(campaign_id, include_recipients)
+
+    def wait_for_change(self, timeout: float):
+        """Wait until a campaign sent from this process changes, or ``timeout`` passes"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def record_status(self, message_sid: str, status: str, error_code: Optional[str] = None) -> bool:
+        """Apply a Twilio status callback
+
+        Returns:
+            True if the message belongs to a known campaign
+        """
+        known = self.store.record_status(message_sid, status, error_code)
+        if known:
+            self._notify()
+        return known
@@ -0,0 +1,68 @@
+"""Event category classifier for transcripts and SMS messages
+
+Keyword synonyms come from ``data_processing.keywords`` in
+config/airtable_config.json. They are compiled once into a single
+word-bounded regular expression, so each text is scanned in one pass no
+matter how many categories are configured.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Set
+
+from config_loader import load_config
+
+# Keyword group -> category name stored in Airtable
+CATEGORY_NAMES = {
+    'wedding': 'Wedding Planning',
+    'corporate': 'Corporate Event',
+    'birthday': 'Birthday Party',
+    'conference': 'Conference',
+    'meeting': 'Business Meeting',
+    'party': 'Social Party',
+    'venue': 'Venue Booking',
+    'catering': 'Catering Services',
+    'entertainment': 'Entertainment',
+    'photography': 'Photography Services'
+}
+
+
+class CategoryClassifier:
+    """Single-pass multi-keyword matcher mapping text to event categories"""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], category_names: Optional[Dict[str, str]] = None):
+        category_names = category_names or CATEGORY_NAMES
+        self.categories: List[str] = []
+        self._term_categories: Dict[str, Set[int]] = {}
+
+        groups = dict.fromkeys(category_names)
+        groups.update(dict.fromkeys(keywords))
+        for group in groups:
+            category = category_names.get(group, group.title())
+            if category not in self.categories:
+                self.categories.append(category)
+            index = self.categories.index(category)
+            for term in {group, *keywords.get(group, [])}:
+                self._term_categories.setdefault(term.lower(), set()).add(index)
+
+        # Longest terms first so "photographer" wins over "photo"
+        terms = sorted(self._term_categories, key=len, reverse=True)
+        alternation = '|'.join(re.escape(term) for term in terms)
+        self._pattern = re.compile(rf"(?<![\w-])({alternation})(?:e?s)?(?!\w)", re.IGNORECASE)
+
+    @classmethod
+    def from_config(cls) -> 'CategoryClassifier':
+        """Build a classifier from config/airtable_config.json"""
+        keywords = load_config('airtable_config.json').get('data_processing', {}).get('keywords', {})
+        return cls(keywords)
+
+    def classify(self, text: Optional[str]) -> List[str]:
+        """Return the categories detected in ``text``, in configured order"""
+        if not text:
+            return []
+        found = set()
+        for match in self._pattern.finditer(text):
+            found.update(self._term_categories[match.group(1).lower()])
+        return [self.categories[index] for index in sorted(found)]
+
+    def classify_many(self, texts: Iterable[Optional[str]]) -> List[List[str]]:
+        """Classify a batch of texts"""
+        return [self.classify(text) for text in texts]
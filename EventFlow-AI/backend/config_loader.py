@@ -0,0 +1,24 @@
+"""Loader for the JSON integration configs in the top-level config/ directory"""
+import json
+import os
+from functools import lru_cache
+from typing import Any, Dict
+
+CONFIG_DIR = os.getenv(
+    'EVENTFLOW_CONFIG_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'config')
+)
+
+
+@lru_cache(maxsize=None)
+def load_config(name: str) -> Dict[str, Any]:
+    """Load a config file such as ``airtable_config.json``
+
+    Returns:
+        The parsed JSON, or an empty dict if the file is missing
+    """
+    path = os.path.join(CONFIG_DIR, name)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,315 @@
+"""Structured call-event log for EventFlow-AI
+
+``EventLog.log`` appends to a bounded in-memory ring and returns; a
+background thread writes the ring out as JSON lines. Each process writes its
+own segment files (``events-<start ms>-<pid>.jsonl``), rotated by size and
+age and optionally gzipped once closed. Every segment has a small
+``.idx`` sidecar with its time range, event counts by type and a sparse
+time -> byte offset table, so queries skip segments outside the requested
+range and seek close to the start time within one.
+
+Query from the command line:
+    python event_log.py --type incoming_call --since 2024-01-01T00:00
+"""
+import argparse
+import glob
+import gzip
+import heapq
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from bisect import bisect_right
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Add an offset entry to a segment's index at most this often (seconds)
+INDEX_INTERVAL = 60
+
+
+def parse_time(value: Optional[str]) -> Optional[float]:
+    """Parse an ISO 8601 timestamp or epoch seconds; ``None`` passes through"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid time: {value}")
+
+
+class _Segment:
+    """The segment file this process is currently appending to"""
+
+    def __init__(self, directory: str):
+        self.started = time.time()
+        base = f"events-{int(self.started * 1000)}-{os.getpid()}"
+        self.path = os.path.join(directory, f"{base}.jsonl")
+        self.index_path = os.path.join(directory, f"{base}.idx")
+        self.file = open(self.path, 'ab')
+        self.index: Dict[str, Any] = {
+            'file': os.path.basename(self.path),
+            'start': None,
+            'end': None,
+            'count': 0,
+            'types': {},
+            'offsets': []
+        }
+
+    @property
+    def size(self) -> int:
+        return self.file.tell()
+
+    def write(self, events: List[Tuple[float, str, Any]]):
+        index = self.index
+        offset = self.file.tell()
+        first_time = events[0][0]
+        if not index['offsets'] or first_time - index['offsets'][-1][0] >= INDEX_INTERVAL:
+            index['offsets'].append([first_time, offset])
+
+        lines = []
+        for timestamp, event_type, data in events:
+            lines.append(json.dumps({
+                'time': timestamp,
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(),
+                'type': event_type,
+                'data': data
+            }, default=str))
+            index['types'][event_type] = index['types'].get(event_type, 0) + 1
+        self.file.write(('\n'.join(lines) + '\n').encode())
+        self.file.flush()
+
+        if index['start'] is None:
+            index['start'] = first_time
+        index['end'] = events[-1][0]
+        index['count'] += len(events)
+        self.save_index()
+
+    def save_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self, compress: bool):
+        self.file.close()
+        if self.index['count'] == 0:
+            os.remove(self.path)
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+        if compress:
+            with open(self.path, 'rb') as src, gzip.open(f"{self.path}.gz", 'wb') as dst:
+                shutil.copyfileobj(src, dst)
+            self.index['file'] = os.path.basename(f"{self.path}.gz")
+            # Byte offsets do not apply to the compressed file
+            self.index['offsets'] = []
+            self.save_index()
+            os.remove(self.path)
+
+
+class EventLog:
+    """Non-blocking, rotating JSONL event log"""
+
+    def __init__(self, directory: str, buffer_size: int = 10000, flush_interval: float = 1.0,
+                 segment_bytes: int = 10 * 1024 * 1024, segment_seconds: float = 3600,
+                 compress: bool = False, retention_days: float = 30):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.compress = compress
+        self.retention_days = retention_days
+        self.dropped = 0
+        self._buffer: Deque[Tuple[float, str, Any]] = deque(maxlen=buffer_size)
+        self._segment: Optional[_Segment] = None
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def log(self, event_type: str, data: Dict[str, Any]):
+        """Record an event without blocking on I/O
+
+        If the writer falls behind and the ring is full, the oldest unwritten
+        event is dropped.
+        """
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append((time.time(), event_type, data))
+
+    @property
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def start(self):
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error writing event log: {str(e)}")
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=run, name='eventflow-event-log', daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # Worker processes inherit the parent's ring but write their own segments
+        self._buffer = deque(maxlen=self._buffer.maxlen)
+        self._segment = None
+        self._write_lock = threading.Lock()
+        if self._thread is not None:
+            self._thread = None
+            self.start()
+
+    def flush(self):
+        """Write buffered events, rotating the segment if it is full or old"""
+        with self._write_lock:
+            events = []
+            while True:
+                try:
+                    events.append(self._buffer.popleft())
+                except IndexError:
+                    break
+
+            segment = self._segment
+            if segment is not None and (segment.size >= self.segment_bytes
+                                        or time.time() - segment.started >= self.segment_seconds):
+                segment.close(self.compress)
+                segment = self._segment = None
+                self._expire()
+            if events:
+                if segment is None:
+                    segment = self._segment = _Segment(self.directory)
+                segment.write(events)
+
+    def _expire(self):
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for index in self._indexes():
+            if index.get('end') is not None and index['end'] < cutoff:
+                for path in (os.path.join(self.directory, index['file']), index['_path']):
+                    if os.path.exists(path):
+                        os.remove(path)
+
+    def close(self):
+        """Stop the writer thread and write out everything still buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+        with self._write_lock:
+            if self._segment is not None:
+                self._segment.close(self.compress)
+                self._segment = None
+
+    # Queries
+
+    def _indexes(self) -> List[Dict[str, Any]]:
+        indexes = []
+        for path in glob.glob(os.path.join(self.directory, 'events-*.idx')):
+            try:
+                with open(path) as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                continue
+            index['_path'] = path
+            indexes.append(index)
+        return sorted(indexes, key=lambda index: index.get('start') or 0)
+
+    def _scan(self, index: Dict[str, Any], types: Optional[set], since: Optional[float],
+              until: Optional[float]) -> Iterator[Dict[str, Any]]:
+        path = os.path.join(self.directory, index['file'])
+        if not os.path.exists(path):
+            return
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as f:
+            offsets = index.get('offsets') or []
+            if since is not None and offsets:
+                position = bisect_right([entry[0] for entry in offsets], since) - 1
+                if position > 0:
+                    f.seek(offsets[position][1])
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    # Partial last line of a segment still being written
+                    continue
+                if since is not None and event['time'] < since:
+                    continue
+                if until is not None and event['time'] > until:
+                    return
+                if types is None or event['type'] in types:
+                    yield event
+
+    def query(self, types: Optional[Iterable[str]] = None, since: Optional[float] = None,
+              until: Optional[float] = None, limit: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Yield stored events in time order
+
+        Args:
+            types: Event types to include (all when omitted)
+            since: Earliest event time, epoch seconds
+            until: Latest event time, epoch seconds
+            limit: Maximum number of events
+        """
+        self.flush()
+        wanted = set(types) if types else None
+        scans = []
+        for index in self._indexes():
+            if index.get('start') is None:
+                continue
+            if since is not None and index['end'] < since:
+                continue
+            if until is not None and index['start'] > until:
+                continue
+            if wanted is not None and not wanted.intersection(index.get('types', {})):
+                continue
+            scans.append(self._scan(index, wanted, since, until))
+
+        # Segments from different processes overlap in time
+        for count, event in enumerate(heapq.merge(*scans, key=lambda event: event['time'])):
+            if limit is not None and count >= limit:
+                return
+            yield event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search the EventFlow AI call-event log")
+    parser.add_argument('--dir', default=os.getenv('EVENT_LOG_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'data', 'events')), help="event log directory")
+    parser.add_argument('--type', action='append', dest='types', help="event type (repeatable)")
+    parser.add_argument('--since', help="ISO 8601 time or epoch seconds")
+    parser.add_argument('--until', help="ISO 8601 time or epoch seconds")
+    parser.add_argument('--limit', type=int)
+    args = parser.parse_args()
+
+    try:
+        since, until = parse_time(args.since), parse_time(args.until)
+    except ValueError as e:
+        parser.error(str(e))
+    event_log = EventLog(args.dir)
+    for event in event_log.query(args.types, since, until, args.limit):
+        sys.stdout.write(json.dumps(event) + '\n')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,246 @@
+"""Lead attribute extraction for EventFlow-AI
+
+Pulls the guest count, event date and budget out of transcripts and SMS
+messages, as the Airtable fields ``GuestCount``, ``EventDate`` (ISO date)
+and ``Budget``. All patterns are alternatives of one compiled regular
+expression, so each text is scanned once, whatever it contains; a backlog
+goes through ``extract_many`` at tens of thousands of messages a second.
+
+Heuristics, in line with what callers actually say:
+
+- guest counts need a noun ("150 guests", "a hundred and twenty people")
+  or a lead-in ("guest count of 80"); ranges keep the upper bound
+- dates need a day ("June 14th", "14 June 2027", "6/14", "2027-06-14");
+  without a year the next such day on or after the reference date is used.
+  "May" and abbreviations also need a day suffix, "of" or a year ("may 5th",
+  "5 of may"), and "1/2 of" is a fraction, not a date
+- budgets are currency amounts ("$5,000", "5k dollars", "10 grand",
+  "budget of 8000"); the largest total wins, and a per-head price is
+  multiplied by the guest count when no total is given
+"""
+import re
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional
+
+UNITS = {
+    'zero': 0, 'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14,
+    'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19, 'twenty': 20,
+    'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+    'dozen': 12
+}
+SCALES = {'hundred': 100, 'thousand': 1000, 'k': 1000, 'grand': 1000, 'million': 1000000, 'm': 1000000}
+MONTHS = {
+    'january': 1, 'jan': 1, 'february': 2, 'feb': 2, 'march': 3, 'mar': 3, 'april': 4, 'apr': 4, 'may': 5,
+    'june': 6, 'jun': 6, 'july': 7, 'jul': 7, 'august': 8, 'aug': 8, 'september': 9, 'sept': 9, 'sep': 9,
+    'october': 10, 'oct': 10, 'november': 11, 'nov': 11, 'december': 12, 'dec': 12
+}
+# Month names that are also words ("may"), or abbreviations that are easily
+# something else; these only make a date with a day suffix, "of" or a year
+AMBIGUOUS_MONTHS = {'jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec'}
+
+
+def _trie(words: Iterable[str]) -> str:
+    """Alternation of ``words`` with shared prefixes factored out
+
+    ``re`` tries alternatives one after another; as a trie, a word that
+    matches none of them is rejected after a character or two.
+    """
+    tree: Dict[str, Any] = {}
+    for word in words:
+        node = tree
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        if '' in node:
+            return '(?:' + '|'.join(branches) + ')?'
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return build(tree)
+
+
+_DIGITS = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+_NUMBER_WORD = _trie([name for name in UNITS if name not in ('a', 'an')] + ['hundred', 'thousand'])
+_NUMBER = (rf'(?:{_DIGITS}|(?:an?[ -]+)?{_NUMBER_WORD}(?:(?:[ -]+|[ ]+and[ ]+){_NUMBER_WORD})*(?!\w))')
+_MONTH = _trie(name for name in MONTHS if name not in AMBIGUOUS_MONTHS)
+_AMBIGUOUS_MONTH = _trie(AMBIGUOUS_MONTHS)
+_GUESTS = r'(?:guests?|people|persons?|attendees|adults|heads|pax)\b'
+_PER_HEAD = r'\s*(?:per|a|each|/)\s*(?:head|person|guest|plate|pp)\b'
+
+# Each alternative is wrapped in a group named for its kind, read back from
+# ``match.lastgroup``. The lookarounds skip positions no alternative can
+# start at, mid-word positions included.
+PATTERN = re.compile(r'(?=[\d$abdefghjmnostz])(?<![a-z])(?:' + '|'.join([
+    r'(?P<iso>\b(?P<iy>\d{4})-(?P<im>\d{1,2})-(?P<id>\d{1,2})\b)',
+    # Not "1/2 of the guests"
+    r'(?P<numeric>\b(?P<nm>\d{1,2})/(?P<nd>\d{1,2})(?:/(?P<ny>\d{4}|\d{2}))?\b(?!\s+of\b))',
+    rf'(?P<usd>\$\s?(?P<ua>{_DIGITS})(?:\s?(?P<us>k|thousand|grand|million|m)\b)?(?P<up>{_PER_HEAD})?)',
+    rf'(?P<budget>\bbudget\s+(?:is\s+|of\s+|around\s+|about\s+|roughly\s+|approximately\s+|up\s+to\s+)*'
+    rf'\$?\s?(?P<ba>{_DIGITS})(?:\s?(?P<bs>k|thousand|grand|million)\b)?)',
+    # A number (or range) of guests, or of dollars
+    rf'(?P<quantity>\b(?P<qn>{_NUMBER})(?:\s*(?:-|to|or)\s*(?P<qh>{_NUMBER}))?'
+    rf'(?:\s+(?:(?:adult|total|wedding|party|expected|confirmed|more|or\s+so)\s+)?(?P<guests>{_GUESTS})|'
+    rf'\s?(?:(?P<qs>k|grand)\b(?:\s*(?:dollars|usd|bucks)\b)?|(?P<qw>thousand|million)?\s*(?:dollars|usd|bucks)\b)'
+    rf'(?P<qp>{_PER_HEAD})?))',
+    rf'(?P<count_of>\b(?:guest\s+(?:count|list)|head\s*count|attendance)\s+(?:of\s+|is\s+|will\s+be\s+|'
+    rf'around\s+|about\s+|roughly\s+|approximately\s+|maybe\s+)*(?P<co>{_NUMBER}))',
+    # The conditionals at the end reject an ambiguous month without a day
+    # suffix, "of" or a year: "may 5 people" is a guest count
+    rf'(?P<month_day>\b(?:(?P<dm>{_MONTH})|(?P<dma>{_AMBIGUOUS_MONTH}))\.?\s+(?:the\s+)?(?P<dd>\d{{1,2}})'
+    rf'(?P<ds>st|nd|rd|th)?\b(?:,?\s+(?P<dy>\d{{4}})\b)?(?(dma)(?(ds)|(?(dy)|(?!)))))',
+    rf'(?P<day_month>\b(?:the\s+)?(?P<md>\d{{1,2}})(?P<ms>st|nd|rd|th)?\s+(?P<mo>of\s+)?'
+    rf'(?:(?P<mm>{_MONTH})|(?P<mma>{_AMBIGUOUS_MONTH}))\b\.?(?:,?\s+(?P<my>\d{{4}})\b)?'
+    rf'(?(mma)(?(ms)|(?(mo)|(?(my)|(?!))))))',
+]) + ')')
+
+
+def parse_number(text: str) -> Optional[float]:
+    """Parse digits ("1,200", "2.5") or number words ("a hundred and fifty")"""
+    text = text.replace(',', '')
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    total = current = 0
+    seen = False
+    for word in re.split(r'[\s-]+', text):
+        if word in ('a', 'an'):
+            current = max(current, 1)
+        elif word == 'dozen':
+            current = max(current, 1) * 12
+            seen = True
+        elif word in UNITS:
+            current += UNITS[word]
+            seen = True
+        elif word == 'hundred':
+            current = max(current, 1) * 100
+            seen = True
+        elif word in ('thousand', 'million'):
+            total += max(current, 1) * SCALES[word]
+            current = 0
+            seen = True
+    return float(total + current) if seen else None
+
+
+def _scaled(amount: str, scale: Optional[str]) -> Optional[float]:
+    value = parse_number(amount)
+    if value is not None and scale:
+        value *= SCALES[scale]
+    return value
+
+
+def _date(year: Optional[str], month: int, day: str, reference: date) -> Optional[date]:
+    try:
+        if year:
+            year_value = int(year)
+            return date(year_value + 2000 if year_value < 100 else year_value, month, int(day))
+        candidate = date(reference.year, month, int(day))
+        return candidate if candidate >= reference else date(reference.year + 1, month, int(day))
+    except ValueError:
+        return None
+
+
+class _Found:
+    __slots__ = ('counts', 'date', 'totals', 'per_head')
+
+    def __init__(self):
+        self.counts: List[float] = []
+        self.date: Optional[date] = None
+        self.totals: List[float] = []
+        self.per_head: List[float] = []
+
+    def add(self, match: 're.Match', reference: date):
+        kind = match.lastgroup
+        if kind == 'quantity':
+            low, high, guests, scale, word_scale, per_head = match.group('qn', 'qh', 'guests', 'qs', 'qw', 'qp')
+            if guests:
+                self._count(high or low)
+            else:
+                self._amount(high or low, scale or word_scale, per_head)
+        elif kind == 'count_of':
+            self._count(match.group('co'))
+        elif kind == 'usd':
+            self._amount(*match.group('ua', 'us', 'up'))
+        elif kind == 'budget':
+            self._amount(*match.group('ba', 'bs'))
+        elif self.date is not None:
+            return
+        elif kind == 'iso':
+            year, month, day = match.group('iy', 'im', 'id')
+            self.date = _date(year, int(month), day, reference)
+        elif kind == 'numeric':
+            month, day, year = match.group('nm', 'nd', 'ny')
+            self.date = _date(year, int(month), day, reference)
+        elif kind == 'month_day':
+            month, ambiguous, day, year = match.group('dm', 'dma', 'dd', 'dy')
+            self.date = _date(year, MONTHS[month or ambiguous], day, reference)
+        elif kind == 'day_month':
+            day, month, ambiguous, year = match.group('md', 'mm', 'mma', 'my')
+            self.date = _date(year, MONTHS[month or ambiguous], day, reference)
+
+    def _count(self, text: str):
+        value = parse_number(text)
+        if value:
+            self.counts.append(value)
+
+    def _amount(self, amount: str, scale: Optional[str], per_head: Optional[str] = None):
+        value = _scaled(amount, scale)
+        if value:
+            (self.per_head if per_head else self.totals).append(value)
+
+    def fields(self) -> Dict[str, Any]:
+        fields: Dict[str, Any] = {}
+        guest_count = max(self.counts) if self.counts else None
+        if guest_count:
+            fields['GuestCount'] = int(guest_count)
+        if self.date is not None:
+            fields['EventDate'] = self.date.isoformat()
+        budget = max(self.totals) if self.totals else None
+        if budget is None and self.per_head and guest_count:
+            budget = max(self.per_head) * guest_count
+        if budget:
+            fields['Budget'] = round(budget, 2)
+        return fields
+
+
+class LeadAttributeExtractor:
+    """Extracts GuestCount, EventDate and Budget fields from free text"""
+
+    _pattern = PATTERN
+
+    def extract(self, text: Optional[str], reference: Optional[date] = None) -> Dict[str, Any]:
+        """Return the fields found in ``text`` (only those present)
+
+        Args:
+            text: A transcript or message
+            reference: When the text was said, for dates without a year
+                (default: today)
+        """
+        if not text:
+            return {}
+        reference = reference or date.today()
+        found = _Found()
+        for match in self._pattern.finditer(text.lower()):
+            found.add(match, reference)
+        return found.fields()
+
+    def extract_many(self, texts: Iterable[Optional[str]],
+                     references: Optional[Iterable[Optional[date]]] = None) -> List[Dict[str, Any]]:
+        """Extract fields from a batch of texts
+
+        Args:
+            texts: Transcripts or messages
+            references: When each text was said (default: today for all)
+
+        Returns:
+            One dict of fields per text, in order
+        """
+        if references is None:
+            today = date.today()
+            return [self.extract(text, today) for text in texts]
+        return [self.extract(text, reference) for text, reference in zip(texts, references)]
@@ -0,0 +1,269 @@
+"""Replay protection for Twilio webhooks
+
+Twilio retries a webhook when our response is slow or fails, reusing the
+same CallSid/MessageSid. The ``idempotent`` decorator remembers the
+response sent for each id and returns it for replays without running the
+handler again, so retries do not create duplicate records or jobs. The id
+is reserved before the handler runs, so a retry arriving while the first
+request is still being handled waits for its response instead of running
+the handler a second time.
+
+Responses are cached in memory by default. The SQLite backend shares the
+cache between worker processes on one host.
+"""
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+from typing import Dict, Optional, Tuple
+
+from flask import Response, current_app, jsonify, request
+
+from cache import TTLCache
+
+# (body, status code, mimetype)
+CachedResponse = Tuple[bytes, int, str]
+
+# How often the SQLite backend checks for a response stored by another process
+POLL_INTERVAL = 0.05
+
+
+class MemoryBackend:
+    """Per-process cache backed by a bounded TTL LRU"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 3600):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._in_flight: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        return self._cache.get(key)
+
+    def reserve(self, key: str) -> bool:
+        """Claim ``key`` for a request about to run the handler
+
+        Returns:
+            False if a response is stored or another request holds the key
+        """
+        with self._lock:
+            if key in self._in_flight or key in self._cache:
+                return False
+            self._in_flight[key] = threading.Event()
+            return True
+
+    def put(self, key: str, value: CachedResponse):
+        self._cache.put(key, value)
+        self.release(key)
+
+    def release(self, key: str):
+        """Give up a reservation without storing a response"""
+        with self._lock:
+            done = self._in_flight.pop(key, None)
+        if done is not None:
+            done.set()
+
+    def wait(self, key: str, timeout: float) -> Optional[CachedResponse]:
+        """Wait for the request holding ``key`` to finish
+
+        Returns:
+            Its response, or None if it stored none or ``timeout`` passed
+        """
+        with self._lock:
+            done = self._in_flight.get(key)
+        if done is not None:
+            done.wait(max(0.0, timeout))
+        return self._cache.get(key)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class SqliteBackend:
+    """Cache shared by every process using the same database file"""
+
+    def __init__(self, path: str, ttl: float = 3600, max_size: int = 100000, in_flight_ttl: float = 60):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        # A reservation left by a process that died is ignored after this long
+        self.in_flight_ttl = in_flight_ttl
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, body BLOB, status INTEGER, mimetype TEXT, expires_at REAL)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        row = self._conn().execute(
+            "SELECT body, status, mimetype FROM responses WHERE key = ? AND status IS NOT NULL AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return bytes(row[0]), row[1], row[2]
+
+    def reserve(self, key: str) -> bool:
+        """Claim ``key`` with an in-flight row (no status yet)
+
+        Returns:
+            False if a response is stored or another request holds the key
+        """
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute("DELETE FROM responses WHERE key = ? AND expires_at <= ?", (key, now))
+            reserved = conn.execute(
+                "INSERT OR IGNORE INTO responses (key, expires_at) VALUES (?, ?)",
+                (key, now + self.in_flight_ttl)
+            ).rowcount == 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return reserved
+
+    def put(self, key: str, value: CachedResponse):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, body, status, mimetype, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value[0], value[1], value[2], time.time() + self.ttl)
+        )
+        with self._lock:
+            self._writes += 1
+            purge = self._writes % 1000 == 0
+        if purge:
+            self.purge()
+
+    def release(self, key: str):
+        """Give up a reservation without storing a response"""
+        self._conn().execute("DELETE FROM responses WHERE key = ? AND status IS NULL", (key,))
+
+    def wait(self, key: str, timeout: float) -> Optional[CachedResponse]:
+        """Wait for the request holding ``key`` to finish, in this process or another
+
+        Returns:
+            Its response, or None if it stored none or ``timeout`` passed
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            row = self._conn().execute(
+                "SELECT body, status, mimetype FROM responses WHERE key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None:
+                return bytes(row[0]), row[1], row[2]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(POLL_INTERVAL, remaining))
+
+    def purge(self):
+        """Drop expired entries and trim the table to ``max_size``"""
+        conn = self._conn()
+        conn.execute("DELETE FROM responses WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM responses WHERE key IN ("
+            "SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_size,)
+        )
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hitRate': round(hits / total, 4) if total else 0.0
+        }
+
+
+def make_backend(backend: str = 'memory', path: Optional[str] = None, ttl: float = 3600,
+                 max_size: int = 10000):
+    """Build the named cache backend ('memory' or 'sqlite')"""
+    if backend == 'sqlite':
+        if not path:
+            raise ValueError("IDEMPOTENCY_PATH is required for the sqlite backend")
+        return SqliteBackend(path, ttl=ttl, max_size=max_size)
+    return MemoryBackend(max_size=max_size, ttl=ttl)
+
+
+class IdempotencyCache:
+    """Caches webhook responses by Twilio resource id
+
+    The backend may be attached after the views are decorated, e.g. once an
+    app factory has built it; until then requests pass straight through.
+    A replay arriving while the first request is still running waits up to
+    ``wait`` seconds for its response, then gets a 409.
+    """
+
+    def __init__(self, backend=None, wait: float = 10):
+        self.backend = backend
+        self.wait = wait
+
+    def idempotent(self, *id_fields: str):
+        """Decorate a webhook view so replays return the first response
+
+        The key is the route plus the first of ``id_fields`` present in the
+        request form. Requests without any of them, and 5xx responses (which
+        Twilio should be allowed to retry), are never cached.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                backend = self.backend
+                resource_id = next((request.form.get(name) for name in id_fields if request.form.get(name)), None)
+                if backend is None or resource_id is None:
+                    return view(*args, **kwargs)
+
+                key = f"{request.path}:{resource_id}"
+                cached = backend.get(key)
+                deadline = time.monotonic() + self.wait
+                while cached is None and not backend.reserve(key):
+                    # Another request holds the id; if it stores nothing, try to take over
+                    cached = backend.wait(key, deadline - time.monotonic())
+                    if cached is None and time.monotonic() >= deadline:
+                        return jsonify({"error": "A request with this id is already being handled"}), 409
+                if cached is not None:
+                    body, status, mimetype = cached
+                    return Response(body, status=status, mimetype=mimetype)
+
+                try:
+                    response = current_app.make_response(view(*args, **kwargs))
+                except Exception:
+                    backend.release(key)
+                    raise
+                if response.status_code < 500 and not response.is_streamed:
+                    backend.put(key, (response.get_data(), response.status_code, response.mimetype))
+                else:
+                    backend.release(key)
+                return response
+            return wrapper
+        return decorator
+
+    def stats(self):
+        return self.backend.stats()
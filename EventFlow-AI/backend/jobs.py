@@ -0,0 +1,333 @@
+"""Background job queue and worker pool for EventFlow-AI
+
+Webhook handlers enqueue work (recording processing, transcription and SMS
+analysis) into a durable SQLite-backed queue and return to Twilio straight
+away. A pool of worker threads drains the queue in the background.
+
+Each job runs under a deadline (see resilience.py) that bounds the time its
+outbound calls may take. A job whose handler raises ``CircuitOpen`` (an
+open circuit breaker) is put back until the breaker lets calls through
+again, without using up one of its attempts.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from resilience import CircuitOpen, deadline
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = 'queued'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class JobQueue:
+    """Durable job queue stored in a local SQLite file
+
+    Jobs survive process restarts: anything left ``running`` when the
+    previous process died is put back to ``queued`` on startup. Several
+    processes can share one queue file; pass ``recover=False`` to all but the
+    first so they do not requeue each other's running jobs.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after);
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, recover: bool = True):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        if recover:
+            self._recover()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _recover(self):
+        """Requeue jobs that were in flight when the last process stopped"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (STATUS_QUEUED, time.time(), STATUS_RUNNING)
+            )
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], delay: float = 0) -> int:
+        """Persist a job and wake one idle worker
+
+        Args:
+            kind: Name of the registered handler
+            payload: Keyword arguments for the handler
+            delay: Seconds to wait before the job may run
+
+        Returns:
+            The id of the new job
+        """
+        now = time.time()
+        with self._available:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (kind, payload, status, run_after, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (kind, json.dumps(payload), STATUS_QUEUED, now + delay, now, now)
+            )
+            self._available.notify()
+            return cursor.lastrowid
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        """Take the oldest runnable job, waiting up to ``timeout`` seconds"""
+        with self._available:
+            job = self._claim_locked()
+            if job is None:
+                self._available.wait(timeout)
+                job = self._claim_locked()
+            return job
+
+    def _claim_locked(self) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = self._conn.execute(
+                "SELECT id, kind, payload, attempts FROM jobs "
+                "WHERE status = ? AND run_after <= ? ORDER BY id LIMIT 1",
+                (STATUS_QUEUED, now)
+            ).fetchone()
+            if row is None:
+                self._conn.execute('COMMIT')
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (STATUS_RUNNING, now, row[0])
+            )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'payload': json.loads(row[2]),
+            'attempts': row[3] + 1
+        }
+
+    def complete(self, job_id: int):
+        """Mark a job as finished"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (STATUS_DONE, time.time(), job_id)
+            )
+
+    def fail(self, job_id: int, attempts: int, error: str):
+        """Record a failure, rescheduling with exponential backoff until attempts run out"""
+        now = time.time()
+        with self._lock:
+            if attempts < self.max_attempts:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, run_after = ?, updated_at = ? WHERE id = ?",
+                    (STATUS_QUEUED, error, now + 2 ** attempts, now, job_id)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                    (STATUS_FAILED, error, now, job_id)
+                )
+
+    def postpone(self, job_id: int, delay: float, error: str):
+        """Requeue a job to run after ``delay`` seconds without counting the attempt"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0), error = ?, run_after = ?, "
+                "updated_at = ? WHERE id = ?",
+                (STATUS_QUEUED, error, now + delay, now, job_id)
+            )
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Return a single job's status, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, kind, status, attempts, error, created_at, updated_at FROM jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'kind': row[1],
+            'status': row[2],
+            'attempts': row[3],
+            'error': row[4],
+            'createdAt': row[5],
+            'updatedAt': row[6]
+        }
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of jobs in each status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in (STATUS_QUEUED, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    def queue_delay(self) -> float:
+        """Return how many seconds the oldest job due to run has been waiting"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(run_after) FROM jobs WHERE status = ? AND run_after <= ?", (STATUS_QUEUED, now)
+            ).fetchone()
+        return now - row[0] if row[0] is not None else 0.0
+
+    def purge(self, older_than: float):
+        """Delete finished jobs last updated more than ``older_than`` seconds ago"""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status = ? AND updated_at < ?",
+                (STATUS_DONE, time.time() - older_than)
+            )
+
+    def wake_all(self):
+        """Wake every waiting worker (used on shutdown)"""
+        with self._available:
+            self._available.notify_all()
+
+
+class WorkerPool:
+    """Fixed-size pool of threads executing jobs from a JobQueue"""
+
+    def __init__(self, queue: JobQueue, size: int = 4, job_deadline: Optional[float] = None,
+                 retention: Optional[float] = 86400, purge_interval: float = 600):
+        """
+        Args:
+            queue: The queue to drain
+            size: Number of worker threads
+            job_deadline: Seconds each job's outbound calls may take in total
+            retention: Seconds finished jobs are kept for ``/api/jobs/<id>``
+                before a worker deletes them (None keeps them)
+            purge_interval: Seconds between purges
+        """
+        self.queue = queue
+        self.size = size
+        self.job_deadline = job_deadline
+        self.retention = retention
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._handlers: Dict[str, Callable[..., Any]] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = threading.Event()
+        self._active = 0
+        self._active_lock = threading.Lock()
+
+    def register(self, kind: str, handler: Callable[..., Any]):
+        """Register the function that runs jobs of the given kind
+
+        The job payload is passed to the handler as keyword arguments.
+        """
+        self._handlers[kind] = handler
+
+    def start(self):
+        """Start the worker threads"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for index in range(self.size):
+            thread = threading.Thread(target=self._run, name=f"eventflow-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._purge_if_due()
+            job = self.queue.claim()
+            if job is None:
+                continue
+            with self._active_lock:
+                self._active += 1
+            try:
+                self._execute(job)
+            finally:
+                with self._active_lock:
+                    self._active -= 1
+
+    def _purge_if_due(self):
+        if self.retention is None or time.time() < self._next_purge:
+            return
+        # One worker purges; the others carry on
+        if not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._next_purge = time.time() + self.purge_interval
+            self.queue.purge(self.retention)
+        except Exception as e:
+            logger.error(f"Error purging finished jobs: {str(e)}")
+        finally:
+            self._purge_lock.release()
+
+    def _execute(self, job: Dict[str, Any]):
+        handler = self._handlers.get(job['kind'])
+        if handler is None:
+            self.queue.fail(job['id'], self.queue.max_attempts, f"No handler registered for {job['kind']}")
+            return
+        try:
+            with deadline(self.job_deadline):
+                handler(**job['payload'])
+            self.queue.complete(job['id'])
+        except CircuitOpen as e:
+            # Back when the breaker next lets a trial call through
+            logger.warning(f"Job {job['id']} ({job['kind']}) postponed: {str(e)}")
+            self.queue.postpone(job['id'], max(e.retry_after, 1.0), str(e))
+        except Exception as e:
+            logger.error(f"Job {job['id']} ({job['kind']}) failed: {str(e)}")
+            self.queue.fail(job['id'], job['attempts'], str(e))
+
+    def shutdown(self, timeout: float = 30.0):
+        """Stop claiming new jobs and wait for in-flight jobs to finish
+
+        Jobs still queued stay on disk and are picked up on the next start.
+        """
+        self._stopping.set()
+        self.queue.wake_all()
+        stop_by = time.time() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, stop_by - time.time()))
+        self._threads = []
+
+    def status(self) -> Dict[str, Any]:
+        """Return pool and queue status for introspection"""
+        with self._active_lock:
+            active = self._active
+        return {
+            'workers': self.size,
+            'running': bool(self._threads) and not self._stopping.is_set(),
+            'active': active,
+            'jobs': self.queue.counts()
+        }
@@ -0,0 +1,133 @@
+"""Paginated lead listing backed by the local store's Leads table
+
+Pages are read with LocalStore.list_page, which takes Airtable-style
+``pageSize``/``offset``/``fields[]``/``sort`` parameters. Its keyset offset
+is wrapped in an opaque cursor together with the sort it belongs to, and
+first pages are cached briefly since that is what every dashboard load
+asks for.
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from cache import TTLCache
+from local_store import decode_offset
+
+# API field name -> Airtable Leads column
+LEAD_FIELDS = {
+    'name': 'Name',
+    'phoneNumber': 'PhoneNumber',
+    'eventType': 'EventType',
+    'status': 'Status',
+    'timestamp': 'Timestamp'
+}
+DEFAULT_SORT = '-timestamp'
+MAX_PAGE_SIZE = 100
+
+
+class InvalidQuery(ValueError):
+    """Raised for malformed listing parameters"""
+
+
+def encode_cursor(offset: str, sort: str) -> str:
+    payload = json.dumps({'o': offset, 's': sort}, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        offset, sort = payload['o'], payload['s']
+        if not isinstance(sort, str):
+            raise TypeError(sort)
+        decode_offset(offset)
+        return offset, sort
+    except (ValueError, KeyError, TypeError):
+        raise InvalidQuery("Invalid cursor")
+
+
+def lead_from_record(record: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """Convert a Leads record to the API representation"""
+    record_fields = record.get('fields', {})
+    lead = {'id': record.get('id')}
+    for name in fields:
+        lead[name] = record_fields.get(LEAD_FIELDS[name])
+    return lead
+
+
+class LeadLister:
+    """Lists leads a page at a time"""
+
+    def __init__(self, client, cache_ttl: float = 15):
+        self.client = client
+        self.first_pages = TTLCache(max_size=64, ttl=cache_ttl)
+
+    def parse_fields(self, value: Optional[str]) -> List[str]:
+        if not value:
+            return list(LEAD_FIELDS)
+        fields = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in LEAD_FIELDS]
+        if unknown:
+            raise InvalidQuery(f"Unknown fields: {', '.join(unknown)}")
+        return fields
+
+    @staticmethod
+    def parse_sort(value: Optional[str]) -> Dict[str, str]:
+        value = value or DEFAULT_SORT
+        name = value.lstrip('-')
+        if name not in LEAD_FIELDS:
+            raise InvalidQuery(f"Unknown sort field: {name}")
+        return {
+            'sort[0][field]': LEAD_FIELDS[name],
+            'sort[0][direction]': 'desc' if value.startswith('-') else 'asc'
+        }
+
+    def list(self, limit: int = 20, cursor: Optional[str] = None, fields: Optional[str] = None,
+             sort: Optional[str] = None) -> Dict[str, Any]:
+        """Return one page of leads
+
+        Returns:
+            ``{"leads": [...], "nextCursor": str or None}``
+
+        Raises:
+            InvalidQuery: If a parameter is malformed
+        """
+        if limit < 1:
+            raise InvalidQuery("limit must be positive")
+        limit = min(limit, MAX_PAGE_SIZE)
+        field_names = self.parse_fields(fields)
+
+        offset = None
+        if cursor:
+            offset, cursor_sort = decode_cursor(cursor)
+            if sort and sort != cursor_sort:
+                raise InvalidQuery("Cursor does not match the requested sort")
+            sort = cursor_sort
+        sort = sort or DEFAULT_SORT
+        sort_params = self.parse_sort(sort)
+
+        cache_key = f"{limit}|{','.join(field_names)}|{sort}"
+        if offset is None:
+            cached = self.first_pages.get(cache_key)
+            if cached is not None:
+                return cached
+
+        page = self.client.list_page(
+            'Leads',
+            fields=[LEAD_FIELDS[name] for name in field_names],
+            page_size=limit,
+            offset=offset,
+            **sort_params
+        )
+        result = {
+            'leads': [lead_from_record(record, field_names) for record in page.get('records', [])],
+            'nextCursor': encode_cursor(page['offset'], sort) if page.get('offset') else None
+        }
+        if offset is None:
+            self.first_pages.put(cache_key, result)
+        return result
+
+    def invalidate(self):
+        """Drop cached first pages after a lead is written"""
+        self.first_pages.clear()
@@ -0,0 +1,409 @@
+"""Local SQLite system of record for EventFlow-AI
+
+Every handler reads and writes this store; AirtableSyncer (airtable_sync.py)
+copies changes to and from Airtable in the background. The schema mirrors
+the tables declared in config/airtable_config.json: each Airtable field is a
+column of the same name, plus bookkeeping columns prefixed with ``_``.
+
+The store also implements ``list_page``/``iter_records`` with the same
+signatures as AirtableClient, so readers can use either interchangeably.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from config_loader import load_config
+
+# Fields the app writes that are not declared in airtable_config.json
+EXTRA_FIELDS = {
+    'Leads': {'PhoneNumber': 'Phone Number', 'Timestamp': 'Date & Time'}
+}
+INDEXED_FIELDS = {
+    'Transcripts': ['MessageID', 'Timestamp'],
+    'Leads': ['PhoneNumber', 'Timestamp'],
+    'Analytics': ['Date']
+}
+NUMERIC_TYPES = ('Number', 'Currency')
+
+
+def table_schemas() -> Dict[str, Dict[str, str]]:
+    """Return ``{table name: {field: Airtable type}}`` from the Airtable config"""
+    tables = load_config('airtable_config.json').get('airtable', {}).get('tables', {})
+    schemas = {}
+    for table in tables.values():
+        fields = dict(table.get('fields', {}))
+        fields.update(EXTRA_FIELDS.get(table['name'], {}))
+        schemas[table['name']] = fields
+    return schemas
+
+
+def decode_offset(offset: str) -> Tuple[Any, int]:
+    """Split a ``list_page`` offset into the last sort value and ``_id``
+
+    Raises:
+        ValueError: If the offset is malformed
+    """
+    try:
+        last_value, last_id = json.loads(offset)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid offset")
+    if (not isinstance(last_id, int) or isinstance(last_id, bool)
+            or not isinstance(last_value, (str, int, float, type(None)))):
+        raise ValueError("Invalid offset")
+    return last_value, last_id
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+class LocalStore:
+    """SQLite (WAL mode) store mirroring the Airtable tables"""
+
+    def __init__(self, path: str, schemas: Optional[Dict[str, Dict[str, str]]] = None):
+        self.path = path
+        self.schemas = schemas or table_schemas()
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._migrate()
+
+    @property
+    def configured(self) -> bool:
+        return True
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _migrate(self):
+        """Create tables and add columns for fields added to the config"""
+        conn = self._conn()
+        with self._write_lock:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS _sync_state (name TEXT PRIMARY KEY, value TEXT)"
+            )
+            for table, fields in self.schemas.items():
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {_quote(table)} ("
+                    "_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                    "_airtable_id TEXT UNIQUE, "
+                    "_version INTEGER NOT NULL DEFAULT 1, "
+                    "_synced_version INTEGER NOT NULL DEFAULT 0, "
+                    "_created_at REAL NOT NULL)"
+                )
+                existing = {row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table)})")}
+                for field, field_type in fields.items():
+                    if field not in existing:
+                        column_type = 'REAL' if field_type.startswith(NUMERIC_TYPES) else 'TEXT'
+                        conn.execute(f"ALTER TABLE {_quote(table)} ADD COLUMN {_quote(field)} {column_type}")
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + table + '_dirty')} "
+                    f"ON {_quote(table)} (_synced_version, _version)"
+                )
+                for field in INDEXED_FIELDS.get(table, []):
+                    if field in fields:
+                        conn.execute(
+                            f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + table + '_' + field)} "
+                            f"ON {_quote(table)} ({_quote(field)})"
+                        )
+
+    def _fields(self, table: str) -> List[str]:
+        if table not in self.schemas:
+            raise KeyError(f"Unknown table: {table}")
+        return list(self.schemas[table])
+
+    def _check_fields(self, table: str, fields: Dict[str, Any]) -> Dict[str, Any]:
+        known = self.schemas.get(table)
+        if known is None:
+            raise KeyError(f"Unknown table: {table}")
+        unknown = [name for name in fields if name not in known]
+        if unknown:
+            raise ValueError(f"Unknown fields for {table}: {', '.join(unknown)}")
+        return {name: ', '.join(value) if isinstance(value, list) else value for name, value in fields.items()}
+
+    def _to_record(self, table: str, row: sqlite3.Row, fields: Optional[List[str]] = None) -> Dict[str, Any]:
+        names = fields or self._fields(table)
+        values = {name: row[name] for name in names if row[name] is not None}
+        return {
+            'id': row['_airtable_id'] or f"local-{row['_id']}",
+            'localId': row['_id'],
+            'fields': values
+        }
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        return self._conn().execute(sql, params).fetchall()
+
+    def insert(self, table: str, fields: Dict[str, Any]) -> int:
+        """Insert a record, marking it for sync
+
+        Returns:
+            The local row id
+        """
+        fields = self._check_fields(table, fields)
+        columns = ', '.join(['_created_at'] + [_quote(name) for name in fields])
+        placeholders = ', '.join(['?'] * (len(fields) + 1))
+        with self._write_lock:
+            cursor = self._conn().execute(
+                f"INSERT INTO {_quote(table)} ({columns}) VALUES ({placeholders})",
+                (time.time(), *fields.values())
+            )
+            return cursor.lastrowid
+
+    def insert_unique(self, table: str, field: str, fields: Dict[str, Any]) -> Tuple[int, bool]:
+        """Insert a record unless one with the same ``field`` value exists
+
+        The check and insert are one statement, so processes sharing the
+        store cannot both insert the same value.
+
+        Returns:
+            The local id of the new or existing record, and whether it was
+            inserted
+        """
+        fields = self._check_fields(table, fields)
+        columns = ', '.join(['_created_at'] + [_quote(name) for name in fields])
+        placeholders = ', '.join(['?'] * (len(fields) + 1))
+        with self._write_lock:
+            cursor = self._conn().execute(
+                f"INSERT INTO {_quote(table)} ({columns}) SELECT {placeholders} "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {_quote(table)} WHERE {_quote(field)} = ?)",
+                (time.time(), *fields.values(), fields[field])
+            )
+            if cursor.rowcount:
+                return cursor.lastrowid, True
+        rows = self._query(f"SELECT MIN(_id) AS _id FROM {_quote(table)} WHERE {_quote(field)} = ?",
+                           (fields[field],))
+        return rows[0]['_id'], False
+
+    def update(self, table: str, local_id: int, fields: Dict[str, Any]) -> bool:
+        """Patch a record by local id, marking it for sync"""
+        fields = self._check_fields(table, fields)
+        assignments = ', '.join(f"{_quote(name)} = ?" for name in fields)
+        with self._write_lock:
+            cursor = self._conn().execute(
+                f"UPDATE {_quote(table)} SET {assignments}, _version = _version + 1 WHERE _id = ?",
+                (*fields.values(), local_id)
+            )
+            return cursor.rowcount > 0
+
+    def update_latest_by(self, table: str, field: str, value: Any, fields: Dict[str, Any]) -> Optional[int]:
+        """Patch the most recent record whose ``field`` equals ``value``
+
+        Returns:
+            The local id of the updated record, or None if none matched
+        """
+        self._check_fields(table, {field: value})
+        rows = self._query(
+            f"SELECT MAX(_id) AS _id FROM {_quote(table)} WHERE {_quote(field)} = ?", (value,)
+        )
+        local_id = rows[0]['_id'] if rows else None
+        if local_id is None or not self.update(table, local_id, fields):
+            return None
+        return local_id
+
+    def get(self, table: str, local_id: int) -> Optional[Dict[str, Any]]:
+        rows = self._query(f"SELECT * FROM {_quote(table)} WHERE _id = ?", (local_id,))
+        return self._to_record(table, rows[0]) if rows else None
+
+    def find_by(self, table: str, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Return records whose ``field`` equals ``value``, newest first"""
+        self._check_fields(table, {field: value})
+        rows = self._query(
+            f"SELECT * FROM {_quote(table)} WHERE {_quote(field)} = ? ORDER BY _id DESC", (value,)
+        )
+        return [self._to_record(table, row) for row in rows]
+
+    def list_page(self, table: str, fields: Optional[List[str]] = None, page_size: int = 100,
+                  offset: Optional[str] = None, **params) -> Dict[str, Any]:
+        """Airtable-compatible page read
+
+        ``offset`` is a keyset position (the last row's sort value and
+        ``_id``), so deep pages cost the same as the first one.
+
+        Raises:
+            ValueError: If ``offset`` was not returned by this method
+        """
+        field_names = fields or self._fields(table)
+        self._check_fields(table, dict.fromkeys(field_names))
+
+        sort_field = params.get('sort[0][field]')
+        descending = True
+        if sort_field:
+            self._check_fields(table, {sort_field: None})
+            descending = params.get('sort[0][direction]') == 'desc'
+        direction, after = ('DESC', '<') if descending else ('ASC', '>')
+
+        where, values = '', ()
+        if offset:
+            last_value, last_id = decode_offset(offset)
+            if not sort_field:
+                where, values = f"WHERE _id {after} ?", (last_id,)
+            else:
+                column = _quote(sort_field)
+                # SQLite sorts NULLs first ascending and last descending
+                if last_value is None:
+                    where = f"WHERE ({column} IS NULL AND _id {after} ?)"
+                    if not descending:
+                        where += f" OR {column} IS NOT NULL"
+                    values = (last_id,)
+                else:
+                    where = f"WHERE {column} {after} ? OR ({column} = ? AND _id {after} ?)"
+                    if descending:
+                        where += f" OR {column} IS NULL"
+                    values = (last_value, last_value, last_id)
+        order = f"{_quote(sort_field)} {direction}, _id {direction}" if sort_field else f"_id {direction}"
+
+        page_size = min(page_size, 100)
+        rows = self._query(
+            f"SELECT * FROM {_quote(table)} {where} ORDER BY {order} LIMIT ?",
+            values + (page_size + 1,)
+        )
+        page = {'records': [self._to_record(table, row, field_names) for row in rows[:page_size]]}
+        if len(rows) > page_size:
+            last = rows[page_size - 1]
+            page['offset'] = json.dumps([last[sort_field] if sort_field else None, last['_id']],
+                                        separators=(',', ':'))
+        return page
+
+    def iter_records(self, table: str, fields: Optional[List[str]] = None, **params) -> Iterator[Dict[str, Any]]:
+        """Yield every record in a table"""
+        field_names = fields or self._fields(table)
+        self._check_fields(table, dict.fromkeys(field_names))
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(f"SELECT * FROM {_quote(table)} ORDER BY _id"):
+                yield self._to_record(table, row, field_names)
+        finally:
+            conn.close()
+
+    def iter_range(self, table: str, field: str, low: Any = None, high: Any = None,
+                   fields: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Yield records with ``low <= field < high`` in ``field`` order
+
+        Either bound may be None. Uses the field's index when it has one
+        and reads one row at a time, however many match.
+        """
+        field_names = fields or self._fields(table)
+        self._check_fields(table, dict.fromkeys(field_names + [field]))
+        conditions, params = [f"{_quote(field)} IS NOT NULL"], []
+        if low is not None:
+            conditions.append(f"{_quote(field)} >= ?")
+            params.append(low)
+        if high is not None:
+            conditions.append(f"{_quote(field)} < ?")
+            params.append(high)
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute(
+                f"SELECT * FROM {_quote(table)} WHERE {' AND '.join(conditions)} ORDER BY {_quote(field)}, _id",
+                params
+            ):
+                yield self._to_record(table, row, field_names)
+        finally:
+            conn.close()
+
+    def count(self, table: str) -> int:
+        self._fields(table)
+        return self._query(f"SELECT COUNT(*) AS n FROM {_quote(table)}")[0]['n']
+
+    def dirty(self, table: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """Records with local changes not yet pushed to Airtable"""
+        rows = self._query(
+            f"SELECT * FROM {_quote(table)} WHERE _version > _synced_version ORDER BY _id LIMIT ?",
+            (limit,)
+        )
+        records = []
+        for row in rows:
+            record = self._to_record(table, row)
+            record['airtableId'] = row['_airtable_id']
+            record['version'] = row['_version']
+            records.append(record)
+        return records
+
+    def dirty_count(self) -> Dict[str, int]:
+        return {
+            table: self._query(
+                f"SELECT COUNT(*) AS n FROM {_quote(table)} WHERE _version > _synced_version"
+            )[0]['n']
+            for table in self.schemas
+        }
+
+    def mark_synced(self, table: str, local_id: int, version: int, airtable_id: str):
+        """Record that ``version`` of a row now exists in Airtable as ``airtable_id``"""
+        with self._write_lock:
+            conn = self._conn()
+            # A pull may already have copied the pushed record in as a separate row
+            conn.execute(
+                f"DELETE FROM {_quote(table)} WHERE _airtable_id = ? AND _id != ?",
+                (airtable_id, local_id)
+            )
+            conn.execute(
+                f"UPDATE {_quote(table)} SET _airtable_id = ?, "
+                "_synced_version = MAX(_synced_version, ?) WHERE _id = ?",
+                (airtable_id, version, local_id)
+            )
+
+    def apply_remote(self, table: str, record: Dict[str, Any]) -> Optional[int]:
+        """Upsert a record pulled from Airtable
+
+        Local rows with unpushed changes win; they overwrite Airtable on the
+        next push.
+
+        Returns:
+            The local id of the record if its local copy changed, else None
+        """
+        known = self.schemas.get(table, {})
+        fields = self._check_fields(table, {
+            name: value for name, value in record.get('fields', {}).items() if name in known
+        })
+        airtable_id = record['id']
+        with self._write_lock:
+            conn = self._conn()
+            row = conn.execute(
+                f"SELECT _id, _version, _synced_version FROM {_quote(table)} WHERE _airtable_id = ?",
+                (airtable_id,)
+            ).fetchone()
+            if row is None:
+                columns = ['_airtable_id', '_version', '_synced_version', '_created_at'] + list(fields)
+                cursor = conn.execute(
+                    f"INSERT INTO {_quote(table)} ({', '.join(_quote(c) for c in columns)}) "
+                    f"VALUES ({', '.join(['?'] * len(columns))})",
+                    (airtable_id, 1, 1, time.time(), *fields.values())
+                )
+                return cursor.lastrowid
+            if row[1] > row[2]:
+                return None
+            # Clear columns Airtable no longer returns (emptied cells are omitted)
+            values = {name: fields.get(name) for name in known}
+            assignments = ', '.join(f"{_quote(name)} = ?" for name in values)
+            conn.execute(
+                f"UPDATE {_quote(table)} SET {assignments} WHERE _id = ?",
+                (*values.values(), row[0])
+            )
+            return row[0]
+
+    def get_state(self, name: str) -> Optional[str]:
+        rows = self._query("SELECT value FROM _sync_state WHERE name = ?", (name,))
+        return rows[0]['value'] if rows else None
+
+    def set_state(self, name: str, value: str):
+        with self._write_lock:
+            self._conn().execute(
+                "INSERT INTO _sync_state (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (name, value)
+            )
@@ -0,0 +1,371 @@
+"""Prometheus-format metrics for EventFlow-AI
+
+Counters, gauges and histograms live in process memory behind one small lock
+per metric, so recording a sample costs a dict lookup and a few additions.
+``render()`` produces the Prometheus text exposition format served at
+``/metrics``.
+
+With several worker processes (gunicorn), set ``METRICS_DIR`` to a directory
+shared by the workers. Each process then writes its samples to
+``<pid>.json`` there every ``flush_interval`` seconds and ``render()`` merges
+every file: counters and histograms are summed across all processes,
+including ones that have exited, and gauges are combined across live
+processes only. Clear the directory when the server is (re)deployed.
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast local reads up to slow transcriptions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def samples(self) -> List[Tuple[LabelValues, Any]]:
+        with self._lock:
+            return [(key, self._copy(value)) for key, value in self._values.items()]
+
+    @staticmethod
+    def _copy(value):
+        return value
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """Mirror a running total kept elsewhere, e.g. a cache's hit count"""
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Gauge(_Metric):
+    """Value that can go up and down
+
+    ``mode`` says how values from several processes combine: ``'sum'`` for
+    per-process quantities (in-memory buffers) and ``'max'`` for readings of
+    shared state (the job queue database), which every process reports alike.
+    """
+
+    type = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), mode: str = 'sum'):
+        if mode not in ('sum', 'max'):
+            raise ValueError(f"Unknown gauge mode: {mode}")
+        super().__init__(name, help_text, labelnames)
+        self.mode = mode
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+
+    type = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, the last one for +Inf
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    @staticmethod
+    def _copy(value):
+        return [list(value[0]), value[1], value[2]]
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.directory: Optional[str] = None
+        self.flush_interval = 5.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = (), mode: str = 'sum') -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames, mode))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, callback: Callable[[], None]):
+        """Run ``callback`` before each snapshot, e.g. to set gauges from queue sizes"""
+        self._collectors.append(callback)
+
+    def _collect(self):
+        for callback in self._collectors:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {str(e)}")
+
+    def snapshot(self, include_gauges: bool = True) -> Dict[str, Any]:
+        """Return this process's samples in the on-disk format"""
+        self._collect()
+        result = {}
+        for metric in list(self._metrics.values()):
+            if metric.type == 'gauge' and not include_gauges:
+                continue
+            result[metric.name] = [[list(key), value] for key, value in metric.samples()]
+        return {'pid': os.getpid(), 'time': time.time(), 'metrics': result}
+
+    # Multi-process support
+
+    def enable_multiprocess(self, directory: str, flush_interval: float = 5.0):
+        """Share samples with other processes through ``directory``"""
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._start_flusher()
+        import atexit
+        atexit.register(self.close)
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def flush(self, include_gauges: bool = True):
+        """Write this process's samples for the other workers to read"""
+        if not self.directory:
+            return
+        data = self.snapshot(include_gauges)
+        path = self._path(data['pid'])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _start_flusher(self):
+        self._stop = threading.Event()
+
+        def run():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Error writing metrics: {str(e)}")
+
+        self._thread = threading.Thread(target=run, name='eventflow-metrics', daemon=True)
+        self._thread.start()
+
+    def _after_fork(self):
+        # A forked worker starts counting from zero under its own pid
+        self._lock = threading.Lock()
+        for metric in self._metrics.values():
+            metric._reset()
+        if self.directory:
+            self._start_flusher()
+
+    def close(self):
+        """Write final counters; gauges of an exited process no longer apply"""
+        self._stop.set()
+        if self.directory:
+            try:
+                self.flush(include_gauges=False)
+            except Exception as e:
+                logger.error(f"Error writing metrics: {str(e)}")
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _gather(self) -> List[Dict[str, Any]]:
+        """Snapshots of this and, in multi-process mode, every other process"""
+        own = self.snapshot()
+        if not self.directory:
+            return [own]
+        snapshots = [own]
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if data.get('pid') == own['pid']:
+                continue
+            if not self._alive(data.get('pid', 0)):
+                data['metrics'] = {name: samples for name, samples in data['metrics'].items()
+                                   if not isinstance(self._metrics.get(name), Gauge)}
+            snapshots.append(data)
+        return snapshots
+
+    def _merge(self, metric: _Metric, snapshots: List[Dict[str, Any]]) -> Dict[LabelValues, Any]:
+        merged: Dict[LabelValues, Any] = {}
+        for data in snapshots:
+            for key, value in data['metrics'].get(metric.name, []):
+                key = tuple(key)
+                current = merged.get(key)
+                if current is None:
+                    merged[key] = Histogram._copy(value) if metric.type == 'histogram' else value
+                elif metric.type == 'histogram':
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                elif metric.type == 'gauge' and metric.mode == 'max':
+                    merged[key] = max(current, value)
+                else:
+                    merged[key] = current + value
+        return merged
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format"""
+        snapshots = self._gather()
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for key, value in sorted(self._merge(metric, snapshots).items()):
+                if metric.type != 'histogram':
+                    lines.append(f"{metric.name}{_format_labels(metric.labelnames, key)} {_format_value(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (float('inf'),), value[0]):
+                    cumulative += count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{metric.name}_bucket{_format_labels(metric.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(metric.labelnames, key)
+                lines.append(f"{metric.name}_sum{labels} {_format_value(value[1])}")
+                lines.append(f"{metric.name}_count{labels} {value[2]}")
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'eventflow_http_requests_total', 'HTTP requests handled, by route and status code',
+    ['method', 'route', 'status']
+)
+HTTP_LATENCY = REGISTRY.histogram(
+    'eventflow_http_request_duration_seconds', 'Time spent handling HTTP requests', ['method', 'route']
+)
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    'eventflow_outbound_requests_total', 'Calls made to external services, by outcome',
+    ['dependency', 'operation', 'status']
+)
+OUTBOUND_LATENCY = REGISTRY.histogram(
+    'eventflow_outbound_request_duration_seconds', 'Time spent waiting on external services',
+    ['dependency', 'operation']
+)
+
+
+class _OutboundCall:
+    status: Any = 'ok'
+
+
+@contextmanager
+def outbound_call(dependency: str, operation: str) -> Iterator[_OutboundCall]:
+    """Time one call to an external service
+
+    Set ``status`` on the yielded object (an HTTP status code, say). If the
+    block raises, the exception's ``status`` attribute is used when it has
+    one, otherwise ``'error'``.
+    """
+    call = _OutboundCall()
+    started = time.perf_counter()
+    try:
+        yield call
+    except Exception as e:
+        call.status = getattr(e, 'status', None) or 'error'
+        raise
+    finally:
+        OUTBOUND_LATENCY.observe(time.perf_counter() - started, dependency=dependency, operation=operation)
+        OUTBOUND_REQUESTS.inc(dependency=dependency, operation=operation, status=call.status)
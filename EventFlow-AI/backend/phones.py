@@ -0,0 +1,171 @@
+"""Phone number normalization and the caller -> lead index for EventFlow-AI
+
+Twilio sends ``From`` in E.164 ("+14155550123"), but numbers typed into the
+dashboard arrive in any format ("(415) 555-0123", "1-415-555-0123",
+"0044 20 7946 0958"). ``normalize_phone`` turns both into E.164 so the same
+caller always has the same key.
+
+``LeadIndex`` maps each normalized number to its Leads row. It is loaded
+from the local store at startup and updated as leads are written, so
+matching an inbound call or SMS to its lead is a dict lookup. Numbers not
+in memory (leads written by another process, or pulled from Airtable) are
+looked up in the store's PhoneNumber and Phone columns before a lead is
+created.
+
+Those lookups, and the duplicate check when a lead is created, compare
+stored values exactly, so the index keeps PhoneNumber in E.164: loading
+rewrites rows stored in another format (or with only Phone set), and
+``pulled`` does the same for leads arriving from Airtable.
+"""
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from local_store import LocalStore
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'Leads'
+PHONE_FIELD = 'PhoneNumber'
+# The Airtable config's own phone column, used by leads created in Airtable
+ALTERNATE_PHONE_FIELD = 'Phone'
+
+_NON_DIGITS = re.compile(r'[^\d]')
+_EXTENSION = re.compile(r'\s*(?:ext\.?|x|#)\s*\d+\s*$', re.IGNORECASE)
+# What Twilio sends as From for anonymous, restricted, blocked, unknown and unavailable callers
+WITHHELD_NUMBERS = frozenset({'+266696687', '+7378742833', '+2562533', '+8656696', '+86282452253'})
+
+
+def normalize_phone(value: Optional[str], default_country: str = '1') -> Optional[str]:
+    """Return ``value`` in E.164 form, or None if it is not a phone number
+
+    Numbers without an international prefix ("+" or "00") are read as
+    national numbers of ``default_country`` (a calling code such as "1" or
+    "44"); a leading trunk "0" is dropped. Extensions are ignored.
+
+    Withheld caller ids and anything outside E.164's 8-15 digits give None.
+    """
+    if not value:
+        return None
+    # "+44 (0)20 ..." writes the trunk prefix that callers from abroad leave out
+    text = _EXTENSION.sub('', str(value).strip()).replace('(0)', '')
+    digits = _NON_DIGITS.sub('', text)
+    if not digits:
+        return None
+    if text.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif default_country == '1' and len(digits) == 11 and digits.startswith('1'):
+        pass
+    else:
+        digits = default_country + digits.lstrip('0')
+    if not 8 <= len(digits) <= 15 or digits.startswith('0') or '+' + digits in WITHHELD_NUMBERS:
+        return None
+    return '+' + digits
+
+
+class LeadIndex:
+    """Normalized phone number -> Leads local id"""
+
+    def __init__(self, store: LocalStore, default_country: str = '1'):
+        self.store = store
+        self.default_country = default_country
+        self.hits = 0
+        self.misses = 0
+        self._ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def normalize(self, value: Optional[str]) -> Optional[str]:
+        return normalize_phone(value, self.default_country)
+
+    def _phone_fields(self) -> List[str]:
+        return [field for field in (PHONE_FIELD, ALTERNATE_PHONE_FIELD) if field in self.store.schemas[TABLE]]
+
+    def _stored_phone(self, fields: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """A lead's normalized number, and whether its PhoneNumber needs rewriting to it"""
+        phone = self.normalize(fields.get(PHONE_FIELD) or fields.get(ALTERNATE_PHONE_FIELD))
+        stale = (phone is not None and fields.get(PHONE_FIELD) != phone
+                 and PHONE_FIELD in self.store.schemas[TABLE])
+        return phone, stale
+
+    def load(self) -> int:
+        """Index every lead in the store; the oldest lead for a number wins
+
+        Leads whose PhoneNumber is missing or not in E.164 are rewritten
+        with the normalized number.
+
+        Returns:
+            The number of distinct phone numbers indexed
+        """
+        ids: Dict[str, int] = {}
+        stale: Dict[int, str] = {}
+        for record in self.store.iter_records(TABLE, fields=self._phone_fields()):
+            phone, rewrite = self._stored_phone(record['fields'])
+            if phone is None:
+                continue
+            ids.setdefault(phone, record['localId'])
+            if rewrite:
+                stale[record['localId']] = phone
+        for local_id, phone in stale.items():
+            self.store.update(TABLE, local_id, {PHONE_FIELD: phone})
+        with self._lock:
+            # Leads added while loading are already in the old map
+            ids.update(self._ids)
+            self._ids = ids
+        if stale:
+            logger.info(f"Normalized the phone number of {len(stale)} leads")
+        logger.info(f"Indexed {len(ids)} lead phone numbers")
+        return len(ids)
+
+    def pulled(self, table: str, local_id: int, record: Dict[str, Any]):
+        """AirtableSyncer hook: normalize and index a lead pulled from Airtable"""
+        if table != TABLE:
+            return
+        phone, rewrite = self._stored_phone(record.get('fields', {}))
+        if phone is None:
+            return
+        if rewrite:
+            self.store.update(TABLE, local_id, {PHONE_FIELD: phone})
+        self.add(phone, local_id)
+
+    def get(self, phone: Optional[str]) -> Optional[int]:
+        """The local id of the lead for an already normalized number"""
+        if phone is None:
+            return None
+        with self._lock:
+            local_id = self._ids.get(phone)
+        if local_id is not None:
+            self.hits += 1
+            return local_id
+        self.misses += 1
+        for field in self._phone_fields():
+            records = self.store.find_by(TABLE, field, phone)
+            if records:
+                local_id = records[-1]['localId']
+                self.add(phone, local_id)
+                break
+        return local_id
+
+    def add(self, phone: str, local_id: int):
+        with self._lock:
+            self._ids.setdefault(phone, local_id)
+
+    def find_or_create(self, phone: str, fields: Dict[str, Any]) -> Tuple[int, bool]:
+        """Return the lead for a normalized number, creating it with ``fields`` if there is none
+
+        Returns:
+            The lead's local id and whether it was just created
+        """
+        local_id = self.get(phone)
+        if local_id is not None:
+            return local_id, False
+        local_id, created = self.store.insert_unique(TABLE, PHONE_FIELD, dict(fields, **{PHONE_FIELD: phone}))
+        self.add(phone, local_id)
+        return local_id, created
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            size = len(self._ids)
+        return {'size': size, 'hits': self.hits, 'misses': self.misses}
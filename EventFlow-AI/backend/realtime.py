@@ -0,0 +1,276 @@
+"""Real-time call transcription for EventFlow-AI
+
+In streaming mode the voice webhook answers with ``<Connect><Stream>`` and
+Twilio opens a websocket to ``/webhook/twilio/media-stream``, sending the
+caller's audio as base64 8 kHz mu-law frames. Each call's audio is relayed
+as it arrives to AssemblyAI's real-time transcription websocket, which
+accepts mu-law directly, and every partial and final transcript is
+classified as it comes back, so a lead is categorized while the caller is
+still talking.
+
+Finished sentences are classified once; only the sentence still being
+spoken is re-scanned on each partial transcript.
+"""
+import base64
+import json
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+from classifier import CategoryClassifier
+from metrics import REGISTRY
+from resilience import guarded_call
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_URL = 'wss://api.assemblyai.com/v2/realtime/ws'
+
+STREAMED_SECONDS = REGISTRY.counter('eventflow_streamed_audio_seconds_total',
+                                    'Call audio relayed to real-time transcription')
+
+# Twilio Media Streams send 20 ms frames; AssemblyAI wants 100-2000 ms per message
+CHUNK_SECONDS = 0.1
+
+
+class StreamingError(Exception):
+    """The real-time transcription service could not be reached"""
+
+
+class StreamingSession:
+    """One open real-time transcription websocket
+
+    Audio is sent from the caller's thread; transcripts are read on a
+    background thread and passed to ``on_transcript(text, final, confidence)``.
+    """
+
+    def __init__(self, websocket, on_transcript: Callable[[str, bool, Optional[float]], None],
+                 chunk_bytes: int):
+        self.websocket = websocket
+        self.on_transcript = on_transcript
+        self.chunk_bytes = chunk_bytes
+        self.closed = False
+        self._buffer = bytearray()
+        self._reader = threading.Thread(target=self._read, name='realtime-transcript', daemon=True)
+        self._reader.start()
+
+    def send(self, audio: bytes):
+        """Queue audio, sending it once a full chunk has built up"""
+        self._buffer += audio
+        if len(self._buffer) >= self.chunk_bytes:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer or self.closed:
+            return
+        from websockets.exceptions import ConnectionClosed
+        try:
+            self.websocket.send(json.dumps({'audio_data': base64.b64encode(bytes(self._buffer)).decode()}))
+        except ConnectionClosed:
+            self.closed = True
+            logger.warning("Real-time transcription session closed while sending audio")
+        self._buffer.clear()
+
+    def _read(self):
+        from websockets.exceptions import ConnectionClosed
+        try:
+            for message in self.websocket:
+                data = json.loads(message)
+                kind = data.get('message_type')
+                if kind in ('PartialTranscript', 'FinalTranscript'):
+                    if data.get('text'):
+                        self.on_transcript(data['text'], kind == 'FinalTranscript', data.get('confidence'))
+                elif kind == 'SessionTerminated':
+                    break
+                elif 'error' in data:
+                    logger.error(f"Real-time transcription error: {data['error']}")
+        except ConnectionClosed as e:
+            if e.rcvd is not None and e.rcvd.code >= 4000:
+                logger.error(f"Real-time transcription session closed: {e.rcvd.code} {e.rcvd.reason}")
+        except Exception as e:
+            logger.error(f"Error reading real-time transcripts: {str(e)}")
+        finally:
+            self.closed = True
+
+    def close(self, timeout: float = 5):
+        """Send the remaining audio, then wait up to ``timeout`` for the last transcripts"""
+        if self.chunk_bytes and len(self._buffer) >= self.chunk_bytes // 2:
+            self._flush()
+        if not self.closed:
+            try:
+                self.websocket.send(json.dumps({'terminate_session': True}))
+            except Exception:
+                pass
+        self._reader.join(timeout)
+        self.websocket.close()
+
+
+class StreamingTranscriber:
+    """Opens AssemblyAI real-time transcription sessions for call audio"""
+
+    def __init__(self, api_key: Optional[str], url: Optional[str] = None, sample_rate: int = 8000,
+                 encoding: str = 'pcm_mulaw', connect_timeout: float = 10):
+        self.api_key = api_key
+        self.url = url or DEFAULT_URL
+        self.sample_rate = sample_rate
+        self.encoding = encoding
+        self.connect_timeout = connect_timeout
+
+    def open(self, on_transcript: Callable[[str, bool, Optional[float]], None]) -> StreamingSession:
+        """Start a session; ``on_transcript`` is called from a background thread
+
+        Raises:
+            StreamingError: If the service cannot be reached or refuses the session
+        """
+        from websockets.sync.client import connect
+
+        query = urlencode({'sample_rate': self.sample_rate, 'encoding': self.encoding})
+        try:
+            with guarded_call('assemblyai', 'WS realtime'):
+                websocket = connect(f"{self.url}?{query}", additional_headers={'Authorization': self.api_key or ''},
+                                    open_timeout=self.connect_timeout)
+        except Exception as e:
+            raise StreamingError(str(e)) from e
+        # mu-law is one byte per sample
+        chunk_bytes = int(self.sample_rate * CHUNK_SECONDS) * (1 if self.encoding == 'pcm_mulaw' else 2)
+        return StreamingSession(websocket, on_transcript, chunk_bytes)
+
+
+class LiveTranscript:
+    """A call's transcript so far and the categories detected in it"""
+
+    def __init__(self, classifier: CategoryClassifier):
+        self.classifier = classifier
+        self.sentences: List[str] = []
+        self.confidences: List[float] = []
+        self.partial = ''
+        self._final_categories: set = set()
+        self._partial_categories: set = set()
+        self._lock = threading.Lock()
+
+    def update(self, text: str, final: bool, confidence: Optional[float] = None) -> bool:
+        """Add a partial or final transcript of the current sentence
+
+        Returns:
+            True if the detected categories changed
+        """
+        categories = set(self.classifier.classify(text))
+        with self._lock:
+            before = self._final_categories | self._partial_categories
+            if final:
+                self.sentences.append(text)
+                if confidence is not None:
+                    self.confidences.append(confidence)
+                self.partial = ''
+                self._final_categories |= categories
+                self._partial_categories = set()
+            else:
+                self.partial = text
+                self._partial_categories = categories
+            return self._final_categories | self._partial_categories != before
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return ' '.join(self.sentences + ([self.partial] if self.partial else []))
+
+    @property
+    def confidence(self) -> Optional[float]:
+        with self._lock:
+            return sum(self.confidences) / len(self.confidences) if self.confidences else None
+
+    @property
+    def categories(self) -> List[str]:
+        """Detected categories in configured order"""
+        with self._lock:
+            found = self._final_categories | self._partial_categories
+        return [category for category in self.classifier.categories if category in found]
+
+
+class MediaStream:
+    """Relays Twilio Media Streams websockets to a streaming transcriber
+
+    The app registers handlers, called with the call's ``LiveTranscript``:
+
+    - ``on_start(call_sid, parameters)`` once the stream starts and the
+      transcription session is open, with the ``<Parameter>`` values
+    - ``on_update(call_sid, live)`` when the detected categories change
+    - ``on_end(call_sid, live)`` after the last transcript has arrived
+    """
+
+    def __init__(self, transcriber: StreamingTranscriber, classifier: CategoryClassifier,
+                 max_duration: float = 60):
+        self.transcriber = transcriber
+        self.classifier = classifier
+        self.max_duration = max_duration
+        self.active = 0
+        self.on_start: Callable[[str, Dict[str, Any]], None] = lambda call_sid, parameters: None
+        self.on_update: Callable[[str, LiveTranscript], None] = lambda call_sid, live: None
+        self.on_end: Callable[[str, LiveTranscript], None] = lambda call_sid, live: None
+        self._lock = threading.Lock()
+
+    def register(self, on_start: Callable[[str, Dict[str, Any]], None],
+                 on_update: Callable[[str, LiveTranscript], None],
+                 on_end: Callable[[str, LiveTranscript], None]):
+        """Set the functions called as each call's transcript progresses"""
+        self.on_start = on_start
+        self.on_update = on_update
+        self.on_end = on_end
+
+    def run(self, websocket):
+        """Handle a Twilio websocket until the call stops streaming
+
+        Returning lets the websocket close; Twilio then moves on to the
+        TwiML after ``<Connect>``.
+        """
+        call_sid = None
+        session = None
+        live = LiveTranscript(self.classifier)
+        streamed = 0
+        max_bytes = int(self.max_duration * self.transcriber.sample_rate)
+        with self._lock:
+            self.active += 1
+        try:
+            while True:
+                message = websocket.receive()
+                if message is None:
+                    break
+                data = json.loads(message)
+                event = data.get('event')
+                if event == 'start':
+                    start = data.get('start', {})
+                    call_sid = start.get('callSid')
+                    try:
+                        session = self.transcriber.open(
+                            lambda text, final, confidence: self._transcript(call_sid, live, text, final, confidence)
+                        )
+                    except StreamingError as e:
+                        logger.error(f"Could not start real-time transcription for {call_sid}: {str(e)}")
+                        call_sid = None
+                        break
+                    self.on_start(call_sid, start.get('customParameters') or {})
+                elif event == 'media' and session is not None:
+                    audio = base64.b64decode(data['media']['payload'])
+                    session.send(audio)
+                    streamed += len(audio)
+                    if streamed >= max_bytes:
+                        logger.info(f"Call {call_sid} reached {self.max_duration}s; ending stream")
+                        break
+                elif event == 'stop':
+                    break
+        finally:
+            with self._lock:
+                self.active -= 1
+            if session is not None:
+                session.close()
+                STREAMED_SECONDS.inc(streamed / self.transcriber.sample_rate)
+            if call_sid is not None:
+                self.on_end(call_sid, live)
+
+    def _transcript(self, call_sid: str, live: LiveTranscript, text: str, final: bool,
+                    confidence: Optional[float]):
+        try:
+            if live.update(text, final, confidence):
+                self.on_update(call_sid, live)
+        except Exception as e:
+            logger.error(f"Error handling real-time transcript for {call_sid}: {str(e)}")
@@ -0,0 +1,262 @@
+"""Call recording pre-processing for EventFlow-AI
+
+Before a recording goes to AssemblyAI it is streamed from Twilio to a local
+spool file, then rewritten block by block as 16-bit PCM WAV in the format
+set by ``audio_config`` in config/assemblyai_config.json:
+
+- leading and trailing silence is trimmed (keeping a little padding)
+- channels are mixed down to mono
+- audio above the configured sample rate is resampled down; lower rates
+  (Twilio records at 8 kHz) are kept, as upsampling only adds bytes
+- anything past ``max_duration`` seconds of speech is cut off
+
+AssemblyAI bills by audio duration, so trimming saves money as well as
+upload time. Neither file is ever read into memory whole.
+"""
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+import time
+import warnings
+import wave
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+import resilience
+from config_loader import load_config
+from metrics import REGISTRY
+
+with warnings.catch_warnings():
+    warnings.simplefilter('ignore', DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        # Removed in Python 3.13; the audioop-lts package provides it again
+        audioop = None
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SECONDS = REGISTRY.counter(
+    'eventflow_recording_seconds_total', 'Recording audio before and after normalization', ['stage']
+)
+AUDIO_BYTES = REGISTRY.counter(
+    'eventflow_recording_bytes_total', 'Recording bytes downloaded and after normalization', ['stage']
+)
+
+CHUNK_SIZE = 64 * 1024
+# Silence is measured over windows of this many seconds
+WINDOW_SECONDS = 0.05
+# Spool files older than this were left behind by a crashed process
+STALE_SPOOL_SECONDS = 3600
+
+WAV_HEADER_SIZE = 44
+
+
+class UnsupportedAudio(Exception):
+    """The recording is not a PCM WAV file this stage can rewrite"""
+
+
+def _wav_header(data_size: int, channels: int, sample_rate: int) -> bytes:
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI',
+        b'RIFF', 36 + data_size, b'WAVE',
+        b'fmt ', 16, 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16,
+        b'data', data_size
+    )
+
+
+class RecordingProcessor:
+    """Downloads recordings and normalizes them for transcription"""
+
+    def __init__(self, spool_dir: str, sample_rate: int = 16000, channels: int = 1,
+                 max_duration: float = 300, silence_threshold: int = 500, padding: float = 0.25,
+                 auth: Optional[Tuple[str, str]] = None):
+        self.spool_dir = spool_dir
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.max_duration = max_duration
+        self.silence_threshold = silence_threshold
+        self.padding = padding
+        self.auth = auth
+        os.makedirs(spool_dir, exist_ok=True)
+        self._remove_stale()
+
+    @classmethod
+    def from_config(cls, spool_dir: str, **kwargs) -> 'RecordingProcessor':
+        """Build from ``audio_config`` in config/assemblyai_config.json"""
+        audio_config = load_config('assemblyai_config.json').get('assemblyai', {}).get('audio_config', {})
+        return cls(
+            spool_dir,
+            sample_rate=audio_config.get('sample_rate', 16000),
+            channels=audio_config.get('channels', 1),
+            max_duration=audio_config.get('max_duration', 300),
+            **kwargs
+        )
+
+    @property
+    def available(self) -> bool:
+        return audioop is not None
+
+    def _remove_stale(self):
+        cutoff = time.time() - STALE_SPOOL_SECONDS
+        for name in os.listdir(self.spool_dir):
+            path = os.path.join(self.spool_dir, name)
+            try:
+                if name.startswith('recording-') and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _spool_file(self, suffix: str):
+        return tempfile.NamedTemporaryFile(dir=self.spool_dir, prefix='recording-', suffix=suffix, delete=False)
+
+    def download(self, url: str) -> Tuple[str, str]:
+        """Stream a recording to the spool directory
+
+        Returns:
+            The path of the downloaded file and the SHA-256 of its contents
+        """
+        import requests
+        digest = hashlib.sha256()
+        spool = self._spool_file('.download')
+        try:
+            # Connect and read timeouts, shortened if the job's deadline is nearer
+            timeout = (resilience.timeout(5), resilience.timeout(60))
+            with spool, resilience.guarded_call('twilio', 'GET recording', count_slow=False) as call:
+                with requests.get(url, auth=self.auth, stream=True, timeout=timeout) as response:
+                    call.status = response.status_code
+                    response.raise_for_status()
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        digest.update(chunk)
+                        spool.write(chunk)
+        except Exception:
+            os.remove(spool.name)
+            raise
+        AUDIO_BYTES.inc(os.path.getsize(spool.name), stage='downloaded')
+        return spool.name, digest.hexdigest()
+
+    def normalize(self, source_path: str) -> Optional[str]:
+        """Rewrite a WAV recording in the configured format
+
+        Returns:
+            The path of the normalized WAV file, or None if the recording
+            is silence from start to end
+
+        Raises:
+            UnsupportedAudio: If the file is not PCM WAV or audioop is missing
+        """
+        if audioop is None:
+            raise UnsupportedAudio("audioop is not available")
+        try:
+            source = wave.open(source_path, 'rb')
+        except (wave.Error, EOFError) as e:
+            raise UnsupportedAudio(str(e))
+
+        with source:
+            width = source.getsampwidth()
+            in_channels = source.getnchannels()
+            in_rate = source.getframerate()
+            out_channels = 1 if self.channels == 1 else in_channels
+            if in_channels > 2 and out_channels == 1:
+                raise UnsupportedAudio(f"cannot mix down {in_channels} channels")
+            out_rate = min(in_rate, self.sample_rate)
+            frame_bytes = 2 * out_channels
+            window_frames = max(1, int(in_rate * WINDOW_SECONDS))
+            pad_bytes = int(self.padding * out_rate) * frame_bytes
+            max_bytes = int(self.max_duration * out_rate) * frame_bytes
+
+            output = self._spool_file('.wav')
+            with output:
+                output.write(b'\0' * WAV_HEADER_SIZE)
+                lead = deque()
+                lead_bytes = 0
+                written = 0
+                voice_end = None
+                state = None
+                while written < max_bytes:
+                    block = source.readframes(window_frames)
+                    if not block:
+                        break
+                    if width == 1:
+                        # 8-bit WAV samples are unsigned
+                        block = audioop.bias(block, 1, -128)
+                    if width != 2:
+                        block = audioop.lin2lin(block, width, 2)
+                    if in_channels == 2 and out_channels == 1:
+                        block = audioop.tomono(block, 2, 0.5, 0.5)
+                    if out_rate != in_rate:
+                        block, state = audioop.ratecv(block, 2, out_channels, in_rate, out_rate, state)
+                    voiced = audioop.rms(block, 2) >= self.silence_threshold
+
+                    if voice_end is None:
+                        if not voiced:
+                            # Keep only the padding's worth of leading silence
+                            lead.append(block)
+                            lead_bytes += len(block)
+                            while lead and lead_bytes - len(lead[0]) >= pad_bytes:
+                                lead_bytes -= len(lead.popleft())
+                            continue
+                        for pending in lead:
+                            output.write(pending)
+                            written += len(pending)
+                        lead.clear()
+
+                    block = block[:max_bytes - written]
+                    output.write(block)
+                    written += len(block)
+                    if voiced:
+                        voice_end = written
+
+                if voice_end is None:
+                    os.remove(output.name)
+                    AUDIO_SECONDS.inc(source.getnframes() / in_rate, stage='recorded')
+                    return None
+
+                # Drop trailing silence beyond the padding
+                size = min(written, voice_end + pad_bytes)
+                output.truncate(WAV_HEADER_SIZE + size)
+                output.seek(0)
+                output.write(_wav_header(size, out_channels, out_rate))
+
+            if written >= max_bytes:
+                logger.warning(f"Recording cut to {self.max_duration}s")
+            AUDIO_SECONDS.inc(source.getnframes() / in_rate, stage='recorded')
+            AUDIO_SECONDS.inc(size / frame_bytes / out_rate, stage='normalized')
+            AUDIO_BYTES.inc(WAV_HEADER_SIZE + size, stage='normalized')
+            return output.name
+
+    def fingerprint(self, normalize: bool = True) -> Dict[str, Any]:
+        """The settings that change what ``prepare`` produces from the same download"""
+        if not normalize:
+            return {'normalize': False}
+        return {
+            'normalize': True,
+            'sample_rate': self.sample_rate,
+            'channels': self.channels,
+            'max_duration': self.max_duration,
+            'silence_threshold': self.silence_threshold,
+            'padding': self.padding
+        }
+
+    def prepare(self, url: str, normalize: bool = True) -> Tuple[Optional[str], str]:
+        """Download a recording and, if asked, normalize it
+
+        Recordings that cannot be normalized are returned as downloaded. The
+        caller deletes the returned file once it has been uploaded.
+
+        Returns:
+            The path of the file to transcribe (None if it is all silence)
+            and the SHA-256 of the downloaded recording
+        """
+        downloaded, digest = self.download(url)
+        if not normalize or audioop is None:
+            return downloaded, digest
+        try:
+            normalized = self.normalize(downloaded)
+        except UnsupportedAudio as e:
+            logger.warning(f"Sending recording unprocessed: {str(e)}")
+            return downloaded, digest
+        os.remove(downloaded)
+        return normalized, digest
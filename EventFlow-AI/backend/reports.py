@@ -0,0 +1,168 @@
+"""Streamed report exports for EventFlow-AI
+
+A report is a chain of generators: rows are read from the local store one
+at a time (by ``Timestamp`` through its index when a date range is given),
+filtered, encoded as CSV or NDJSON, grouped into chunks of about 64 KB and
+optionally gzipped. Nothing holds more than one chunk, so an export of any
+size uses the same memory and the first bytes go out as soon as the first
+rows are read.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from leads import InvalidQuery
+from local_store import LocalStore
+
+# Report name -> local store table
+REPORT_TABLES = {
+    'leads': 'Leads',
+    'transcripts': 'Transcripts'
+}
+# Column the ``category`` filter matches
+CATEGORY_FIELDS = {
+    'Leads': 'EventType',
+    'Transcripts': 'Categories'
+}
+TIME_FIELD = 'Timestamp'
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson'
+}
+CHUNK_SIZE = 64 * 1024
+
+
+def _parse_bound(value: Optional[str], end: bool = False) -> Optional[str]:
+    """ISO date or date-time -> the stored ``Timestamp`` format; a bare ``until`` date includes that day"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise InvalidQuery(f"Invalid date: {value}")
+    if end and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed.isoformat()
+
+
+def _split(values: Iterable[str]) -> List[str]:
+    return [item.strip() for value in values for item in value.split(',') if item.strip()]
+
+
+class ReportQuery:
+    """A validated export request"""
+
+    def __init__(self, report: str = 'leads', format: str = 'csv', since: Optional[str] = None,
+                 until: Optional[str] = None, statuses: Iterable[str] = (), categories: Iterable[str] = (),
+                 compress: bool = False):
+        """
+        Raises:
+            InvalidQuery: If a parameter is malformed
+        """
+        if report not in REPORT_TABLES:
+            raise InvalidQuery(f"Unknown report: {report} (use {' or '.join(REPORT_TABLES)})")
+        if format not in FORMATS:
+            raise InvalidQuery(f"Unknown format: {format} (use {' or '.join(FORMATS)})")
+        self.report = report
+        self.table = REPORT_TABLES[report]
+        self.format = format
+        self.since = _parse_bound(since)
+        self.until = _parse_bound(until, end=True)
+        self.statuses = {status.lower() for status in _split(statuses)}
+        self.categories = {category.lower() for category in _split(categories)}
+        self.compress = compress
+
+    @classmethod
+    def from_args(cls, args) -> 'ReportQuery':
+        """Build from request query parameters (``type``, ``format``, ``since``,
+        ``until``, ``status`` and ``category``, repeatable or comma-separated,
+        and ``gzip``)"""
+        return cls(
+            report=args.get('type', 'leads'),
+            format=args.get('format', 'csv'),
+            since=args.get('since'),
+            until=args.get('until'),
+            statuses=args.getlist('status'),
+            categories=args.getlist('category'),
+            compress=args.get('gzip', '').lower() in ('1', 'true', 'yes')
+        )
+
+    @property
+    def content_type(self) -> str:
+        return 'application/gzip' if self.compress else FORMATS[self.format]
+
+    @property
+    def filename(self) -> str:
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return f"{self.report}-{stamp}.{self.format}" + ('.gz' if self.compress else '')
+
+
+class ReportExporter:
+    """Writes Leads and Transcripts exports from the local store"""
+
+    def __init__(self, store: LocalStore):
+        self.store = store
+
+    def columns(self, query: ReportQuery) -> List[str]:
+        return list(self.store.schemas[query.table])
+
+    def rows(self, query: ReportQuery) -> Iterator[Dict[str, Any]]:
+        """Matching records' fields, oldest first when a date range is given"""
+        columns = self.columns(query)
+        if query.since or query.until:
+            records = self.store.iter_range(query.table, TIME_FIELD, query.since, query.until, fields=columns)
+        else:
+            records = self.store.iter_records(query.table, fields=columns)
+        category_field = CATEGORY_FIELDS[query.table]
+        for record in records:
+            fields = record['fields']
+            if query.statuses and str(fields.get('Status') or 'new').lower() not in query.statuses:
+                continue
+            if query.categories:
+                values = {value.strip().lower() for value in str(fields.get(category_field) or '').split(',')}
+                if query.categories.isdisjoint(values):
+                    continue
+            yield {'id': record['id'], **fields}
+
+    def encode(self, query: ReportQuery, rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+        """Rows as text, in chunks of about CHUNK_SIZE characters"""
+        columns = ['id'] + self.columns(query)
+        buffer = io.StringIO()
+        if query.format == 'csv':
+            writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+            write = writer.writerow
+            # The header goes out at once so the download starts
+            writer.writeheader()
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            def write(row):
+                buffer.write(json.dumps(row, separators=(',', ':'), default=str))
+                buffer.write('\n')
+        first = True
+        for row in rows:
+            write(row)
+            if first or buffer.tell() >= CHUNK_SIZE:
+                first = False
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def export(self, query: ReportQuery) -> Iterator[bytes]:
+        """The whole export as a stream of byte chunks"""
+        chunks = self.encode(query, self.rows(query))
+        if not query.compress:
+            for chunk in chunks:
+                yield chunk.encode()
+            return
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # gzip container
+        for chunk in chunks:
+            # Sync-flush each chunk so it is not held back in the compressor
+            yield compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
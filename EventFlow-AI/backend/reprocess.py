@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Re-run category and lead-detail analysis over the whole Transcripts table
+
+After the category keywords (config/assemblyai_config.json) or the
+extraction rules change, historical rows keep what they were analyzed with.
+This command pages through the table with ``offset`` cursors, fetching only
+the fields analysis needs, classifies pages in a process pool and writes
+back only the rows whose results changed, as 10-record batched patches under
+the Airtable rate limit.
+
+The cursor is checkpointed once every row before it has been written, so an
+interrupted run picks up where it stopped. Airtable cursors expire after a
+while; a resume with an expired cursor starts over from the first page,
+which costs reads but few writes, as rows already done no longer change.
+
+Categories are replaced with what the current rules detect. Guest count,
+event date and budget only fill empty fields unless ``--overwrite`` is given.
+
+Usage:
+    python reprocess.py                      # Airtable, resuming any checkpoint
+    python reprocess.py --dry-run            # count the rows that would change
+    python reprocess.py --local              # the local store instead (synced as usual)
+    python reprocess.py --restart            # ignore the checkpoint
+    python reprocess.py --workers 8 --rate 3
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from airtable_client import AirtableClient, AirtableError
+from classifier import CategoryClassifier
+from extraction import LeadAttributeExtractor
+from local_store import LocalStore
+from settings import Settings
+from write_buffer import BatchWriter
+
+TABLE = 'Transcripts'
+# Only what analysis reads; Airtable leaves every other field out of the pages
+FIELDS = ['MessageID', 'Transcription', 'Timestamp', 'Categories', 'Status', 'GuestCount', 'EventDate', 'Budget']
+EXTRACTED_FIELDS = ('GuestCount', 'EventDate', 'Budget')
+PROGRESS_INTERVAL = 10
+
+_classifier: Optional[CategoryClassifier] = None
+_extractor: Optional[LeadAttributeExtractor] = None
+
+
+def _init_worker():
+    global _classifier, _extractor
+    _classifier = CategoryClassifier.from_config()
+    _extractor = LeadAttributeExtractor()
+
+
+def _said_on(timestamp: Any) -> Optional[date]:
+    if not timestamp:
+        return None
+    try:
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).date()
+    except ValueError:
+        return None
+
+
+def _category_set(value: Any) -> frozenset:
+    if not value:
+        return frozenset()
+    if isinstance(value, str):
+        value = value.split(',')
+    return frozenset(name.strip() for name in value if name.strip())
+
+
+def analyze_fields(fields: Dict[str, Any], classifier: CategoryClassifier, extractor: LeadAttributeExtractor,
+                   overwrite: bool = False) -> Dict[str, Any]:
+    """Work out how one row's analysis fields differ from what the rules give now
+
+    Returns:
+        The fields to patch; empty if the row is up to date
+    """
+    text = fields.get('Transcription')
+    categories = classifier.classify(text)
+    details = extractor.extract(text, _said_on(fields.get('Timestamp')))
+
+    changes: Dict[str, Any] = {}
+    if frozenset(categories) != _category_set(fields.get('Categories')):
+        changes['Categories'] = ', '.join(categories) or None
+    for name in EXTRACTED_FIELDS:
+        value = details.get(name)
+        current = fields.get(name)
+        if value is not None and current != value and (overwrite or current in (None, '')):
+            changes[name] = value
+    if (categories or details) and fields.get('Status') in (None, '', 'new'):
+        changes['Status'] = 'analyzed'
+    return changes
+
+
+def analyze_page(rows: List[Dict[str, Any]], overwrite: bool) -> List[Tuple[int, Dict[str, Any]]]:
+    """Analyze a page of rows in a pool worker
+
+    Returns:
+        ``(position, changes)`` for each row that needs a patch
+    """
+    changed = []
+    for position, fields in enumerate(rows):
+        changes = analyze_fields(fields, _classifier, _extractor, overwrite)
+        if changes:
+            changed.append((position, changes))
+    return changed
+
+
+class Checkpoint:
+    """The next page's cursor and running totals, kept in a JSON file"""
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        self.source = source
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Return the saved progress for this source, if any"""
+        try:
+            with open(self.path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        if state.get('source') != self.source:
+            print(f"Ignoring checkpoint {self.path}: it is for {state.get('source')}")
+            return None
+        return state
+
+    def save(self, state: Dict[str, Any]):
+        """Atomically replace the checkpoint file"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(dict(state, source=self.source, saved_at=time.time()), f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _done(value: Any = None) -> Future:
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+class _Page:
+    __slots__ = ('records', 'next_offset', 'analysis', 'writes')
+
+    def __init__(self, records: List[Dict[str, Any]], next_offset: Optional[str], analysis: Future):
+        self.records = records
+        self.next_offset = next_offset
+        self.analysis = analysis
+        self.writes: List[Future] = []
+
+
+def reprocess(source, write: Callable[[Dict[str, Any], Dict[str, Any]], Future], checkpoint: Checkpoint,
+              workers: int = 4, page_size: int = 100, overwrite: bool = False, restart: bool = False,
+              limit: Optional[int] = None, **params) -> Dict[str, Any]:
+    """Analyze every row of the Transcripts table and write back the changes
+
+    Pages are fetched in order while earlier ones are analyzed and written;
+    the checkpoint only moves past a page once all its writes succeeded.
+
+    Args:
+        source: An AirtableClient or LocalStore
+        write: Called as ``write(record, changes)``; returns a Future
+        checkpoint: Where progress is kept between runs
+        workers: Analysis processes
+        page_size: Rows per page (at most 100)
+        overwrite: Replace extracted fields that already have a value
+        restart: Start from the first page even if a checkpoint exists
+        limit: Stop after about this many rows (checkpointed, for trial runs)
+        **params: Extra ``list_page`` parameters, such as a sort
+
+    Returns:
+        Totals: ``processed``, ``updated``, ``failed`` and ``complete``
+    """
+    state = None if restart else checkpoint.load()
+    if state:
+        print(f"Resuming after {state['processed']} rows ({state['updated']} updated)")
+    state = state or {'offset': None, 'processed': 0, 'updated': 0}
+    started = time.monotonic()
+    start_count = state['processed']
+    last_report = started
+
+    analyzing: 'deque[_Page]' = deque()
+    writing: 'deque[_Page]' = deque()
+    offset = state['offset']
+    more = True
+    failed = 0
+    fetched = 0
+    with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+        try:
+            while (more and not failed) or analyzing or writing:
+                while more and not failed and len(analyzing) + len(writing) < 2 * workers:
+                    try:
+                        page = source.list_page(TABLE, fields=FIELDS, page_size=page_size, offset=offset,
+                                                 **params)
+                    except AirtableError as e:
+                        if offset and 'LIST_RECORDS_ITERATOR_NOT_AVAILABLE' in str(e):
+                            if analyzing or writing:
+                                # Drain; the cursor after the last checkpoint is retried on the next run
+                                more = False
+                                break
+                            print("Saved cursor has expired; starting over from the first page")
+                            offset = None
+                            state['processed'] = start_count = 0
+                            continue
+                        raise
+                    records = page.get('records', [])
+                    offset = page.get('offset')
+                    rows = [record.get('fields', {}) for record in records]
+                    analyzing.append(_Page(records, offset, pool.submit(analyze_page, rows, overwrite)))
+                    fetched += len(records)
+                    more = bool(offset) and (limit is None or fetched < limit)
+
+                while analyzing and analyzing[0].analysis.done():
+                    page = analyzing.popleft()
+                    page.writes = [write(page.records[position], changes)
+                                   for position, changes in page.analysis.result()]
+                    writing.append(page)
+
+                while writing and all(future.done() for future in writing[0].writes):
+                    page = writing.popleft()
+                    errors = [future.exception() for future in page.writes if future.exception()]
+                    if errors:
+                        failed += len(errors)
+                        print(f"{len(errors)} writes failed: {errors[0]}")
+                    if failed:
+                        # Later pages still finish, but progress stops here
+                        continue
+                    state['processed'] += len(page.records)
+                    state['updated'] += len(page.writes)
+                    state['offset'] = page.next_offset
+                    checkpoint.save(state)
+
+                now = time.monotonic()
+                if now - last_report >= PROGRESS_INTERVAL:
+                    last_report = now
+                    rate = (state['processed'] - start_count) / (now - started)
+                    print(f"  {state['processed']} rows, {state['updated']} updated ({rate:.0f} rows/s)")
+
+                pending = [analyzing[0].analysis] if analyzing else []
+                if writing:
+                    pending += [future for future in writing[0].writes if not future.done()]
+                if pending and not (more and not failed and len(analyzing) + len(writing) < 2 * workers):
+                    wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+
+    complete = not failed and state['offset'] is None
+    if complete:
+        checkpoint.clear()
+    return {'processed': state['processed'], 'updated': state['updated'], 'failed': failed,
+            'complete': complete, 'seconds': round(time.monotonic() - started, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run analysis over every row of the Transcripts table")
+    parser.add_argument('--local', action='store_true',
+                        help="read and write the local store instead of Airtable (the server syncs it)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help="analysis processes")
+    parser.add_argument('--page-size', type=int, default=100, help="rows per page (at most 100)")
+    parser.add_argument('--rate', type=float,
+                        help="Airtable requests per second (default: api_settings.rate_limit); the base's "
+                             "limit is shared with a running server")
+    parser.add_argument('--overwrite', action='store_true',
+                        help="replace guest count, event date and budget values that are already set")
+    parser.add_argument('--dry-run', action='store_true', help="count the changes without writing them")
+    parser.add_argument('--limit', type=int, help="stop after about this many rows")
+    parser.add_argument('--checkpoint', help="progress file (default: DATA_DIR/reprocess_transcripts.json)")
+    parser.add_argument('--restart', action='store_true', help="ignore the checkpoint and start from the top")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    settings = Settings.from_env()
+    checkpoint_path = args.checkpoint or os.path.join(settings.data_dir, 'reprocess_transcripts.json')
+
+    writer = None
+    params = {}
+    if args.local:
+        store = LocalStore(settings.local_store_path)
+        source = store
+        name = f"local:{os.path.abspath(settings.local_store_path)}"
+        # Oldest first, so rows added meanwhile land past the cursor
+        params = {'sort[0][field]': 'Timestamp', 'sort[0][direction]': 'asc'}
+    else:
+        options = {'base_url': settings.airtable_api_url}
+        if args.rate:
+            options['rate_limit'] = args.rate
+        client = AirtableClient.from_config(settings.airtable_api_key, settings.airtable_base_id, **options)
+        if not client.configured:
+            parser.error("AIRTABLE_API_KEY and AIRTABLE_BASE_ID are required (or use --local)")
+        source = client
+        name = f"airtable:{settings.airtable_base_id}"
+        writer = BatchWriter(client)
+    if args.dry_run:
+        # A dry run never moves a real run's checkpoint
+        name += ':dry-run'
+        checkpoint_path += '.dry-run'
+
+    def write(record, changes):
+        if args.dry_run:
+            return _done()
+        if writer is not None:
+            return writer.update(TABLE, record['id'], changes)
+        return _done(store.update(TABLE, record['localId'], changes))
+
+    print(f"Reprocessing {TABLE} from {name} with {args.workers} workers")
+    try:
+        result = reprocess(source, write, Checkpoint(checkpoint_path, name), workers=args.workers,
+                           page_size=args.page_size, overwrite=args.overwrite, restart=args.restart,
+                           limit=args.limit, **params)
+    except KeyboardInterrupt:
+        print(f"\nInterrupted; run again to resume from {checkpoint_path}")
+        sys.exit(130)
+    except AirtableError as e:
+        print(f"\nStopped: {str(e)}\nRun again to resume from {checkpoint_path}")
+        sys.exit(1)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    verb = 'would change' if args.dry_run else 'updated'
+    print(f"\n{result['processed']} rows analyzed, {result['updated']} {verb} in {result['seconds']}s")
+    if result['failed']:
+        print(f"{result['failed']} writes failed; run again to resume from {checkpoint_path}")
+        sys.exit(1)
+    if not result['complete']:
+        print(f"Stopped early; run again to resume from {checkpoint_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""Deadlines, circuit breakers and load shedding for EventFlow-AI's outbound calls
+
+Three pieces keep a slow or failing dependency (Airtable, AssemblyAI,
+Twilio's REST API) from tying up the server:
+
+- A **deadline** is a point in time by which the current unit of work (a
+  webhook request, a background job) must finish. It is kept in a context
+  variable, so every outbound call made on its behalf can cap its timeout
+  and retry sleeps with ``timeout()`` and ``can_wait()`` without the
+  deadline being passed down by hand.
+- A **circuit breaker** per dependency watches the outcome of its recent
+  calls. When too many of them fail (a connection error, a 5xx or 429
+  response, or a call slower than ``slow_call_seconds``) it opens, and calls
+  fail at once with ``CircuitOpen`` instead of waiting on a dependency that
+  is down. After ``open_seconds`` one trial call is let through; if it
+  succeeds the breaker closes again.
+- ``LoadShedder`` reports when the job queue is falling behind, so callers
+  can skip or postpone work that is nice to have rather than essential.
+
+Wrap each outbound call in ``guarded_call`` to get all three, plus the
+metrics ``metrics.outbound_call`` records.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from metrics import OUTBOUND_REQUESTS, outbound_call
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar('eventflow_deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the current deadline has passed before a call could start"""
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling a dependency whose circuit breaker is open"""
+
+    status = 'circuit_open'
+
+    def __init__(self, dependency: str, retry_after: float):
+        super().__init__(f"{dependency} circuit is open; retry in {retry_after:.0f}s")
+        self.dependency = dependency
+        self.retry_after = retry_after
+
+
+# Deadlines
+
+def start_deadline(seconds: Optional[float]) -> contextvars.Token:
+    """Give the current context ``seconds`` to finish (None: no limit)
+
+    An earlier deadline already in force is kept. Pass the returned token to
+    ``end_deadline``.
+    """
+    at = _deadline.get()
+    if seconds is not None:
+        at = min(at, time.monotonic() + seconds) if at is not None else time.monotonic() + seconds
+    return _deadline.set(at)
+
+
+def end_deadline(token: contextvars.Token):
+    """Restore the deadline in force before ``start_deadline``"""
+    _deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """Run the block under a deadline of ``seconds`` from now"""
+    token = start_deadline(seconds)
+    try:
+        yield
+    finally:
+        end_deadline(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def timeout(default: float) -> float:
+    """A call's timeout: ``default``, or less if the deadline is nearer
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left <= 0:
+        raise DeadlineExceeded("Deadline exceeded")
+    return min(default, left)
+
+
+def can_wait(seconds: float) -> bool:
+    """Whether there is time to sleep ``seconds`` and still make another call"""
+    left = remaining()
+    return left is None or left > seconds
+
+
+# Circuit breakers
+
+class CircuitBreaker:
+    """Failure-rate breaker over a dependency's last ``window`` calls
+
+    Opens once at least ``min_calls`` calls have been recorded and
+    ``failure_ratio`` of them failed. While open every ``allow()`` raises
+    ``CircuitOpen``; after ``open_seconds`` a single trial call is allowed
+    (half-open), and its outcome closes or reopens the breaker.
+    """
+
+    def __init__(self, name: str, window: int = 20, min_calls: int = 10, failure_ratio: float = 0.5,
+                 slow_call_seconds: Optional[float] = 10, open_seconds: float = 30):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_ratio = failure_ratio
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.opened = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                return STATE_HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being refused"""
+        return self.state == STATE_OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until the next trial call is allowed"""
+        with self._lock:
+            if self._state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def allow(self):
+        """Reserve a call
+
+        Raises:
+            CircuitOpen: If the breaker is open, or half-open with its trial call in flight
+        """
+        with self._lock:
+            if self._state == STATE_CLOSED:
+                return
+            waited = time.monotonic() - self._opened_at
+            if self._state == STATE_OPEN and waited >= self.open_seconds:
+                self._state = STATE_HALF_OPEN
+            if self._state == STATE_HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpen(self.name, max(0.0, self.open_seconds - waited))
+
+    def record(self, success: bool, seconds: float = 0.0):
+        """Record the outcome of an allowed call; calls slower than ``slow_call_seconds`` count as failures"""
+        if success and self.slow_call_seconds is not None and seconds > self.slow_call_seconds:
+            success = False
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._trial_running = False
+                if success:
+                    self._state = STATE_CLOSED
+                    self._outcomes.clear()
+                    logger.info(f"{self.name} circuit closed")
+                else:
+                    self._open()
+                return
+            if self._state == STATE_OPEN:
+                # A call allowed before the breaker opened
+                return
+            self._outcomes.append(success)
+            failures = self._outcomes.count(False)
+            if len(self._outcomes) >= self.min_calls and failures >= self.failure_ratio * len(self._outcomes):
+                logger.warning(f"{self.name} circuit opened: {failures} of the last "
+                               f"{len(self._outcomes)} calls failed")
+                self._open()
+
+    def cancel(self):
+        """Release an allowed call that was never made"""
+        with self._lock:
+            self._trial_running = False
+
+    def _open(self):
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.opened += 1
+
+    def reset(self):
+        """Close the breaker and forget recorded calls"""
+        with self._lock:
+            self._state = STATE_CLOSED
+            self._trial_running = False
+            self._outcomes.clear()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breaker_options: Dict[str, Any] = {}
+_breakers_lock = threading.Lock()
+
+
+def configure_breakers(**options):
+    """Set the CircuitBreaker options used for every dependency, rebuilding existing breakers"""
+    with _breakers_lock:
+        _breaker_options.clear()
+        _breaker_options.update(options)
+        for name in list(_breakers):
+            _breakers[name] = CircuitBreaker(name, **options)
+
+
+def breaker(dependency: str) -> CircuitBreaker:
+    """The circuit breaker for a dependency, created on first use"""
+    found = _breakers.get(dependency)
+    if found is None:
+        with _breakers_lock:
+            found = _breakers.setdefault(dependency, CircuitBreaker(dependency, **_breaker_options))
+    return found
+
+
+def breaker_states() -> Dict[str, str]:
+    with _breakers_lock:
+        return {name: found.state for name, found in _breakers.items()}
+
+
+def _failed(status: Any) -> bool:
+    """Whether an HTTP status means the dependency, not the request, is at fault"""
+    return isinstance(status, int) and (status >= 500 or status == 429)
+
+
+@contextmanager
+def guarded_call(dependency: str, operation: str, count_slow: bool = True,
+                 count_throttled: bool = True) -> Iterator[Any]:
+    """Make one outbound call under the dependency's breaker and the current deadline
+
+    Times the call like ``metrics.outbound_call`` (set ``status`` on the
+    yielded object) and records its outcome with the breaker. Pass
+    ``count_slow=False`` for transfers whose duration depends on their size,
+    and ``count_throttled=False`` where the caller backs off on 429s itself,
+    so being throttled does not open the breaker.
+
+    Raises:
+        CircuitOpen: Without calling, if the dependency's breaker is open
+        DeadlineExceeded: Without calling, if the deadline has passed
+    """
+    circuit = breaker(dependency)
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before {dependency} {operation}")
+    try:
+        circuit.allow()
+    except CircuitOpen:
+        OUTBOUND_REQUESTS.inc(dependency=dependency, operation=operation, status=CircuitOpen.status)
+        raise
+    started = time.perf_counter()
+    try:
+        with outbound_call(dependency, operation) as call:
+            yield call
+    except DeadlineExceeded:
+        circuit.cancel()
+        raise
+    except Exception as e:
+        # Errors without an HTTP status (connection errors, timeouts) count against the dependency
+        status = getattr(e, 'status', None)
+        if status is None:
+            # requests' HTTPError carries the response instead
+            status = getattr(getattr(e, 'response', None), 'status_code', None)
+        if status == 429 and not count_throttled:
+            circuit.cancel()
+        else:
+            circuit.record(isinstance(status, int) and not _failed(status))
+        raise
+    except BaseException:
+        circuit.cancel()
+        raise
+    elapsed = time.perf_counter() - started
+    if call.status == 429 and not count_throttled:
+        circuit.cancel()
+    else:
+        circuit.record(not _failed(call.status), elapsed if count_slow else 0.0)
+
+
+# Load shedding
+
+class LoadShedder:
+    """Says when to put off non-essential work
+
+    The server counts as saturated while the oldest job due to run has been
+    waiting ``max_delay`` seconds or more: a burst the workers clear quickly
+    does not count, a queue they are not keeping up with does. The delay is
+    read at most once per ``check_interval``.
+    """
+
+    def __init__(self, queue_delay: Callable[[], float], max_delay: float = 30, check_interval: float = 1.0):
+        self.queue_delay = queue_delay
+        self.max_delay = max_delay
+        self.check_interval = check_interval
+        self.shed = 0
+        self._checked: Tuple[float, bool] = (0.0, False)
+        self._lock = threading.Lock()
+
+    def saturated(self) -> bool:
+        if not self.max_delay:
+            return False
+        now = time.monotonic()
+        checked_at, saturated = self._checked
+        if now - checked_at < self.check_interval:
+            return saturated
+        with self._lock:
+            checked_at, saturated = self._checked
+            if now - checked_at >= self.check_interval:
+                try:
+                    saturated = self.queue_delay() >= self.max_delay
+                except Exception as e:
+                    logger.error(f"Error reading the job queue delay: {str(e)}")
+                self._checked = (now, saturated)
+        return saturated
+
+    def should_shed(self, dependency: Optional[str] = None) -> bool:
+        """Whether to skip or postpone optional work now
+
+        True while saturated, or while ``dependency``'s breaker is open.
+        """
+        shed = self.saturated() or (dependency is not None and breaker(dependency).is_open)
+        if shed:
+            self.shed += 1
+        return shed
@@ -0,0 +1,243 @@
+"""Per-process services behind the EventFlow-AI API
+
+Services builds the stores, clients and background workers from Settings.
+Each server process needs its own instance, created after any fork: SQLite
+connections and threads do not survive ``fork()``.
+"""
+import logging
+import os
+import threading
+
+from airtable_client import AirtableClient
+from airtable_sync import AirtableSyncer
+from analytics import AnalyticsRollup
+from cache import TTLCache
+from call_transcripts import TranscriptReconciler
+from campaigns import CampaignManager, CampaignStore, TwilioSmsSender
+from classifier import CategoryClassifier
+from event_log import EventLog
+from extraction import LeadAttributeExtractor
+from idempotency import make_backend
+from jobs import JobQueue, WorkerPool
+from leads import LeadLister
+from local_store import LocalStore
+from metrics import REGISTRY
+from phones import LeadIndex
+from realtime import MediaStream, StreamingTranscriber
+from recordings import RecordingProcessor
+from reports import ReportExporter
+from resilience import STATE_HALF_OPEN, STATE_OPEN, LoadShedder, breaker_states, configure_breakers
+from settings import Settings
+from stats import StatsStore
+from transcript_cache import TranscriptCache
+from transcription import AssemblyAITranscriber, TranscriptionJobs
+from write_buffer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+JOB_DEPTH = REGISTRY.gauge('eventflow_jobs', 'Background jobs by status', ['status'], mode='max')
+JOB_WORKERS_ACTIVE = REGISTRY.gauge('eventflow_job_workers_active', 'Workers currently running a job')
+WRITE_BUFFER_PENDING = REGISTRY.gauge('eventflow_airtable_write_buffer_pending', 'Airtable writes waiting to be sent')
+SYNC_UNSYNCED = REGISTRY.gauge(
+    'eventflow_airtable_unsynced_records', 'Local records not yet pushed to Airtable', ['table'], mode='max'
+)
+EVENT_LOG_PENDING = REGISTRY.gauge('eventflow_event_log_pending', 'Call events waiting to be written')
+EVENT_LOG_DROPPED = REGISTRY.counter('eventflow_event_log_dropped_total', 'Call events dropped from a full buffer')
+TRANSCRIPTIONS = REGISTRY.gauge('eventflow_transcriptions', 'AssemblyAI transcripts by status', ['status'],
+                                mode='max')
+CALL_TRANSCRIPTS = REGISTRY.gauge('eventflow_call_transcripts', 'Calls waiting for or stored with a transcript',
+                                  ['status'], mode='max')
+MEDIA_STREAMS_ACTIVE = REGISTRY.gauge('eventflow_media_streams_active', 'Calls streaming audio for live transcription')
+CACHE_HITS = REGISTRY.counter('eventflow_cache_hits_total', 'Cache lookups that found an entry', ['cache'])
+CACHE_MISSES = REGISTRY.counter('eventflow_cache_misses_total', 'Cache lookups that found nothing', ['cache'])
+CACHE_ENTRIES = REGISTRY.gauge('eventflow_cache_entries', 'Entries held in each cache', ['cache'])
+CIRCUIT_STATE = REGISTRY.gauge('eventflow_circuit_breaker_state',
+                               'Outbound circuit breakers: 0 closed, 1 half-open, 2 open', ['dependency'], mode='max')
+WORK_SHED = REGISTRY.counter('eventflow_work_shed_total', 'Optional tasks skipped or postponed under load')
+
+
+def recover_jobs(settings: Settings):
+    """Requeue jobs left running by a previous server
+
+    Run once before starting worker processes, not in each worker, or a new
+    worker would requeue jobs its siblings are still running.
+    """
+    JobQueue(settings.job_queue_path, max_attempts=settings.job_max_attempts).close()
+
+
+class Services:
+    """Everything a server process needs, built from Settings"""
+
+    def __init__(self, settings: Settings, recover: bool = True):
+        self.settings = settings
+        configure_breakers(
+            window=max(20, settings.circuit_min_calls * 2),
+            min_calls=settings.circuit_min_calls,
+            failure_ratio=settings.circuit_failure_ratio,
+            slow_call_seconds=settings.circuit_slow_call_seconds or None,
+            open_seconds=settings.circuit_open_seconds
+        )
+        self.airtable = AirtableClient.from_config(
+            settings.airtable_api_key, settings.airtable_base_id, base_url=settings.airtable_api_url
+        )
+        self.airtable_writer = BatchWriter(self.airtable, max_delay=settings.write_batch_delay)
+        self.local_store = LocalStore(settings.local_store_path)
+        self.lead_index = LeadIndex(self.local_store, default_country=settings.default_country_code)
+        self.record_index = TTLCache(
+            max_size=settings.record_index_size, ttl=settings.record_index_ttl, path=settings.record_index_path
+        )
+        self.airtable_syncer = AirtableSyncer(
+            self.local_store, self.airtable, self.airtable_writer, interval=settings.airtable_sync_interval,
+            lock_path=os.path.join(settings.data_dir, 'airtable_sync.lock'),
+            on_pull=self._pulled, on_push=self._index_record
+        )
+        self.classifier = CategoryClassifier.from_config()
+        self.extractor = LeadAttributeExtractor()
+        self.stats = StatsStore()
+        self.lead_lister = LeadLister(self.local_store, cache_ttl=settings.leads_cache_ttl)
+        self.reports = ReportExporter(self.local_store)
+        self.webhook_backend = make_backend(
+            settings.idempotency_backend, path=settings.idempotency_path, ttl=settings.idempotency_ttl,
+            max_size=settings.idempotency_max_size
+        )
+        self.campaigns = CampaignManager(
+            TwilioSmsSender(settings.twilio_account_sid, settings.twilio_auth_token,
+                            base_url=settings.twilio_api_base_url),
+            list(settings.twilio_messaging_numbers),
+            CampaignStore(settings.campaigns_path),
+            per_number_rate=settings.sms_rate_per_number,
+            concurrency=settings.sms_concurrency,
+            status_callback=(f"{settings.public_base_url}/webhook/twilio/sms/status"
+                             if settings.public_base_url else None)
+        )
+        self.event_log = EventLog(
+            settings.event_log_dir,
+            buffer_size=settings.event_log_buffer,
+            flush_interval=settings.event_log_flush_interval,
+            segment_bytes=settings.event_log_segment_bytes,
+            segment_seconds=settings.event_log_segment_seconds,
+            compress=settings.event_log_compress,
+            retention_days=settings.event_log_retention_days
+        )
+        self.analytics = AnalyticsRollup(
+            self.local_store, self.event_log, interval=settings.analytics_rollup_interval,
+            # Every process writes its buffered events within a flush interval
+            lag=settings.event_log_flush_interval * 2 + 5,
+            lock_path=os.path.join(settings.data_dir, 'analytics.lock')
+        )
+        self.job_queue = JobQueue(settings.job_queue_path, max_attempts=settings.job_max_attempts,
+                                  recover=recover)
+        self.worker_pool = WorkerPool(self.job_queue, size=settings.job_workers,
+                                      job_deadline=settings.job_deadline or None,
+                                      retention=settings.job_retention or None)
+        self.shedder = LoadShedder(self.job_queue.queue_delay, max_delay=settings.shed_queue_delay)
+        self.recordings = RecordingProcessor.from_config(
+            settings.recording_spool_dir,
+            silence_threshold=settings.audio_silence_threshold,
+            auth=((settings.twilio_account_sid, settings.twilio_auth_token)
+                  if settings.twilio_account_sid and settings.twilio_auth_token else None)
+        )
+        self.transcript_cache = None
+        if settings.transcript_cache_max_mb:
+            self.transcript_cache = TranscriptCache(settings.transcript_cache_path,
+                                                    max_bytes=int(settings.transcript_cache_max_mb * 1024 * 1024))
+        self.reconciler = TranscriptReconciler(
+            settings.transcriptions_path, self.job_queue,
+            sources=('assemblyai', 'twilio') if settings.twilio_transcribe else ('assemblyai',),
+            hold=settings.transcript_hold_seconds
+        )
+        self.transcriptions = TranscriptionJobs.from_config(
+            settings.transcriptions_path,
+            AssemblyAITranscriber(settings.assemblyai_api_key, base_url=settings.assemblyai_api_url),
+            self.job_queue,
+            public_base_url=settings.public_base_url,
+            webhook_secret=settings.assemblyai_webhook_secret,
+            poll_interval=settings.assemblyai_polling_interval or 5,
+            poll_concurrency=settings.transcription_poll_concurrency
+        )
+        self.media_streams = MediaStream(
+            StreamingTranscriber(settings.assemblyai_api_key, url=settings.assemblyai_realtime_url),
+            self.classifier
+        )
+        self._shutdown_lock = threading.Lock()
+        self._stopped = False
+
+    def start(self):
+        """Start the background threads"""
+        REGISTRY.add_collector(self.collect_metrics)
+        if self.settings.metrics_dir:
+            REGISTRY.enable_multiprocess(self.settings.metrics_dir,
+                                         flush_interval=self.settings.metrics_flush_interval)
+        self.lead_index.load()
+        self.worker_pool.start()
+        self.campaigns.recover()
+        self.transcriptions.start()
+        self.event_log.start()
+        if self.settings.analytics_rollup_interval:
+            self.analytics.start()
+        self.stats.start_reconciler(self.local_store, interval=self.settings.stats_reconcile_interval)
+        if self.airtable.configured:
+            self.airtable_syncer.start()
+        else:
+            logger.warning("Airtable credentials not configured; data is kept locally only")
+
+    def shutdown(self):
+        """Drain the workers, push their writes, then flush buffers to disk
+
+        Safe to call more than once.
+        """
+        with self._shutdown_lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        for step in (self.worker_pool.shutdown, self.campaigns.shutdown, self.transcriptions.stop,
+                     self.reconciler.close, self.airtable_syncer.stop, self.airtable_writer.close,
+                     self.record_index.save, self.analytics.stop, self.event_log.close, self.stats.stop):
+            try:
+                step()
+            except Exception as e:
+                logger.error(f"Error during shutdown ({step.__qualname__}): {str(e)}")
+
+    def _pulled(self, table, local_id, record):
+        """Keep the in-process indexes in step with records pulled from Airtable"""
+        self.lead_index.pulled(table, local_id, record)
+        self._index_record(table, local_id, record)
+
+    def _index_record(self, table, local_id, record):
+        """Remember a Transcripts row's Airtable id by MessageID"""
+        message_id = record.get('fields', {}).get('MessageID')
+        if table == 'Transcripts' and message_id:
+            self.record_index.put(message_id, record['id'])
+
+    def collect_metrics(self):
+        """Read queue depths and cache counters into their gauges"""
+        for status, count in self.job_queue.counts().items():
+            JOB_DEPTH.set(count, status=status)
+        for status, count in self.transcriptions.counts().items():
+            TRANSCRIPTIONS.set(count, status=status)
+        for status, count in self.reconciler.counts().items():
+            if status != 'late':
+                CALL_TRANSCRIPTS.set(count, status=status)
+        MEDIA_STREAMS_ACTIVE.set(self.media_streams.active)
+        JOB_WORKERS_ACTIVE.set(self.worker_pool.status()['active'])
+        WRITE_BUFFER_PENDING.set(self.airtable_writer.pending_count())
+        EVENT_LOG_PENDING.set(self.event_log.pending)
+        EVENT_LOG_DROPPED.set_total(self.event_log.dropped)
+        for table, count in self.local_store.dirty_count().items():
+            SYNC_UNSYNCED.set(count, table=table)
+        for dependency, state in breaker_states().items():
+            CIRCUIT_STATE.set({STATE_HALF_OPEN: 1, STATE_OPEN: 2}.get(state, 0), dependency=dependency)
+        WORK_SHED.set_total(self.shedder.shed)
+        caches = {
+            'record_index': self.record_index.stats(),
+            'leads_first_page': self.lead_lister.first_pages.stats(),
+            'webhook_replay': self.webhook_backend.stats(),
+            'lead_index': self.lead_index.stats()
+        }
+        if self.transcript_cache is not None:
+            caches['transcripts'] = self.transcript_cache.stats()
+        for name, cache_stats in caches.items():
+            CACHE_HITS.set_total(cache_stats['hits'], cache=name)
+            CACHE_MISSES.set_total(cache_stats['misses'], cache=name)
+            if 'size' in cache_stats:
+                CACHE_ENTRIES.set(cache_stats['size'], cache=name)
@@ -0,0 +1,259 @@
+"""Application settings for EventFlow-AI
+
+Settings are read from the environment (and ``.env``) once, validated and
+frozen, so every part of the app sees the same values and nothing can change
+them after startup.
+"""
+import os
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Mapping, Optional, Tuple
+
+from config_loader import load_config
+from config_validator import ConfigValidator
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DATA_DIR = os.path.join(BACKEND_DIR, 'data')
+
+
+class ConfigError(ValueError):
+    """Raised when an environment variable has an invalid value"""
+
+
+def _get(env: Mapping[str, str], name: str, default=None):
+    value = env.get(name)
+    return default if value is None or value == '' else value
+
+
+def _number(env: Mapping[str, str], name: str, default, kind=float, minimum=None):
+    raw = _get(env, name)
+    if raw is None:
+        return default
+    try:
+        value = kind(raw)
+    except ValueError:
+        raise ConfigError(f"{name} must be a number, got {raw!r}")
+    if minimum is not None and value < minimum:
+        raise ConfigError(f"{name} must be at least {minimum}, got {value}")
+    return value
+
+
+def _flag(env: Mapping[str, str], name: str, default: bool = False) -> bool:
+    raw = _get(env, name)
+    if raw is None:
+        return default
+    return raw.lower() in ('1', 'true', 'yes', 'on')
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Validated, read-only configuration"""
+
+    # Credentials
+    twilio_account_sid: Optional[str] = None
+    twilio_auth_token: Optional[str] = None
+    twilio_phone_number: Optional[str] = None
+    assemblyai_api_key: Optional[str] = None
+    airtable_api_key: Optional[str] = None
+    airtable_base_id: Optional[str] = None
+    flask_secret_key: Optional[str] = None
+    port: int = 5000
+    debug: bool = False
+
+    # API endpoints, overridable to point at local stand-ins (see stub_servers.py)
+    airtable_api_url: str = 'https://api.airtable.com/v0'
+    assemblyai_api_url: Optional[str] = None
+    assemblyai_polling_interval: Optional[float] = None
+    twilio_api_base_url: Optional[str] = None
+
+    # AssemblyAI transcripts awaiting a callback or poll
+    transcriptions_path: str = os.path.join(DEFAULT_DATA_DIR, 'transcriptions.db')
+    transcription_poll_concurrency: int = 4
+    assemblyai_webhook_secret: Optional[str] = None
+
+    # Recording clean-up before transcription
+    audio_normalize: bool = True
+    audio_silence_threshold: int = 500
+    recording_spool_dir: str = os.path.join(DEFAULT_DATA_DIR, 'spool')
+
+    # Transcripts by recording content; 0 MB turns the cache off
+    transcript_cache_path: str = os.path.join(DEFAULT_DATA_DIR, 'transcript_cache.db')
+    transcript_cache_max_mb: float = 50
+
+    # Twilio's own transcription alongside AssemblyAI; one transcript is kept per call
+    twilio_transcribe: bool = True
+    transcript_hold_seconds: float = 60
+
+    # Stream calls to AssemblyAI's real-time service instead of recording them
+    realtime_transcription: bool = False
+    assemblyai_realtime_url: Optional[str] = None
+
+    data_dir: str = DEFAULT_DATA_DIR
+
+    # Background job processing
+    job_queue_path: str = os.path.join(DEFAULT_DATA_DIR, 'jobs.db')
+    job_workers: int = 4
+    job_max_attempts: int = 3
+    # Seconds finished jobs are kept; 0 keeps them
+    job_retention: float = 86400
+    write_batch_delay: float = 0.2
+
+    # Local system of record, synced to Airtable in the background
+    local_store_path: str = os.path.join(DEFAULT_DATA_DIR, 'eventflow.db')
+    airtable_sync_interval: float = 5
+
+    # MessageID -> Airtable record id for messages missing from the local store
+    record_index_size: int = 50000
+    record_index_ttl: float = 86400
+    record_index_path: Optional[str] = None
+
+    # Calling code for phone numbers entered without one
+    default_country_code: str = '1'
+
+    stats_reconcile_interval: float = 300
+    # Daily Analytics rows from the event log; 0 turns the rollup off
+    analytics_rollup_interval: float = 60
+    leads_cache_ttl: float = 15
+
+    # Bulk SMS campaigns
+    twilio_messaging_numbers: Tuple[str, ...] = field(default_factory=tuple)
+    sms_rate_per_number: float = 1
+    sms_concurrency: int = 8
+    campaigns_path: str = os.path.join(DEFAULT_DATA_DIR, 'campaigns.db')
+    public_base_url: str = ''
+
+    # Replay protection for Twilio webhook retries ('memory' or 'sqlite')
+    idempotency_backend: str = 'memory'
+    idempotency_path: str = os.path.join(DEFAULT_DATA_DIR, 'idempotency.db')
+    idempotency_ttl: float = 3600
+    idempotency_max_size: int = 10000
+
+    # Call-event log (rotating JSONL segments)
+    event_log_dir: str = os.path.join(DEFAULT_DATA_DIR, 'events')
+    event_log_buffer: int = 10000
+    event_log_flush_interval: float = 1
+    event_log_segment_bytes: int = 10 * 1024 * 1024
+    event_log_segment_seconds: float = 3600
+    event_log_compress: bool = False
+    event_log_retention_days: float = 30
+
+    # Outbound call deadlines and circuit breakers (see resilience.py); 0 turns a limit off
+    webhook_deadline: float = 10
+    job_deadline: float = 300
+    circuit_failure_ratio: float = 0.5
+    circuit_min_calls: int = 10
+    circuit_slow_call_seconds: float = 10
+    circuit_open_seconds: float = 30
+    # Seconds the oldest due job may wait before optional analysis is put off; 0 never sheds
+    shed_queue_delay: float = 30
+    shed_defer_seconds: float = 60
+
+    # Metrics; set METRICS_DIR when running several worker processes
+    metrics_dir: Optional[str] = None
+    metrics_flush_interval: float = 5
+
+    @classmethod
+    def from_env(cls, env: Mapping[str, str] = os.environ) -> 'Settings':
+        """Build settings from environment variables
+
+        Raises:
+            ConfigError: If a variable has an invalid value
+        """
+        data_dir = _get(env, 'DATA_DIR', DEFAULT_DATA_DIR)
+        phone_number = _get(env, 'TWILIO_PHONE_NUMBER')
+        messaging_numbers = tuple(
+            number.strip() for number in (_get(env, 'TWILIO_MESSAGING_NUMBERS') or phone_number or '').split(',')
+            if number.strip()
+        )
+        idempotency_backend = _get(env, 'IDEMPOTENCY_BACKEND', 'memory')
+        if idempotency_backend not in ('memory', 'sqlite'):
+            raise ConfigError(f"IDEMPOTENCY_BACKEND must be 'memory' or 'sqlite', got {idempotency_backend!r}")
+        country_code = _get(env, 'DEFAULT_COUNTRY_CODE', '1').lstrip('+')
+        if not country_code.isdigit() or len(country_code) > 3:
+            raise ConfigError(f"DEFAULT_COUNTRY_CODE must be a calling code such as 1 or 44, got {country_code!r}")
+        failure_ratio = _number(env, 'CIRCUIT_FAILURE_RATIO', 0.5, minimum=0.01)
+        if failure_ratio > 1:
+            raise ConfigError(f"CIRCUIT_FAILURE_RATIO must be at most 1, got {failure_ratio}")
+
+        return cls(
+            twilio_account_sid=_get(env, 'TWILIO_ACCOUNT_SID'),
+            twilio_auth_token=_get(env, 'TWILIO_AUTH_TOKEN'),
+            twilio_phone_number=phone_number,
+            assemblyai_api_key=_get(env, 'ASSEMBLYAI_API_KEY'),
+            airtable_api_key=_get(env, 'AIRTABLE_API_KEY'),
+            airtable_base_id=_get(env, 'AIRTABLE_BASE_ID'),
+            flask_secret_key=_get(env, 'FLASK_SECRET_KEY'),
+            port=_number(env, 'PORT', 5000, int, minimum=1),
+            debug=_flag(env, 'FLASK_DEBUG', _get(env, 'FLASK_ENV') == 'development'),
+            airtable_api_url=_get(env, 'AIRTABLE_API_URL', 'https://api.airtable.com/v0'),
+            assemblyai_api_url=_get(env, 'ASSEMBLYAI_API_URL'),
+            assemblyai_polling_interval=_number(env, 'ASSEMBLYAI_POLLING_INTERVAL', None, minimum=0),
+            twilio_api_base_url=_get(env, 'TWILIO_API_BASE_URL'),
+            transcriptions_path=_get(env, 'TRANSCRIPTIONS_PATH', os.path.join(data_dir, 'transcriptions.db')),
+            transcription_poll_concurrency=_number(env, 'TRANSCRIPTION_POLL_CONCURRENCY', 4, int, minimum=1),
+            assemblyai_webhook_secret=_get(env, 'ASSEMBLYAI_WEBHOOK_SECRET'),
+            audio_normalize=_flag(env, 'AUDIO_NORMALIZE', True),
+            audio_silence_threshold=_number(env, 'AUDIO_SILENCE_THRESHOLD', 500, int, minimum=0),
+            recording_spool_dir=_get(env, 'RECORDING_SPOOL_DIR', os.path.join(data_dir, 'spool')),
+            transcript_cache_path=_get(env, 'TRANSCRIPT_CACHE_PATH', os.path.join(data_dir, 'transcript_cache.db')),
+            transcript_cache_max_mb=_number(env, 'TRANSCRIPT_CACHE_MAX_MB', 50, minimum=0),
+            twilio_transcribe=_flag(env, 'TWILIO_TRANSCRIBE', True),
+            transcript_hold_seconds=_number(env, 'TRANSCRIPT_HOLD_SECONDS', 60, minimum=0),
+            realtime_transcription=_flag(env, 'REALTIME_TRANSCRIPTION', bool(
+                load_config('assemblyai_config.json').get('transcription_features', {}).get('real_time', False)
+            )),
+            assemblyai_realtime_url=_get(env, 'ASSEMBLYAI_REALTIME_URL'),
+            data_dir=data_dir,
+            job_queue_path=_get(env, 'JOB_QUEUE_PATH', os.path.join(data_dir, 'jobs.db')),
+            job_workers=_number(env, 'JOB_WORKERS', 4, int, minimum=1),
+            job_max_attempts=_number(env, 'JOB_MAX_ATTEMPTS', 3, int, minimum=1),
+            job_retention=_number(env, 'JOB_RETENTION', 86400, minimum=0),
+            write_batch_delay=_number(env, 'WRITE_BATCH_DELAY', 0.2, minimum=0),
+            local_store_path=_get(env, 'LOCAL_STORE_PATH', os.path.join(data_dir, 'eventflow.db')),
+            airtable_sync_interval=_number(env, 'AIRTABLE_SYNC_INTERVAL', 5, minimum=0),
+            record_index_size=_number(env, 'RECORD_INDEX_SIZE', 50000, int, minimum=1),
+            record_index_ttl=_number(env, 'RECORD_INDEX_TTL', 86400, minimum=0),
+            record_index_path=_get(env, 'RECORD_INDEX_PATH'),
+            default_country_code=country_code,
+            stats_reconcile_interval=_number(env, 'STATS_RECONCILE_INTERVAL', 300, minimum=1),
+            analytics_rollup_interval=_number(env, 'ANALYTICS_ROLLUP_INTERVAL', 60, minimum=0),
+            leads_cache_ttl=_number(env, 'LEADS_CACHE_TTL', 15, minimum=0),
+            twilio_messaging_numbers=messaging_numbers,
+            sms_rate_per_number=_number(env, 'SMS_RATE_PER_NUMBER', 1, minimum=0.01),
+            sms_concurrency=_number(env, 'SMS_CONCURRENCY', 8, int, minimum=1),
+            campaigns_path=_get(env, 'CAMPAIGNS_PATH', os.path.join(data_dir, 'campaigns.db')),
+            public_base_url=_get(env, 'PUBLIC_BASE_URL', '').rstrip('/'),
+            idempotency_backend=idempotency_backend,
+            idempotency_path=_get(env, 'IDEMPOTENCY_PATH', os.path.join(data_dir, 'idempotency.db')),
+            idempotency_ttl=_number(env, 'IDEMPOTENCY_TTL', 3600, minimum=0),
+            idempotency_max_size=_number(env, 'IDEMPOTENCY_MAX_SIZE', 10000, int, minimum=1),
+            event_log_dir=_get(env, 'EVENT_LOG_DIR', os.path.join(data_dir, 'events')),
+            event_log_buffer=_number(env, 'EVENT_LOG_BUFFER', 10000, int, minimum=1),
+            event_log_flush_interval=_number(env, 'EVENT_LOG_FLUSH_INTERVAL', 1, minimum=0.01),
+            event_log_segment_bytes=_number(env, 'EVENT_LOG_SEGMENT_BYTES', 10 * 1024 * 1024, int, minimum=1),
+            event_log_segment_seconds=_number(env, 'EVENT_LOG_SEGMENT_SECONDS', 3600, minimum=1),
+            event_log_compress=_flag(env, 'EVENT_LOG_COMPRESS'),
+            event_log_retention_days=_number(env, 'EVENT_LOG_RETENTION_DAYS', 30, minimum=0),
+            webhook_deadline=_number(env, 'WEBHOOK_DEADLINE', 10, minimum=0),
+            job_deadline=_number(env, 'JOB_DEADLINE', 300, minimum=0),
+            circuit_failure_ratio=failure_ratio,
+            circuit_min_calls=_number(env, 'CIRCUIT_MIN_CALLS', 10, int, minimum=1),
+            circuit_slow_call_seconds=_number(env, 'CIRCUIT_SLOW_CALL_SECONDS', 10, minimum=0),
+            circuit_open_seconds=_number(env, 'CIRCUIT_OPEN_SECONDS', 30, minimum=1),
+            shed_queue_delay=_number(env, 'SHED_QUEUE_DELAY', 30, minimum=0),
+            shed_defer_seconds=_number(env, 'SHED_DEFER_SECONDS', 60, minimum=0),
+            metrics_dir=_get(env, 'METRICS_DIR'),
+            metrics_flush_interval=_number(env, 'METRICS_FLUSH_INTERVAL', 5, minimum=0.1)
+        )
+
+
+@lru_cache(maxsize=None)
+def load_settings() -> Settings:
+    """Load ``.env``, check the required variables and build the settings once
+
+    Exits the process if required variables are missing.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    ConfigValidator.validate_or_exit()
+    return Settings.from_env()
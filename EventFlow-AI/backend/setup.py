@@ -121,6 +121,9 @@ def create_airtable_base():
     print("   - Timestamp (DateTime)")
     print("   - Status (Text: new/analyzed/processed)")
     print("   - Categories (Text)")
+    print("   - GuestCount (Number)")
+    print("   - EventDate (Date)")
+    print("   - Budget (Currency)")
     print("   - Priority (Number)")
     
     print("\n2. Leads Table:")
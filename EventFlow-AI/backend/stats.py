@@ -0,0 +1,138 @@
+"""In-process dashboard statistics for EventFlow-AI
+
+StatsStore keeps running counters that the ingest paths bump as they store
+records, so ``/api/stats`` is a memory read. A background thread
+periodically recounts the tables to correct any drift (writes made by
+other processes, edits pulled from Airtable, restarts).
+"""
+import logging
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+CONVERTED_STATUSES = {'booked'}
+# Lead statuses whose event is being worked on
+ACTIVE_EVENT_STATUSES = {'planning', 'in-progress'}
+
+
+def split_categories(value: Any) -> Iterable[str]:
+    """Categories are stored either as a multiple select or a comma-joined string"""
+    if not value:
+        return []
+    if isinstance(value, list):
+        return value
+    return [category.strip() for category in str(value).split(',') if category.strip()]
+
+
+class StatsStore:
+    """Thread-safe aggregate counters behind the dashboard stats"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals: Counter = Counter()
+        self._lead_statuses: Counter = Counter()
+        self._sources: Counter = Counter()
+        self._categories: Counter = Counter()
+        self._last_reconciled: Optional[str] = None
+        # Increments made while a reconciliation scan is running
+        self._pending_deltas: Optional[Dict[str, Counter]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _bump(self, counter_name: str, key: str, amount: int = 1):
+        getattr(self, counter_name)[key] += amount
+        if self._pending_deltas is not None:
+            self._pending_deltas.setdefault(counter_name, Counter())[key] += amount
+
+    def record_transcript(self, source: Optional[str]):
+        """Count a stored Transcripts record"""
+        with self._lock:
+            self._bump('_totals', 'transcripts')
+            self._bump('_sources', source or 'unknown')
+
+    def record_categories(self, categories: Iterable[str]):
+        """Count the categories detected for a message"""
+        with self._lock:
+            for category in categories:
+                self._bump('_categories', category)
+
+    def record_lead(self, status: Optional[str]):
+        """Count a stored Leads record"""
+        with self._lock:
+            self._bump('_totals', 'leads')
+            self._bump('_lead_statuses', status or 'new')
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current dashboard stats"""
+        with self._lock:
+            return {
+                "totalLeads": self._totals['leads'],
+                "newLeads": self._lead_statuses['new'],
+                "convertedLeads": sum(self._lead_statuses[status] for status in CONVERTED_STATUSES),
+                "activeEvents": sum(self._lead_statuses[status] for status in ACTIVE_EVENT_STATUSES),
+                "totalTranscripts": self._totals['transcripts'],
+                "transcriptsBySource": dict(self._sources),
+                "categories": dict(self._categories),
+                "lastReconciled": self._last_reconciled
+            }
+
+    def reconcile(self, client):
+        """Recount every table and replace the running counters
+
+        ``client`` is anything with ``iter_records``: the LocalStore or an
+        AirtableClient.
+        """
+        with self._lock:
+            self._pending_deltas = {}
+
+        try:
+            totals: Counter = Counter()
+            lead_statuses: Counter = Counter()
+            sources: Counter = Counter()
+            categories: Counter = Counter()
+
+            for record in client.iter_records('Leads', fields=['Status']):
+                totals['leads'] += 1
+                lead_statuses[record.get('fields', {}).get('Status') or 'new'] += 1
+
+            for record in client.iter_records('Transcripts', fields=['Source', 'Categories']):
+                fields = record.get('fields', {})
+                totals['transcripts'] += 1
+                sources[fields.get('Source') or 'unknown'] += 1
+                categories.update(split_categories(fields.get('Categories')))
+        except Exception:
+            with self._lock:
+                self._pending_deltas = None
+            raise
+
+        with self._lock:
+            deltas = self._pending_deltas or {}
+            self._pending_deltas = None
+            self._totals = totals + deltas.get('_totals', Counter())
+            self._lead_statuses = lead_statuses + deltas.get('_lead_statuses', Counter())
+            self._sources = sources + deltas.get('_sources', Counter())
+            self._categories = categories + deltas.get('_categories', Counter())
+            self._last_reconciled = datetime.now().isoformat()
+
+    def start_reconciler(self, client, interval: float = 300):
+        """Reconcile now and then every ``interval`` seconds in a background thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                if client.configured:
+                    try:
+                        self.reconcile(client)
+                    except Exception as e:
+                        logger.error(f"Error reconciling stats: {str(e)}")
+                self._stop.wait(interval)
+
+        self._thread = threading.Thread(target=run, name='eventflow-stats', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Local stand-ins for the Airtable, AssemblyAI and Twilio APIs
+
+Used by benchmark.py so load tests never touch the real services. Each stub
+counts the calls it receives per route and can inject latency; the
+Airtable stub also enforces a per-base rate limit (answering 429 like the
+real API) and can return random 429s. AssemblyAIRealtimeStub stands in for
+the real-time transcription websocket, and ``stream_call`` plays Twilio's
+side of a Media Streams call.
+
+Run directly to start all three for manual testing:
+    python stub_servers.py
+"""
+
+import base64
+import io
+import itertools
+import json
+import math
+import random
+import re
+import struct
+import threading
+import time
+import urllib.request
+import wave
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from rate_limit import TokenBucket
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected when a run is torn down
+        pass
+
+
+class StubServer:
+    """Threaded HTTP server with call counting and latency injection"""
+
+    name = 'stub'
+
+    def __init__(self, port=0, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                url = urlparse(self.path)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                status, payload = stub.handle(self.command, url.path, parse_qs(url.query), body, self.headers)
+                if isinstance(payload, bytes):
+                    data, content_type = payload, 'audio/x-wav'
+                else:
+                    data, content_type = json.dumps(payload).encode(), 'application/json'
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _handle
+
+        self.server = _QuietServer(('127.0.0.1', port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def handle(self, method, path, query, body, headers):
+        raise NotImplementedError
+
+
+class AirtableStub(StubServer):
+    """In-memory Airtable base supporting the calls EventFlow-AI makes"""
+
+    name = 'airtable'
+
+    def __init__(self, port=0, latency=0.0, rate_limit=5, error_rate=0.0, seed=0):
+        super().__init__(port, latency)
+        self.bucket = TokenBucket(rate_limit) if rate_limit else None
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.tables = {}
+        self._ids = itertools.count(1)
+
+    def handle(self, method, path, query, body, headers):
+        match = re.match(r'^/v0/[^/]+/([^/]+)(?:/([^/]+))?$', path)
+        if not match:
+            return 404, {"error": "NOT_FOUND"}
+        table, record_id = match.groups()
+
+        with self._lock:
+            throttled = ((self.bucket is not None and not self.bucket.try_acquire())
+                         or self.random.random() < self.error_rate)
+        if throttled:
+            self.count(f"{method} {table} 429")
+            return 429, {"error": {"type": "RATE_LIMIT_REACHED"}}
+        self.count(f"{method} {table}")
+
+        records = self.tables.setdefault(table, {})
+        data = json.loads(body) if body else {}
+
+        with self._lock:
+            if method == 'POST':
+                if 'records' in data:
+                    return 200, {"records": [self._create(records, item['fields']) for item in data['records']]}
+                return 200, self._create(records, data.get('fields', {}))
+            if method == 'PATCH':
+                if 'records' in data:
+                    return 200, {"records": [self._update(records, item['id'], item['fields'])
+                                             for item in data['records']]}
+                return 200, self._update(records, record_id, data.get('fields', {}))
+            if method == 'GET':
+                if record_id:
+                    record = records.get(record_id)
+                    return (200, record) if record else (404, {"error": "NOT_FOUND"})
+                return 200, self._list(records, query)
+        return 405, {"error": "METHOD_NOT_ALLOWED"}
+
+    def _create(self, records, fields):
+        record = {"id": f"rec{next(self._ids):014d}", "createdTime": time.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                  "fields": dict(fields)}
+        records[record['id']] = record
+        return record
+
+    def _update(self, records, record_id, fields):
+        record = records.setdefault(record_id, {"id": record_id, "fields": {}})
+        record['fields'].update(fields)
+        return record
+
+    def _list(self, records, query):
+        items = list(records.values())
+        formula = query.get('filterByFormula', [''])[0]
+        equality = re.match(r"^\{(\w+)\} = '(.*)'$", formula)
+        if equality:
+            field, value = equality.groups()
+            items = [record for record in items if str(record['fields'].get(field)) == value]
+        elif formula:
+            # LAST_MODIFIED_TIME() filters: nothing changes behind our back
+            items = []
+        fields = query.get('fields[]')
+        if fields:
+            items = [{"id": r['id'], "fields": {k: v for k, v in r['fields'].items() if k in fields}}
+                     for r in items]
+        page_size = int(query.get('pageSize', ['100'])[0])
+        start = int(query.get('offset', ['0'])[0])
+        page = {"records": items[start:start + page_size]}
+        if start + page_size < len(items):
+            page['offset'] = str(start + page_size)
+        return page
+
+
+class AssemblyAIStub(StubServer):
+    """Completes every transcript after ``polls_until_done`` status checks
+
+    Transcripts submitted with a ``webhook_url`` also complete on their own
+    after ``callback_delay`` seconds, and the webhook is called.
+    """
+
+    name = 'assemblyai'
+
+    def __init__(self, port=0, latency=0.0, polls_until_done=1, texts=None, callback_delay=0.5):
+        super().__init__(port, latency)
+        self.polls_until_done = polls_until_done
+        self.callback_delay = callback_delay
+        self.texts = texts or ["I am planning a wedding for 150 guests in June."]
+        self.transcripts = {}
+        self._ids = itertools.count(1)
+
+    def handle(self, method, path, query, body, headers):
+        if method == 'POST' and path == '/v2/upload':
+            self.count('POST upload')
+            return 200, {"upload_url": f"{self.url}/uploads/{next(self._ids)}"}
+        if method == 'POST' and path == '/v2/transcript':
+            self.count('POST transcript')
+            request = json.loads(body or b'{}')
+            transcript_id = f"tr{next(self._ids)}"
+            with self._lock:
+                self.transcripts[transcript_id] = {"request": request, "polls": 0, "done": False}
+            if request.get('webhook_url'):
+                timer = threading.Timer(self.callback_delay, self._callback, (transcript_id, request['webhook_url']))
+                timer.daemon = True
+                timer.start()
+            return 200, {"id": transcript_id, "status": "queued", "audio_url": request.get('audio_url', '')}
+        match = re.match(r'^/v2/transcript/([^/]+)$', path)
+        if method == 'GET' and match:
+            self.count('GET transcript')
+            with self._lock:
+                state = self.transcripts.get(match.group(1))
+                if state is None:
+                    return 404, {"error": "Transcript not found"}
+                state['polls'] += 1
+                done = state['done'] or state['polls'] >= self.polls_until_done
+            response = {"id": match.group(1), "audio_url": state['request'].get('audio_url', ''),
+                        "status": "completed" if done else "processing"}
+            if done:
+                response.update({"text": self.texts[hash(match.group(1)) % len(self.texts)],
+                                 "confidence": 0.92, "audio_duration": 12.0})
+            return 200, response
+        return 404, {"error": "Not found"}
+
+    def _callback(self, transcript_id, webhook_url):
+        with self._lock:
+            self.transcripts[transcript_id]['done'] = True
+        self.count('webhook callback')
+        data = json.dumps({"transcript_id": transcript_id, "status": "completed"}).encode()
+        request = urllib.request.Request(webhook_url, data=data, headers={'Content-Type': 'application/json'})
+        try:
+            urllib.request.urlopen(request, timeout=10).close()
+        except OSError:
+            pass
+
+
+def make_recording(silence=1.0, speech=3.0, trailing=2.0, rate=8000):
+    """A WAV call recording like Twilio's: a tone between stretches of silence"""
+    samples = [0] * int(silence * rate)
+    samples += [int(8000 * math.sin(2 * math.pi * 440 * n / rate)) for n in range(int(speech * rate))]
+    samples += [0] * int(trailing * rate)
+    output = io.BytesIO()
+    with wave.open(output, 'wb') as recording:
+        recording.setnchannels(1)
+        recording.setsampwidth(2)
+        recording.setframerate(rate)
+        recording.writeframes(struct.pack(f"<{len(samples)}h", *samples))
+    return output.getvalue()
+
+
+class TwilioStub(StubServer):
+    """Accepts outbound messages and returns a MessageSid
+
+    Recordings are served as 8 kHz mono WAV.
+    """
+
+    name = 'twilio'
+
+    def __init__(self, port=0, latency=0.0):
+        super().__init__(port, latency)
+        self._ids = itertools.count(1)
+        self.recording = make_recording()
+
+    def handle(self, method, path, query, body, headers):
+        if method == 'POST' and re.match(r'^/2010-04-01/Accounts/[^/]+/Messages\.json$', path):
+            self.count('POST message')
+            form = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+            return 201, {"sid": f"SM{next(self._ids):032d}", "status": "queued",
+                         "to": form.get('To'), "from": form.get('From'), "body": form.get('Body')}
+        if method == 'GET' and path.startswith('/recordings/'):
+            self.count('GET recording')
+            return 200, self.recording
+        return 404, {"message": "Not found", "status": 404}
+
+
+class AssemblyAIRealtimeStub:
+    """Real-time transcription websocket that "hears" one word per chunk
+
+    Every audio message advances through a scripted text: a
+    PartialTranscript is sent with the words so far, and a FinalTranscript
+    at the end of each sentence or when the session is terminated.
+    """
+
+    name = 'assemblyai-realtime'
+
+    def __init__(self, port=0, text="We are planning a wedding reception for about 120 guests next June. "
+                                    "We will also need catering and a photographer."):
+        from websockets.sync.server import serve
+
+        self.sentences = [sentence.split() for sentence in re.findall(r'[^.]+\.?', text) if sentence.strip()]
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self.server = serve(self._session, '127.0.0.1', port)
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f"ws://127.0.0.1:{self.server.socket.getsockname()[1]}/v2/realtime/ws"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+
+    def count(self, route):
+        with self._lock:
+            self.calls[route] += 1
+
+    def _session(self, websocket):
+        from websockets.exceptions import ConnectionClosed
+
+        self.count('session')
+        websocket.send(json.dumps({"message_type": "SessionBegins", "session_id": f"s{id(websocket)}"}))
+        sentence, heard = 0, 0
+
+        def transcript(kind, words):
+            websocket.send(json.dumps({"message_type": kind, "text": ' '.join(words), "confidence": 0.9}))
+
+        try:
+            for message in websocket:
+                data = json.loads(message)
+                if data.get('terminate_session'):
+                    if sentence < len(self.sentences) and heard:
+                        transcript('FinalTranscript', self.sentences[sentence][:heard])
+                    websocket.send(json.dumps({"message_type": "SessionTerminated"}))
+                    break
+                self.count('audio')
+                if sentence >= len(self.sentences):
+                    continue
+                heard += 1
+                words = self.sentences[sentence]
+                transcript('PartialTranscript', words[:heard])
+                if heard == len(words):
+                    transcript('FinalTranscript', words)
+                    sentence, heard = sentence + 1, 0
+        except ConnectionClosed:
+            pass
+
+
+def stream_call(url, call_sid, from_number, seconds=3.0, frame_seconds=0.02, pace=0.0):
+    """Play Twilio's side of a Media Streams call against ``url``
+
+    Sends ``seconds`` of 8 kHz mu-law audio in ``frame_seconds`` frames,
+    sleeping ``pace`` between frames, then stops the stream.
+    """
+    from websockets.sync.client import connect
+
+    from websockets.exceptions import ConnectionClosed
+
+    frame = base64.b64encode(b'\xff' * int(8000 * frame_seconds)).decode()
+    with connect(url) as websocket:
+        try:
+            websocket.send(json.dumps({"event": "connected", "protocol": "Call", "version": "1.0.0"}))
+            websocket.send(json.dumps({"event": "start", "streamSid": f"MZ{call_sid}", "start": {
+                "callSid": call_sid, "streamSid": f"MZ{call_sid}", "tracks": ["inbound"],
+                "customParameters": {"from": from_number},
+                "mediaFormat": {"encoding": "audio/x-mulaw", "sampleRate": 8000, "channels": 1}
+            }}))
+            for n in range(int(seconds / frame_seconds)):
+                websocket.send(json.dumps({"event": "media", "streamSid": f"MZ{call_sid}",
+                                           "media": {"track": "inbound", "chunk": str(n + 1), "payload": frame}}))
+                if pace:
+                    time.sleep(pace)
+            websocket.send(json.dumps({"event": "stop", "streamSid": f"MZ{call_sid}"}))
+        except ConnectionClosed:
+            # The server ended the stream, as Twilio would see at max duration
+            pass
+
+
+def start_all(airtable_latency=0.0, airtable_error_rate=0.0, airtable_rate_limit=5, texts=None):
+    """Start one of each stub on free ports"""
+    return {
+        'airtable': AirtableStub(latency=airtable_latency, error_rate=airtable_error_rate,
+                                 rate_limit=airtable_rate_limit).start(),
+        'assemblyai': AssemblyAIStub(texts=texts).start(),
+        'assemblyai_realtime': AssemblyAIRealtimeStub().start(),
+        'twilio': TwilioStub().start()
+    }
+
+
+if __name__ == "__main__":
+    stubs = start_all()
+    for name, stub in stubs.items():
+        print(f"{name:>10}: {stub.url}")
+    print("\nPress Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
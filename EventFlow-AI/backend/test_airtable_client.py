@@ -0,0 +1,110 @@
+"""Tests for retries, batching and paging in airtable_client.py"""
+import pytest
+import requests
+
+import airtable_client
+import resilience
+from airtable_client import AirtableClient, AirtableError
+from resilience import CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body or {}
+        self.text = str(self._body)
+
+    def json(self):
+        return self._body
+
+
+class FakeSession:
+    """Returns the scripted responses (or raises the scripted errors) in turn"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.calls.append((method, url, kwargs))
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(airtable_client.time, 'sleep', sleeps.append)
+    monkeypatch.setitem(resilience._breakers, 'airtable', CircuitBreaker('airtable', min_calls=100))
+    return sleeps
+
+
+def make_client(*outcomes, **kwargs):
+    client = AirtableClient('key', 'app123', rate_limit=1000, base_url='http://airtable.test/v0', **kwargs)
+    client._session = FakeSession(*outcomes)
+    return client
+
+
+def test_retries_throttled_requests_honouring_retry_after(no_waiting):
+    client = make_client(FakeResponse(429, headers={'Retry-After': '2'}), FakeResponse(503),
+                         FakeResponse(200, {'id': 'rec1'}))
+    response = client.create('Leads', {'Name': 'Ada'})
+
+    assert response.json() == {'id': 'rec1'}
+    assert no_waiting == [2.0, 1.0]
+    method, url, kwargs = client.session.calls[0]
+    assert (method, url, kwargs['json']) == ('POST', 'http://airtable.test/v0/app123/Leads', {'fields': {'Name': 'Ada'}})
+
+
+def test_returns_the_last_response_when_retries_run_out():
+    client = make_client(*[FakeResponse(503) for _ in range(3)], retry_attempts=2)
+    assert client.update('Leads', 'rec1', {'Status': 'new'}).status_code == 503
+    assert len(client.session.calls) == 3
+
+
+def test_client_errors_are_not_retried():
+    client = make_client(FakeResponse(422))
+    assert client.create('Leads', {}).status_code == 422
+    assert len(client.session.calls) == 1
+
+
+def test_connection_errors_raise_after_the_last_attempt():
+    client = make_client(*[requests.ConnectionError('refused') for _ in range(2)], retry_attempts=1)
+    with pytest.raises(AirtableError):
+        client.create('Leads', {})
+
+
+def test_batches_are_limited_to_ten_records():
+    client = make_client(FakeResponse(200, {'records': []}))
+    with pytest.raises(ValueError):
+        client.create_records('Leads', [{}] * 11)
+    client.update_records('Leads', [{'id': 'rec1', 'fields': {}}])
+    assert client.session.calls[0][2]['json'] == {'records': [{'id': 'rec1', 'fields': {}}]}
+
+
+def test_iter_records_follows_offsets():
+    client = make_client(
+        FakeResponse(200, {'records': [{'id': 'rec1'}, {'id': 'rec2'}], 'offset': 'itr1'}),
+        FakeResponse(200, {'records': [{'id': 'rec3'}]})
+    )
+    assert [record['id'] for record in client.iter_records('Leads', fields=['Name'])] == ['rec1', 'rec2', 'rec3']
+    params = [call[2]['params'] for call in client.session.calls]
+    assert params[0] == {'pageSize': 100, 'fields[]': ['Name']}
+    assert params[1]['offset'] == 'itr1'
+
+
+def test_find_returns_nothing_on_errors():
+    client = make_client(FakeResponse(200, {'records': [{'id': 'rec1'}]}), FakeResponse(422))
+    assert client.find('Transcripts', "{MessageID} = 'SM1'") == [{'id': 'rec1'}]
+    assert client.find('Transcripts', "{MessageID} = 'SM2'") == []
+
+
+def test_one_pooled_session_carries_the_credentials():
+    client = AirtableClient('key', 'app123')
+    assert client.session is client.session
+    assert client.session.headers['Authorization'] == 'Bearer key'
+    assert client.configured
+    assert not AirtableClient(None, 'app123').configured
@@ -0,0 +1,116 @@
+"""Tests for the daily Analytics rollup in analytics.py"""
+from datetime import date
+
+import pytest
+
+import analytics
+import event_log
+from analytics import TABLE, AnalyticsRollup, DayTotals, TopK, day_start
+from event_log import EventLog
+from local_store import LocalStore
+
+DAY = date(2027, 1, 10)
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock(day_start(DAY) + 3600)
+    monkeypatch.setattr(event_log.time, 'time', clock)
+    monkeypatch.setattr(analytics.time, 'time', clock)
+    return clock
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / 'eventflow.db'))
+
+
+@pytest.fixture
+def log(tmp_path):
+    return EventLog(str(tmp_path / 'events'))
+
+
+def record(log, clock, *events):
+    for event_type, data in events:
+        log.log(event_type, data)
+        clock.now += 1
+    log.flush()
+
+
+def row(store, day):
+    rows = store.find_by(TABLE, 'Date', day.isoformat())
+    assert len(rows) == 1
+    return rows[0]['fields']
+
+
+def test_top_k_keeps_the_frequent_keys():
+    sketch = TopK(capacity=2)
+    for key in ['wedding'] * 5 + ['birthday'] * 3 + ['corporate']:
+        sketch.add(key)
+    # corporate replaced birthday and inherited its count
+    assert sketch.top(1) == [('wedding', 5)]
+    assert sketch.counts == {'wedding': 5, 'corporate': 4}
+
+
+def test_day_totals_fields():
+    totals = DayTotals(DAY)
+    for event in [
+        {'type': 'incoming_call', 'data': {'response_ms': 20}},
+        {'type': 'incoming_sms', 'data': {'response_ms': 40}},
+        {'type': 'incoming_sms', 'data': {}},
+        {'type': 'call_transcribed', 'data': {'confidence': 0.8}},
+        {'type': 'call_transcribed', 'data': {'confidence': 0.9}},
+        {'type': 'lead_analyzed', 'data': {'categories': ['Wedding Planning', 'Corporate Event']}},
+        {'type': 'lead_analyzed', 'data': {'categories': ['Wedding Planning']}},
+    ]:
+        totals.add(event)
+
+    assert totals.fields() == {
+        'Date': '2027-01-10', 'TotalCalls': 1, 'TotalSMS': 2, 'TranscriptionsProcessed': 2,
+        'AvgConfidence': 0.85, 'TopCategories': 'Wedding Planning, Corporate Event', 'ResponseTime': 30.0
+    }
+    assert DayTotals(DAY).fields()['AvgConfidence'] is None
+
+
+def test_rollup_writes_finished_days_and_fills_gaps(store, log, clock):
+    rollup = AnalyticsRollup(store, log, lag=0)
+    record(log, clock, ('incoming_call', {}), ('incoming_sms', {}))
+    assert rollup.run_once()
+    assert rollup.today()['TotalCalls'] == 1
+    assert store.find_by(TABLE, 'Date', DAY.isoformat()) == []
+
+    clock.now += 2 * 86400
+    record(log, clock, ('incoming_sms', {}))
+    rollup.run_once()
+
+    assert (row(store, DAY)['TotalCalls'], row(store, DAY)['TotalSMS']) == (1, 1)
+    assert row(store, date(2027, 1, 11))['TotalSMS'] == 0
+    assert rollup.today()['Date'] == '2027-01-12'
+
+
+def test_a_restart_rebuilds_the_day_without_double_counting(store, log, clock):
+    AnalyticsRollup(store, log, lag=0).run_once()
+    record(log, clock, ('incoming_call', {}), ('incoming_call', {}))
+    AnalyticsRollup(store, log, lag=0).run_once()
+
+    restarted = AnalyticsRollup(store, log, lag=0)
+    record(log, clock, ('incoming_call', {}))
+    restarted.run_once()
+    assert restarted.today()['TotalCalls'] == 3
+
+
+def test_recompute_replaces_the_row(store, log, clock):
+    record(log, clock, ('incoming_call', {}), ('call_transcribed', {'confidence': 0.5}))
+    rollup = AnalyticsRollup(store, log)
+    store.insert(TABLE, {'Date': DAY.isoformat(), 'TotalCalls': 99})
+
+    assert rollup.recompute(DAY)['TotalCalls'] == 1
+    assert row(store, DAY)['AvgConfidence'] == 0.5
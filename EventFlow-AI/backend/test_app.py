@@ -0,0 +1,106 @@
+"""Tests for the job handlers and Airtable lookups in app.py"""
+import pytest
+
+import app
+from cache import TTLCache
+from services import Services
+from settings import Settings
+
+
+@pytest.fixture
+def services(tmp_path, monkeypatch):
+    settings = Settings.from_env({'DATA_DIR': str(tmp_path), 'TWILIO_PHONE_NUMBER': '+15550000001'})
+    built = Services(settings)
+    monkeypatch.setattr(app, 'services', built)
+    return built
+
+
+def test_sms_job_errors_propagate_and_retry_stores_once(services, monkeypatch):
+    classify = services.classifier.classify_many
+    calls = []
+
+    def flaky(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise OSError('disk busy')
+        return classify(texts)
+
+    monkeypatch.setattr(services.classifier, 'classify_many', flaky)
+    with pytest.raises(OSError):
+        app.process_sms_message('Planning a wedding for 80 guests', '+14155550123', 'SM1')
+    app.process_sms_message('Planning a wedding for 80 guests', '+14155550123', 'SM1')
+
+    records = services.local_store.find_by('Transcripts', 'MessageID', 'SM1')
+    assert len(records) == 1
+    assert records[0]['fields']['Status'] == 'analyzed'
+    assert records[0]['fields']['Categories'] == 'Wedding Planning'
+
+
+class FakeAirtable:
+    configured = True
+    timeout = 1
+
+    def __init__(self):
+        self.finds = []
+
+    def find(self, table, formula):
+        self.finds.append(formula)
+        return [{'id': 'recFound', 'fields': {}}]
+
+
+class FakeWriter:
+    def __init__(self):
+        self.updates = []
+
+    def update(self, table, record_id, fields):
+        self.updates.append((table, record_id, fields))
+
+
+@pytest.fixture
+def remote(services, monkeypatch):
+    airtable, writer = FakeAirtable(), FakeWriter()
+    monkeypatch.setattr(services, 'airtable', airtable)
+    monkeypatch.setattr(services, 'airtable_writer', writer)
+    return airtable, writer
+
+
+def test_pushed_and_pulled_records_skip_the_formula_lookup(services, remote):
+    airtable, writer = remote
+    services.airtable_syncer.on_push('Transcripts', 1, {'id': 'recPushed', 'fields': {'MessageID': 'SM1'}})
+    services.airtable_syncer.on_pull('Transcripts', 2, {'id': 'recPulled', 'fields': {'MessageID': 'SM2'}})
+
+    app.update_lead_categories('SM1', ['Wedding Planning'])
+    app.update_lead_categories('SM2', [])
+
+    assert airtable.finds == []
+    assert [update[1] for update in writer.updates] == ['recPushed', 'recPulled']
+    assert writer.updates[0][2] == {'Status': 'analyzed', 'Categories': 'Wedding Planning'}
+
+
+def test_lookup_misses_fall_back_to_the_formula_once(services, remote):
+    airtable, writer = remote
+    app.update_lead_categories('SM3', ['Corporate Event'])
+    app.update_lead_categories('SM3', ['Corporate Event'])
+
+    assert airtable.finds == ["{MessageID} = 'SM3'"]
+    assert [update[1] for update in writer.updates] == ['recFound', 'recFound']
+
+
+def test_record_index_survives_a_restart(tmp_path):
+    path = str(tmp_path / 'record_index.json')
+    index = TTLCache(max_size=2, ttl=60, path=path)
+    for message_id in ('SM1', 'SM2', 'SM3'):
+        index.put(message_id, f"rec{message_id}")
+    index.save()
+
+    reloaded = TTLCache(max_size=2, ttl=60, path=path)
+    assert reloaded.get('SM1') is None
+    assert reloaded.get('SM3') == 'recSM3'
+
+
+def test_malformed_lead_cursors_are_client_errors(services):
+    client = app.create_app(services.settings, start_services=False).test_client()
+    response = client.get('/api/leads', query_string={'cursor': 'eyJvIjoiYWJjIiwicyI6IiJ9'})
+
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Invalid cursor'}
@@ -0,0 +1,65 @@
+"""Tests for choosing one transcript per call in call_transcripts.py"""
+import pytest
+
+from call_transcripts import STATUS_STORED, STATUS_WAITING, TranscriptReconciler, pick_best
+from jobs import JobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def reconciler(tmp_path, queue):
+    reconciler = TranscriptReconciler(str(tmp_path / 'call_transcripts.db'), queue, hold=0)
+    yield reconciler
+    reconciler.close()
+
+
+def test_pick_best_prefers_confidence_then_assemblyai():
+    candidates = {
+        'twilio': {'text': 'hello', 'confidence': 0.8, 'from_number': '+14155550123'},
+        'assemblyai': {'text': 'Hello.', 'confidence': 0.8, 'from_number': None},
+    }
+    assert pick_best(candidates) == {'text': 'Hello.', 'confidence': 0.8, 'from_number': '+14155550123',
+                                     'source': 'assemblyai'}
+
+    candidates['twilio']['confidence'] = 0.9
+    assert pick_best(candidates)['source'] == 'twilio'
+    assert pick_best({'twilio': {'text': None}, 'assemblyai': {'text': ''}}) is None
+
+
+def test_the_call_completes_once_every_source_reports(reconciler, queue):
+    assert reconciler.add('CA1', 'twilio', 'hello', 0.7, '+14155550123') is None
+    resolve = queue.claim(timeout=0)
+    assert (resolve['kind'], resolve['payload']) == ('resolve_call_transcript', {'call_sid': 'CA1'})
+
+    chosen = reconciler.add('CA1', 'assemblyai', 'Hello.', 0.95)
+    assert (chosen['text'], chosen['from_number']) == ('Hello.', '+14155550123')
+    # Holding expired after the call was stored
+    assert reconciler.resolve('CA1') is None
+    assert reconciler.counts() == {STATUS_WAITING: 0, STATUS_STORED: 1, 'late': 0}
+
+
+def test_the_hold_releases_whatever_arrived(reconciler):
+    reconciler.add('CA1', 'twilio', 'hello', 0.7)
+    assert reconciler.resolve('CA1')['source'] == 'twilio'
+
+    assert reconciler.add('CA1', 'assemblyai', 'Hello.', 0.95) is None
+    assert reconciler.counts()['late'] == 1
+
+
+def test_calls_without_text_are_stored_as_nothing(reconciler):
+    reconciler.add('CA1', 'twilio', None)
+    assert reconciler.add('CA1', 'assemblyai', None) is None
+    assert reconciler.counts()[STATUS_STORED] == 1
+
+
+def test_a_single_source_completes_immediately(tmp_path, queue):
+    reconciler = TranscriptReconciler(str(tmp_path / 'single.db'), queue, sources=['twilio'])
+    assert reconciler.add('CA1', 'twilio', 'hello')['source'] == 'twilio'
+    assert queue.claim(timeout=0) is None
+    reconciler.close()
@@ -0,0 +1,187 @@
+"""Tests for bulk SMS campaigns in campaigns.py"""
+import threading
+import time
+
+import pytest
+
+import campaigns
+from campaigns import CampaignManager, CampaignStore
+from resilience import CircuitOpen
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+class FakeSender:
+    """Raises the queued errors in turn, then accepts every message"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def send(self, to, from_number, body, status_callback=None):
+        with self._lock:
+            if self.errors:
+                raise self.errors.pop(0)
+            self.sent.append(to)
+            return f"SM{len(self.sent)}"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CampaignStore(str(tmp_path / 'campaigns.db'))
+
+
+@pytest.fixture(autouse=True)
+def no_waiting(monkeypatch):
+    monkeypatch.setattr(CampaignManager, '_pause', lambda self, seconds: not self._stop.is_set())
+
+
+def wait_until_completed(manager, campaign_id):
+    for _ in range(100):
+        progress = manager.progress(campaign_id, include_recipients=True)
+        if progress['status'] == campaigns.STATUS_COMPLETED:
+            return progress
+        manager.wait_for_change(timeout=0.05)
+    raise AssertionError('campaign did not finish')
+
+
+def run(manager, recipients):
+    return wait_until_completed(manager, manager.start('Hello', recipients)['id'])
+
+
+def test_campaign_sends_to_each_recipient_once(store):
+    sender = FakeSender()
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000, concurrency=2)
+    progress = run(manager, ['+14155550101', '+14155550102', ' +14155550101 ', ''])
+
+    assert sorted(sender.sent) == ['+14155550101', '+14155550102']
+    assert (progress['total'], progress['sent'], progress['failed'], progress['pending']) == (2, 2, 0, 0)
+
+
+def test_open_breaker_does_not_fail_the_campaign(store):
+    # Throttled, then refused while the breaker is open: everything is still sent
+    errors = [HttpError(429)] + [CircuitOpen('twilio', 0.1) for _ in range(30)]
+    sender = FakeSender(errors)
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000, concurrency=4)
+    recipients = [f"+1415555{index:04d}" for index in range(30)]
+    progress = run(manager, recipients)
+
+    assert progress['sent'] == 30
+    assert progress['failed'] == 0
+    assert sorted(sender.sent) == recipients
+
+
+def test_rejected_and_exhausted_sends_fail(store):
+    sender = FakeSender([HttpError(400), HttpError(429), HttpError(429), HttpError(429)])
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000, concurrency=1,
+                              retry_attempts=2)
+    progress = run(manager, ['+14155550101', '+14155550102'])
+
+    assert progress['failed'] == 2
+    assert progress['recipients']['+14155550101']['error'] == 'HTTP 400'
+    assert progress['recipients']['+14155550102']['error'] == 'HTTP 429'
+
+
+def test_status_callbacks_reach_any_manager(store):
+    sender = FakeSender()
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000)
+    progress = run(manager, ['+14155550101', '+14155550102'])
+
+    # Another worker process opening the same file
+    other = CampaignManager(FakeSender(), ['+15550000001'], CampaignStore(store.path), per_number_rate=1000)
+    sids = {number: state['sid'] for number, state in progress['recipients'].items()}
+    assert other.record_status(sids['+14155550101'], 'delivered')
+    assert other.record_status(sids['+14155550102'], 'undelivered', '30003')
+    # Final statuses stick
+    assert other.record_status(sids['+14155550101'], 'failed')
+    assert not other.record_status('SMunknown', 'delivered')
+
+    progress = manager.progress(progress['id'], include_recipients=True)
+    assert (progress['delivered'], progress['undelivered']) == (1, 1)
+    assert progress['recipients']['+14155550102']['error'] == '30003'
+
+
+def test_store_keeps_the_latest_campaigns(tmp_path):
+    store = CampaignStore(str(tmp_path / 'campaigns.db'), history=2)
+    for campaign_id in ('a', 'b', 'c'):
+        store.create(campaign_id, 'Hello', ['+14155550101'])
+    assert store.progress('a') is None
+    assert store.progress('c')['total'] == 1
+
+
+class BlockingSender(FakeSender):
+    """Holds every send until released, tracking how many run at once"""
+
+    def __init__(self):
+        super().__init__()
+        self.release = threading.Event()
+        self.active = 0
+        self.peak = 0
+
+    def send(self, to, from_number, body, status_callback=None):
+        with self._lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        self.release.wait(5)
+        with self._lock:
+            self.active -= 1
+        return super().send(to, from_number, body, status_callback)
+
+
+def test_campaigns_share_one_bounded_pool(store):
+    sender = BlockingSender()
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000, concurrency=3)
+    first = manager.start('Hello', [f"+1415555{index:04d}" for index in range(10)])
+    second = manager.start('Hello again', [f"+1415556{index:04d}" for index in range(10)])
+    while sender.active < 3:
+        manager.wait_for_change(timeout=0.01)
+    sender.release.set()
+    for campaign in (first, second):
+        wait_until_completed(manager, campaign['id'])
+    manager.shutdown()
+
+    assert sender.peak == 3
+    assert len(sender.sent) == 20
+
+
+def test_send_slots_are_shared_between_processes(store):
+    other = CampaignStore(store.path)
+    slots = [store_.reserve_send('+15550000001', 0.5) for store_ in (store, other, store, other)]
+    assert [round(slot - slots[0], 3) for slot in slots] == [0, 0.5, 1.0, 1.5]
+    # Each number has its own slots
+    assert other.reserve_send('+15550000002', 0.5) < slots[1]
+
+
+def test_shutdown_leaves_unsent_recipients_for_another_process(store):
+    sender = BlockingSender()
+    manager = CampaignManager(sender, ['+15550000001'], store, per_number_rate=1000, concurrency=1)
+    recipients = [f"+1415555{index:04d}" for index in range(5)]
+    campaign = manager.start('Hello', recipients)
+    while sender.active < 1:
+        manager.wait_for_change(timeout=0.01)
+    threading.Timer(0.05, sender.release.set).start()
+    manager.shutdown()
+
+    # The send in progress completes; the rest stay queued and the lease is released
+    reopened = CampaignStore(store.path)
+    assert reopened.queued(campaign['id']) == recipients[1:]
+
+    successor = CampaignManager(FakeSender(), ['+15550000001'], reopened, per_number_rate=1000)
+    assert successor.resume_expired() == 1
+    assert wait_until_completed(successor, campaign['id'])['sent'] == 5
+    assert sorted(successor.sender.sent) == recipients[1:]
+    successor.shutdown()
+
+
+def test_only_expired_leases_are_taken_over(store):
+    store.create('live', 'Hello', ['+14155550101'], owner='a', lease_until=time.time() + 60)
+    store.create('orphan', 'Hello', ['+14155550102'], owner='b', lease_until=time.time() - 1)
+
+    assert store.claim_expired('c', time.time() + 60) == [('orphan', 'Hello')]
+    # Now leased to c
+    assert store.claim_expired('d', time.time() + 60) == []
@@ -0,0 +1,47 @@
+"""Tests for the keyword category classifier in classifier.py"""
+import pytest
+
+from classifier import CategoryClassifier
+
+KEYWORDS = {
+    'wedding': ['wedding', 'marriage', 'bridal'],
+    'corporate': ['corporate', 'business', 'meeting'],
+    'birthday': ['birthday', 'party'],
+    'photography': ['photography', 'photo', 'photographer']
+}
+
+
+@pytest.fixture
+def classifier():
+    return CategoryClassifier(KEYWORDS)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Planning our WEDDING reception', ['Wedding Planning']),
+    # "party" is its own group as well as a birthday keyword
+    ('A bridal shower and a birthday party', ['Wedding Planning', 'Birthday Party', 'Social Party']),
+    ('Two business meetings next week', ['Corporate Event', 'Business Meeting']),
+    ('We need a photographer', ['Photography Services']),
+    ('Birthdays and photos', ['Birthday Party', 'Photography Services']),
+    ('Unbusinesslike pre-wedding chatter', []),
+    ('', []),
+    (None, []),
+])
+def test_classify(classifier, text, expected):
+    assert classifier.classify(text) == expected
+
+
+def test_groups_outside_the_known_names_are_title_cased():
+    classifier = CategoryClassifier({'gala': ['gala', 'ball']})
+    assert classifier.classify('A charity ball') == ['Gala']
+
+
+def test_classify_many_keeps_order(classifier):
+    assert classifier.classify_many(['wedding', None, 'meeting']) == [
+        ['Wedding Planning'], [], ['Corporate Event', 'Business Meeting']
+    ]
+
+
+def test_from_config_reads_the_keyword_groups():
+    classifier = CategoryClassifier.from_config()
+    assert classifier.classify('Catering for a conference dinner') == ['Conference', 'Catering Services']
@@ -0,0 +1,72 @@
+"""Tests for the rotating call-event log in event_log.py"""
+import os
+
+import pytest
+
+import event_log
+from event_log import EventLog, parse_time
+
+
+class Clock:
+    def __init__(self, now=1_800_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(event_log.time, 'time', clock)
+    return clock
+
+
+def log_minutes(log, clock, types):
+    """Log one event a minute, flushing each"""
+    for event_type in types:
+        log.log(event_type, {'at': clock.now})
+        log.flush()
+        clock.now += 60
+
+
+def test_query_filters_by_type_and_time(tmp_path, clock):
+    log = EventLog(str(tmp_path))
+    start = clock.now
+    log_minutes(log, clock, ['incoming_call', 'sms', 'incoming_call', 'sms', 'incoming_call'])
+
+    assert [event['type'] for event in log.query()] == ['incoming_call', 'sms'] * 2 + ['incoming_call']
+    calls = list(log.query(types=['incoming_call'], since=start + 60, until=start + 240))
+    assert [event['data']['at'] for event in calls] == [start + 120, start + 240]
+    assert len(list(log.query(limit=2))) == 2
+
+
+def test_segments_rotate_compress_and_expire(tmp_path, clock):
+    log = EventLog(str(tmp_path), segment_bytes=1, compress=True, retention_days=1)
+    start = clock.now
+    log_minutes(log, clock, ['sms'] * 3)
+
+    assert len([name for name in os.listdir(tmp_path) if name.endswith('.jsonl.gz')]) == 2
+    assert [event['data']['at'] for event in log.query(since=start + 30)] == [start + 60, start + 120]
+
+    # Two days on, rotating drops the segments past retention
+    clock.now += 2 * 86400
+    log_minutes(log, clock, ['sms'])
+    log.close()
+    assert [event['data']['at'] for event in log.query()] == [clock.now - 60]
+
+
+def test_a_full_ring_drops_the_oldest_events(tmp_path, clock):
+    log = EventLog(str(tmp_path), buffer_size=2)
+    for index in range(3):
+        log.log('sms', {'n': index})
+    assert (log.dropped, log.pending) == (1, 2)
+    assert [event['data']['n'] for event in log.query()] == [1, 2]
+
+
+def test_parse_time():
+    assert parse_time('1800000000') == 1800000000
+    assert parse_time('2027-01-15T12:00:00Z') == 1800014400
+    assert parse_time(None) is None
+    with pytest.raises(ValueError):
+        parse_time('soon')
@@ -0,0 +1,79 @@
+"""Tests for lead attribute extraction in extraction.py"""
+from datetime import date
+
+import pytest
+
+from extraction import LeadAttributeExtractor, parse_number
+
+REFERENCE = date(2026, 10, 18)
+
+
+def extract(text):
+    return LeadAttributeExtractor().extract(text, REFERENCE)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('1,200', 1200), ('2.5', 2.5), ('a hundred and fifty', 150), ('two thousand five hundred', 2500),
+    ('a dozen', 12), ('two dozen', 24), ('nothing', None),
+])
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('We are expecting 150 guests', {'GuestCount': 150}),
+    ('about a hundred and twenty people', {'GuestCount': 120}),
+    ('Guest count of 80', {'GuestCount': 80}),
+    ('somewhere between 100-150 people', {'GuestCount': 150}),
+    ('we are 5 at the office', {}),
+])
+def test_guest_counts(text, expected):
+    assert extract(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('The wedding is on June 14th', '2027-06-14'),
+    ('14 June 2027', '2027-06-14'),
+    ('on 10/25', '2026-10-25'),
+    ('on 6/14/27', '2027-06-14'),
+    ('2027-06-14', '2027-06-14'),
+    ('the 3rd of March', '2027-03-03'),
+    ('June 31st', None),
+])
+def test_dates(text, expected):
+    assert extract(text).get('EventDate') == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('our budget is $5,000', 5000),
+    ('around 5k dollars', 5000),
+    ('maybe 10 grand', 10000),
+    ('budget of 8000', 8000),
+    ('$2k now and $12,500 total', 12500),
+    ('$45 per head for 100 guests', 4500),
+])
+def test_budgets(text, expected):
+    assert extract(text).get('Budget') == expected
+
+
+def test_per_head_price_is_not_a_total_without_a_guest_count():
+    assert extract('$45 per person') == {}
+
+
+def test_extract_many_matches_extract():
+    extractor = LeadAttributeExtractor()
+    texts = ['150 guests on June 14th', None, 'budget of 8000']
+    assert extractor.extract_many(texts, [REFERENCE] * 3) == [extract(text) if text else {} for text in texts]
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('We need it on the 3rd, may 5 people', {'GuestCount': 5}),
+    ('1/2 of the guests are vegan', {}),
+    ('May 5th for 80 guests', {'GuestCount': 80, 'EventDate': '2027-05-05'}),
+    ('may 5, 2027', {'EventDate': '2027-05-05'}),
+    ('the 5th of may', {'EventDate': '2027-05-05'}),
+    ('mar 3 adults', {'GuestCount': 3}),
+    ('jun 14th', {'EventDate': '2027-06-14'}),
+])
+def test_ambiguous_months_and_fractions(text, expected):
+    assert extract(text) == expected
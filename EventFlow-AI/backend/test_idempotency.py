@@ -0,0 +1,123 @@
+"""Tests for webhook replay protection in idempotency.py"""
+import threading
+
+import pytest
+from flask import Flask
+
+from idempotency import IdempotencyCache, MemoryBackend, SqliteBackend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'sqlite':
+        return SqliteBackend(str(tmp_path / 'idempotency.db'))
+    return MemoryBackend()
+
+
+def make_app(cache, handler):
+    app = Flask(__name__)
+
+    @app.route('/webhook', methods=['POST'])
+    @cache.idempotent('MessageSid')
+    def webhook():
+        return handler()
+
+    return app
+
+
+def post(app, sid='SM1'):
+    return app.test_client().post('/webhook', data={'MessageSid': sid} if sid else {})
+
+
+def test_replays_return_the_first_response(backend):
+    calls = []
+
+    def handler():
+        calls.append(1)
+        return f"<Response>{len(calls)}</Response>", 200
+
+    app = make_app(IdempotencyCache(backend), handler)
+    first, replay, other = post(app), post(app), post(app, 'SM2')
+
+    assert len(calls) == 2
+    assert replay.get_data() == first.get_data() == b'<Response>1</Response>'
+    assert other.get_data() == b'<Response>2</Response>'
+    assert backend.stats()['hits'] >= 1
+
+
+def test_requests_without_an_id_always_run(backend):
+    calls = []
+    app = make_app(IdempotencyCache(backend), lambda: calls.append(1) or 'ok')
+    post(app, None)
+    post(app, None)
+    assert len(calls) == 2
+
+
+def test_a_replay_during_the_first_request_waits_for_its_response(backend):
+    calls = []
+    started, finish = threading.Event(), threading.Event()
+
+    def handler():
+        calls.append(1)
+        started.set()
+        finish.wait(5)
+        return 'first', 200
+
+    app = make_app(IdempotencyCache(backend), handler)
+    responses = []
+    first = threading.Thread(target=lambda: responses.append(post(app)))
+    first.start()
+    started.wait(5)
+    replay = threading.Thread(target=lambda: responses.append(post(app)))
+    replay.start()
+    threading.Timer(0.1, finish.set).start()
+    first.join(5)
+    replay.join(5)
+
+    assert len(calls) == 1
+    assert [response.get_data() for response in responses] == [b'first', b'first']
+
+
+def test_a_replay_gives_up_with_409(backend):
+    started, finish = threading.Event(), threading.Event()
+
+    def handler():
+        started.set()
+        finish.wait(5)
+        return 'first', 200
+
+    app = make_app(IdempotencyCache(backend, wait=0.1), handler)
+    first = threading.Thread(target=post, args=(app,))
+    first.start()
+    started.wait(5)
+    try:
+        assert post(app).status_code == 409
+    finally:
+        finish.set()
+        first.join(5)
+    assert post(app).get_data() == b'first'
+
+
+def test_errors_are_not_cached_so_twilio_can_retry(backend):
+    outcomes = [RuntimeError('boom'), ('unavailable', 503), ('ok', 200)]
+
+    def handler():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    app = make_app(IdempotencyCache(backend), handler)
+    assert post(app).status_code == 500
+    assert post(app).status_code == 503
+    assert post(app).get_data() == b'ok'
+    assert post(app).get_data() == b'ok'
+    assert outcomes == []
+
+
+def test_stale_reservations_are_taken_over(tmp_path):
+    backend = SqliteBackend(str(tmp_path / 'idempotency.db'), in_flight_ttl=0)
+    # Left behind by a process that died mid-request
+    assert backend.reserve('/webhook:SM1')
+    app = make_app(IdempotencyCache(backend), lambda: 'ok')
+    assert post(app).get_data() == b'ok'
@@ -0,0 +1,79 @@
+"""Tests for JobQueue retries and WorkerPool postponement in jobs.py"""
+import time
+
+import pytest
+
+from jobs import STATUS_DONE, STATUS_FAILED, STATUS_QUEUED, JobQueue, WorkerPool
+from resilience import CircuitOpen
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'), max_attempts=3)
+    yield queue
+    queue.close()
+
+
+def test_fail_requeues_with_backoff(queue):
+    job_id = queue.enqueue('work', {'n': 1})
+    job = queue.claim(timeout=0)
+    assert job['attempts'] == 1
+
+    before = time.time()
+    queue.fail(job_id, job['attempts'], 'boom')
+    stored = queue.get(job_id)
+    assert stored['status'] == STATUS_QUEUED
+    assert stored['error'] == 'boom'
+    # Backing off for 2 ** attempts seconds
+    assert queue.claim(timeout=0) is None
+    run_after = queue._conn.execute("SELECT run_after FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+    assert run_after >= before + 2
+
+
+def test_fail_gives_up_after_max_attempts(queue):
+    job_id = queue.enqueue('work', {})
+    queue.fail(job_id, 3, 'boom')
+    assert queue.get(job_id)['status'] == STATUS_FAILED
+
+
+def test_postpone_refunds_the_attempt(queue):
+    job_id = queue.enqueue('work', {})
+    job = queue.claim(timeout=0)
+    queue.postpone(job_id, 0, 'circuit open')
+
+    stored = queue.get(job_id)
+    assert stored['status'] == STATUS_QUEUED
+    assert stored['attempts'] == 0
+    assert queue.claim(timeout=0)['attempts'] == job['attempts']
+
+
+def test_worker_pool_postpones_jobs_stopped_by_an_open_breaker(queue):
+    def handler():
+        raise CircuitOpen('airtable', 0.5)
+
+    pool = WorkerPool(queue, size=1)
+    pool.register('work', handler)
+    job_id = queue.enqueue('work', {})
+    pool._execute(queue.claim(timeout=0))
+
+    stored = queue.get(job_id)
+    assert stored['status'] == STATUS_QUEUED
+    assert stored['attempts'] == 0
+    assert 'circuit is open' in stored['error']
+
+
+def test_worker_pool_completes_and_fails_jobs(queue):
+    def handler(ok):
+        if not ok:
+            raise ValueError('bad payload')
+
+    pool = WorkerPool(queue, size=1)
+    pool.register('work', handler)
+    done = queue.enqueue('work', {'ok': True})
+    pool._execute(queue.claim(timeout=0))
+    failed = queue.enqueue('work', {'ok': False})
+    pool._execute(queue.claim(timeout=0))
+
+    assert queue.get(done)['status'] == STATUS_DONE
+    assert queue.get(failed)['status'] == STATUS_QUEUED
+    assert queue.get(failed)['attempts'] == 1
@@ -0,0 +1,74 @@
+"""Tests for cursor paging in leads.py and LocalStore.list_page"""
+import base64
+import json
+
+import pytest
+
+from leads import InvalidQuery, LeadLister, decode_cursor, encode_cursor
+from local_store import LocalStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(str(tmp_path / 'eventflow.db'))
+    for index in range(25):
+        # Every fifth lead has no timestamp; pairs share one to exercise ties
+        timestamp = None if index % 5 == 0 else f"2026-10-{index // 2 + 1:02d}T09:00:00"
+        store.insert('Leads', {'Name': f"Lead {index}", 'Timestamp': timestamp})
+    return store
+
+
+def page_through(lister, **params):
+    names, cursor = [], None
+    while True:
+        page = lister.list(limit=4, cursor=cursor, fields='name', **params)
+        names.extend(lead['name'] for lead in page['leads'])
+        cursor = page['nextCursor']
+        if cursor is None:
+            return names
+
+
+@pytest.mark.parametrize('sort', ['-timestamp', 'timestamp', 'name'])
+def test_cursors_visit_every_lead_once_in_order(store, sort):
+    expected = [lead['name'] for lead in LeadLister(store).list(limit=100, fields='name', sort=sort)['leads']]
+    assert len(expected) == 25
+
+    assert page_through(LeadLister(store, cache_ttl=0), sort=sort) == expected
+
+
+def test_pages_after_the_cursor_skip_new_leads(store):
+    lister = LeadLister(store, cache_ttl=0)
+    first = lister.list(limit=4, fields='name', sort='name')
+    store.insert('Leads', {'Name': 'Lead 0 (new)'})
+    second = lister.list(limit=4, cursor=first['nextCursor'], fields='name')
+
+    assert [lead['name'] for lead in second['leads']] == ['Lead 12', 'Lead 13', 'Lead 14', 'Lead 15']
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor('["2026-10-01T09:00:00",7]', '-timestamp')
+    assert decode_cursor(cursor) == ('["2026-10-01T09:00:00",7]', '-timestamp')
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!',
+    raw_cursor(['abc']),
+    raw_cursor({'o': 'abc', 's': ''}),
+    raw_cursor({'o': '12', 's': '-timestamp'}),
+    raw_cursor({'o': '["x","7"]', 's': '-timestamp'}),
+    raw_cursor({'o': '[null,7]', 's': 3}),
+])
+def test_tampered_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidQuery):
+        decode_cursor(cursor)
+
+
+def test_cursor_must_match_the_sort(store):
+    lister = LeadLister(store)
+    cursor = lister.list(limit=4, sort='name')['nextCursor']
+    with pytest.raises(InvalidQuery):
+        lister.list(limit=4, cursor=cursor, sort='-timestamp')
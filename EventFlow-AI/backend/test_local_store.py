@@ -0,0 +1,126 @@
+"""Tests for the local SQLite store and its Airtable sync"""
+from concurrent.futures import Future
+
+import pytest
+
+from airtable_sync import AirtableSyncer, ProcessLock
+from local_store import LocalStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / 'eventflow.db'))
+
+
+class FakeWriter:
+    """Completes every write at once, numbering created records"""
+
+    def __init__(self):
+        self.creates = []
+        self.updates = []
+
+    def create(self, table, fields):
+        self.creates.append((table, dict(fields)))
+        return self._done({'id': f"rec{len(self.creates)}", 'fields': fields})
+
+    def update(self, table, record_id, fields):
+        self.updates.append((table, record_id, dict(fields)))
+        return self._done({'id': record_id, 'fields': fields})
+
+    @staticmethod
+    def _done(record):
+        future = Future()
+        future.set_result(record)
+        return future
+
+
+class FakeAirtable:
+    timeout = 1
+
+    def __init__(self, records=None):
+        self.records = records or {}
+        self.params = []
+
+    def iter_records(self, table, **params):
+        self.params.append(params)
+        return iter(self.records.get(table, []))
+
+
+def test_insert_update_and_find(store):
+    local_id = store.insert('Transcripts', {'MessageID': 'SM1', 'Status': 'new'})
+    assert store.update('Transcripts', local_id, {'Status': 'analyzed'})
+    assert store.update_latest_by('Transcripts', 'MessageID', 'SM1', {'Categories': ['Conference', 'Venue']}) == local_id
+    assert store.update_latest_by('Transcripts', 'MessageID', 'SM2', {'Status': 'new'}) is None
+
+    record = store.find_by('Transcripts', 'MessageID', 'SM1')[0]
+    assert record['id'] == f"local-{local_id}"
+    assert record['fields']['Status'] == 'analyzed'
+    assert record['fields']['Categories'] == 'Conference, Venue'
+    with pytest.raises(ValueError):
+        store.insert('Transcripts', {'NoSuchField': 1})
+
+
+def test_insert_unique_keeps_one_row_per_value(store):
+    first = store.insert_unique('Leads', 'PhoneNumber', {'PhoneNumber': '+14155550123'})
+    again = store.insert_unique('Leads', 'PhoneNumber', {'PhoneNumber': '+14155550123'})
+    assert first[1] and not again[1]
+    assert again[0] == first[0]
+    assert store.count('Leads') == 1
+
+
+def test_push_creates_then_patches(store):
+    writer = FakeWriter()
+    syncer = AirtableSyncer(store, FakeAirtable(), writer)
+    local_id = store.insert('Leads', {'Name': 'Ada'})
+
+    assert syncer.push('Leads') == 1
+    assert store.dirty('Leads') == []
+    assert store.get('Leads', local_id)['id'] == 'rec1'
+
+    store.update('Leads', local_id, {'Status': 'booked'})
+    assert syncer.push('Leads') == 1
+    assert writer.updates == [('Leads', 'rec1', {'Name': 'Ada', 'Status': 'booked'})]
+    assert syncer.push('Leads') == 0
+
+
+def test_pull_applies_remote_changes_unless_local_ones_are_pending(store):
+    clean = store.apply_remote('Leads', {'id': 'rec1', 'fields': {'Name': 'Ada', 'Status': 'new'}})
+    dirty = store.apply_remote('Leads', {'id': 'rec2', 'fields': {'Name': 'Grace'}})
+    store.update('Leads', dirty, {'Status': 'booked'})
+
+    pulled = []
+    airtable = FakeAirtable({'Leads': [
+        {'id': 'rec1', 'fields': {'Name': 'Ada Lovelace'}},
+        {'id': 'rec2', 'fields': {'Name': 'Grace Hopper'}},
+        {'id': 'rec3', 'fields': {'Name': 'Edsger', 'Unknown': 'ignored'}}
+    ]})
+    syncer = AirtableSyncer(store, airtable, FakeWriter(), on_pull=lambda *args: pulled.append(args[:2]))
+    assert syncer.pull('Leads') == 2
+
+    # Emptied cells are cleared; unpushed local edits win
+    assert store.get('Leads', clean)['fields'] == {'Name': 'Ada Lovelace'}
+    assert store.get('Leads', dirty)['fields'] == {'Name': 'Grace', 'Status': 'booked'}
+    assert [local_id for _, local_id in pulled][0] == clean
+    # The next pull only asks for records modified since this one
+    syncer.pull('Leads')
+    assert airtable.params[0] == {}
+    assert 'LAST_MODIFIED_TIME()' in airtable.params[1]['filterByFormula']
+
+
+def test_mark_synced_drops_a_copy_pulled_before_the_push_finished(store):
+    local_id = store.insert('Leads', {'Name': 'Ada'})
+    store.apply_remote('Leads', {'id': 'rec9', 'fields': {'Name': 'Ada'}})
+    store.mark_synced('Leads', local_id, 1, 'rec9')
+
+    assert store.count('Leads') == 1
+    assert store.get('Leads', local_id)['id'] == 'rec9'
+
+
+def test_process_lock_is_exclusive(tmp_path):
+    path = str(tmp_path / 'sync.lock')
+    first, second = ProcessLock(path), ProcessLock(path)
+    assert first.acquire(blocking=False)
+    assert not second.acquire(blocking=False)
+    first.release()
+    assert second.acquire(blocking=False)
+    second.release()
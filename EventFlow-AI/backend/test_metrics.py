@@ -0,0 +1,98 @@
+"""Tests for the Prometheus metrics registry in metrics.py"""
+import json
+import os
+
+import pytest
+
+from metrics import OUTBOUND_REQUESTS, MetricsRegistry, outbound_call
+
+# No process has this id, so its file counts as an exited worker
+EXITED_PID = 2 ** 22 + 12345
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_render_uses_the_text_exposition_format(registry):
+    requests = registry.counter('requests_total', 'Requests', ['route'])
+    depth = registry.gauge('queue_depth', 'Queued jobs')
+    latency = registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0))
+    requests.inc(route='/a "b"')
+    requests.inc(2, route='/a "b"')
+    depth.set(4)
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/a \\"b\\""} 3' in lines
+    assert 'queue_depth 4' in lines
+    assert [line for line in lines if line.startswith('latency_seconds')] == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 2',
+        'latency_seconds_bucket{le="+Inf"} 3',
+        'latency_seconds_sum 5.55',
+        'latency_seconds_count 3',
+    ]
+
+
+def test_labels_must_match(registry):
+    counter = registry.counter('requests_total', 'Requests', ['route'])
+    with pytest.raises(ValueError):
+        counter.inc(status='200')
+    with pytest.raises(ValueError):
+        registry.counter('requests_total', 'Again')
+
+
+def test_collectors_run_before_rendering(registry):
+    depth = registry.gauge('queue_depth', 'Queued jobs')
+    registry.add_collector(lambda: depth.set(7))
+    assert 'queue_depth 7' in registry.render().splitlines()
+
+
+def write_worker(directory, pid, metrics):
+    with open(os.path.join(directory, f"{pid}.json"), 'w') as f:
+        json.dump({'pid': pid, 'time': 0, 'metrics': metrics}, f)
+
+
+def test_workers_are_merged_through_the_metrics_dir(registry, tmp_path):
+    requests = registry.counter('requests_total', 'Requests')
+    buffered = registry.gauge('buffered', 'Per-process buffer')
+    depth = registry.gauge('queue_depth', 'Shared queue depth', mode='max')
+    requests.inc()
+    buffered.set(1)
+    depth.set(5)
+    registry.directory = str(tmp_path)
+
+    write_worker(tmp_path, os.getppid(), {'requests_total': [[[], 2]], 'buffered': [[[], 2]],
+                                          'queue_depth': [[[], 6]]})
+    write_worker(tmp_path, EXITED_PID, {'requests_total': [[[], 4]], 'buffered': [[[], 8]]})
+
+    lines = registry.render().splitlines()
+    # Counters from every process, gauges from live ones only
+    assert 'requests_total 7' in lines
+    assert 'buffered 3' in lines
+    assert 'queue_depth 6' in lines
+
+
+def test_flush_writes_this_process(registry, tmp_path):
+    registry.counter('requests_total', 'Requests').inc()
+    registry.directory = str(tmp_path)
+    registry.flush()
+    with open(tmp_path / f"{os.getpid()}.json") as f:
+        assert json.load(f)['metrics']['requests_total'] == [[[], 1]]
+
+
+def test_outbound_call_records_the_status():
+    def count(status):
+        return dict(OUTBOUND_REQUESTS.samples()).get(('test', 'op', status), 0)
+
+    before = count('503'), count('error')
+    with outbound_call('test', 'op') as call:
+        call.status = 503
+    with pytest.raises(KeyError):
+        with outbound_call('test', 'op'):
+            raise KeyError('boom')
+    assert (count('503'), count('error')) == (before[0] + 1, before[1] + 1)
@@ -0,0 +1,67 @@
+"""Tests for phone number normalization and LeadIndex in phones.py"""
+import pytest
+
+from local_store import LocalStore
+from phones import TABLE, LeadIndex, normalize_phone
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('+14155550123', '+14155550123'),
+    ('(415) 555-0123', '+14155550123'),
+    ('1-415-555-0123', '+14155550123'),
+    ('415.555.0123 ext. 12', '+14155550123'),
+    ('0044 20 7946 0958', '+442079460958'),
+    ('+44 (0)20 7946 0958', '+442079460958'),
+])
+def test_normalize_phone(value, expected):
+    assert normalize_phone(value) == expected
+
+
+def test_normalize_phone_uses_the_default_country():
+    assert normalize_phone('020 7946 0958', default_country='44') == '+442079460958'
+
+
+@pytest.mark.parametrize('value', [None, '', 'unknown', '123', '+266696687', '+1234567890123456'])
+def test_normalize_phone_rejects_non_numbers(value):
+    assert normalize_phone(value) is None
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalStore(str(tmp_path / 'eventflow.db'))
+
+
+def test_load_normalizes_stored_numbers(store):
+    typed = store.insert(TABLE, {'PhoneNumber': '(415) 555-0123'})
+    from_airtable = store.insert(TABLE, {'Phone': '415-555-0199'})
+
+    index = LeadIndex(store)
+    assert index.load() == 2
+    assert store.get(TABLE, typed)['fields']['PhoneNumber'] == '+14155550123'
+    assert store.get(TABLE, from_airtable)['fields']['PhoneNumber'] == '+14155550199'
+    assert index.get('+14155550123') == typed
+
+
+def test_miss_finds_leads_by_either_phone_field(store):
+    lead = store.insert(TABLE, {'Phone': '+14155550199'})
+    index = LeadIndex(store)
+
+    assert index.find_or_create('+14155550199', {'Status': 'new'}) == (lead, False)
+    assert index.stats()['misses'] == 1
+
+
+def test_pulled_leads_are_normalized_and_indexed(store):
+    local_id = store.apply_remote(TABLE, {'id': 'rec1', 'fields': {'Phone': '(212) 555-0100'}})
+    index = LeadIndex(store)
+    index.pulled(TABLE, local_id, {'id': 'rec1', 'fields': {'Phone': '(212) 555-0100'}})
+
+    assert store.get(TABLE, local_id)['fields']['PhoneNumber'] == '+12125550100'
+    assert index.find_or_create('+12125550100', {}) == (local_id, False)
+    assert index.stats()['hits'] == 1
+
+
+def test_find_or_create_creates_once(store):
+    index = LeadIndex(store)
+    local_id, created = index.find_or_create('+14155550123', {'Status': 'new'})
+    assert created
+    assert LeadIndex(store).find_or_create('+14155550123', {'Status': 'new'}) == (local_id, False)
@@ -0,0 +1,100 @@
+"""Tests for live call transcripts and the media stream relay in realtime.py"""
+import base64
+import json
+
+import pytest
+
+from classifier import CategoryClassifier
+from realtime import LiveTranscript, MediaStream, StreamingError
+
+
+@pytest.fixture(scope='module')
+def classifier():
+    return CategoryClassifier.from_config()
+
+
+def test_partials_are_replaced_and_finals_kept(classifier):
+    live = LiveTranscript(classifier)
+    assert not live.update('we are planning a', False)
+    assert live.update('we are planning a wedding', False, 0.5)
+    assert not live.update('We are planning a wedding.', True, 0.9)
+    assert live.update('also a birthday', False)
+    assert live.update('Thanks.', True, 0.7)
+
+    assert live.text == 'We are planning a wedding. Thanks.'
+    assert live.categories == ['Wedding Planning']
+    assert live.confidence == pytest.approx(0.8)
+
+
+class FakeSession:
+    def __init__(self, on_transcript):
+        self.on_transcript = on_transcript
+        self.audio = b''
+        self.closed = False
+
+    def send(self, audio):
+        self.audio += audio
+        self.on_transcript('Planning a wedding', True, 0.9)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeTranscriber:
+    sample_rate = 8000
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.sessions = []
+
+    def open(self, on_transcript):
+        if self.fail:
+            raise StreamingError('401 Unauthorized')
+        self.sessions.append(FakeSession(on_transcript))
+        return self.sessions[-1]
+
+
+class FakeWebSocket:
+    def __init__(self, events):
+        self.messages = [json.dumps(event) for event in events]
+
+    def receive(self):
+        return self.messages.pop(0) if self.messages else None
+
+
+def twilio_events(frames):
+    media = [{'event': 'media', 'media': {'payload': base64.b64encode(b'\xff' * 160).decode()}}] * frames
+    start = {'event': 'start', 'start': {'callSid': 'CA1', 'customParameters': {'From': '+14155550123'}}}
+    return [{'event': 'connected'}, start] + media + [{'event': 'stop'}]
+
+
+def relay(transcriber, events, max_duration=60):
+    stream = MediaStream(transcriber, CategoryClassifier.from_config(), max_duration=max_duration)
+    calls = []
+    stream.register(lambda call_sid, parameters: calls.append(('start', call_sid, parameters)),
+                    lambda call_sid, live: calls.append(('update', call_sid, live.categories)),
+                    lambda call_sid, live: calls.append(('end', call_sid, live.text)))
+    stream.run(FakeWebSocket(events))
+    assert stream.active == 0
+    return calls
+
+
+def test_the_stream_is_relayed_and_classified():
+    transcriber = FakeTranscriber()
+    calls = relay(transcriber, twilio_events(3))
+
+    assert calls[0] == ('start', 'CA1', {'From': '+14155550123'})
+    assert calls[1] == ('update', 'CA1', ['Wedding Planning'])
+    assert calls[-1][0] == 'end'
+    session = transcriber.sessions[0]
+    assert (len(session.audio), session.closed) == (480, True)
+
+
+def test_long_calls_stop_streaming_at_the_limit():
+    transcriber = FakeTranscriber()
+    relay(transcriber, twilio_events(10), max_duration=0.05)
+    assert len(transcriber.sessions[0].audio) == 480
+
+
+def test_a_refused_session_ends_without_callbacks():
+    assert relay(FakeTranscriber(fail=True), twilio_events(3)) == []
@@ -0,0 +1,97 @@
+"""Tests for recording normalization in recordings.py"""
+import os
+import struct
+import time
+import wave
+
+import pytest
+
+import recordings
+from recordings import RecordingProcessor, UnsupportedAudio
+
+pytestmark = pytest.mark.skipif(recordings.audioop is None, reason='audioop is not available')
+
+
+def write_wav(path, segments, rate=44100, channels=2):
+    """Write 16-bit PCM from (seconds, amplitude) segments of square wave"""
+    frames = bytearray()
+    for seconds, amplitude in segments:
+        for index in range(int(seconds * rate)):
+            sample = amplitude if index // 20 % 2 else -amplitude
+            frames += struct.pack('<h', sample) * channels
+    with wave.open(str(path), 'wb') as output:
+        output.setnchannels(channels)
+        output.setsampwidth(2)
+        output.setframerate(rate)
+        output.writeframes(bytes(frames))
+    return str(path)
+
+
+def duration(path):
+    with wave.open(path, 'rb') as audio:
+        return audio.getnframes() / audio.getframerate()
+
+
+@pytest.fixture
+def processor(tmp_path):
+    return RecordingProcessor(str(tmp_path / 'spool'), sample_rate=16000, channels=1, max_duration=300,
+                              padding=0.25)
+
+
+def test_silence_is_trimmed_and_audio_mixed_down(processor, tmp_path):
+    source = write_wav(tmp_path / 'call.wav', [(1, 0), (1, 8000), (1, 0)])
+    output = processor.normalize(source)
+
+    with wave.open(output, 'rb') as audio:
+        assert (audio.getnchannels(), audio.getframerate(), audio.getsampwidth()) == (1, 16000, 2)
+    assert duration(output) == pytest.approx(1.5, abs=0.06)
+
+
+def test_low_sample_rates_are_kept(processor, tmp_path):
+    source = write_wav(tmp_path / 'call.wav', [(0.5, 8000)], rate=8000, channels=1)
+    with wave.open(processor.normalize(source), 'rb') as audio:
+        assert audio.getframerate() == 8000
+
+
+def test_long_recordings_are_cut(tmp_path):
+    processor = RecordingProcessor(str(tmp_path / 'spool'), max_duration=1)
+    source = write_wav(tmp_path / 'call.wav', [(3, 8000)], rate=8000, channels=1)
+    assert duration(processor.normalize(source)) == pytest.approx(1)
+
+
+def test_silent_recordings_produce_nothing(processor, tmp_path):
+    source = write_wav(tmp_path / 'call.wav', [(1, 100)])
+    assert processor.normalize(source) is None
+    assert os.listdir(processor.spool_dir) == []
+
+
+def test_unsupported_recordings_are_sent_as_downloaded(processor, tmp_path, monkeypatch):
+    downloaded = tmp_path / 'spool' / 'recording-1.download'
+    downloaded.write_bytes(b'ID3 not a wav file')
+    monkeypatch.setattr(processor, 'download', lambda url: (str(downloaded), 'digest'))
+
+    with pytest.raises(UnsupportedAudio):
+        processor.normalize(str(downloaded))
+    assert processor.prepare('https://api.twilio.example/RE1') == (str(downloaded), 'digest')
+
+
+def test_prepare_replaces_the_download(processor, tmp_path, monkeypatch):
+    downloaded = write_wav(tmp_path / 'spool' / 'recording-1.download', [(0.5, 8000)])
+    monkeypatch.setattr(processor, 'download', lambda url: (downloaded, 'digest'))
+
+    path, digest = processor.prepare('https://api.twilio.example/RE1')
+    assert path.endswith('.wav')
+    assert not os.path.exists(downloaded)
+
+
+def test_stale_spool_files_are_removed(tmp_path):
+    spool = tmp_path / 'spool'
+    spool.mkdir()
+    stale, fresh = spool / 'recording-old.wav', spool / 'recording-new.wav'
+    stale.write_bytes(b'')
+    fresh.write_bytes(b'')
+    old = time.time() - recordings.STALE_SPOOL_SECONDS - 1
+    os.utime(stale, (old, old))
+
+    RecordingProcessor(str(spool))
+    assert os.listdir(spool) == ['recording-new.wav']
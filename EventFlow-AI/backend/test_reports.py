@@ -0,0 +1,66 @@
+"""Tests for streamed report exports in reports.py"""
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import reports
+from leads import InvalidQuery
+from local_store import LocalStore
+from reports import ReportExporter, ReportQuery
+
+
+@pytest.fixture
+def exporter(tmp_path):
+    store = LocalStore(str(tmp_path / 'eventflow.db'))
+    for day, status, event_type in [
+        ('2027-01-09T18:00:00', 'new', 'Wedding'),
+        ('2027-01-10T09:30:00', 'contacted', 'Corporate'),
+        ('2027-01-10T23:59:00', 'new', 'Birthday'),
+        ('2027-01-11T08:00:00', 'new', 'Wedding'),
+    ]:
+        store.insert('Leads', {'Name': f"Lead {day}", 'Timestamp': day, 'Status': status, 'EventType': event_type})
+    return ReportExporter(store)
+
+
+def export_text(exporter, **options):
+    query = ReportQuery(**options)
+    data = b''.join(exporter.export(query))
+    return gzip.decompress(data).decode() if query.compress else data.decode()
+
+
+def test_invalid_parameters_are_rejected():
+    for options in ({'report': 'invoices'}, {'format': 'xlsx'}, {'since': 'last week'}):
+        with pytest.raises(InvalidQuery):
+            ReportQuery(**options)
+
+
+def test_a_bare_until_date_includes_that_day(exporter):
+    text = export_text(exporter, since='2027-01-10', until='2027-01-10')
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert [row['Timestamp'] for row in rows] == ['2027-01-10T09:30:00', '2027-01-10T23:59:00']
+    assert list(rows[0])[:2] == ['id', 'Name']
+
+
+def test_status_and_category_filters(exporter):
+    query = ReportQuery.from_args(MultiDict([('status', 'NEW'), ('category', 'wedding,birthday'),
+                                             ('category', 'Gala'), ('format', 'ndjson')]))
+    assert (query.statuses, query.categories) == ({'new'}, {'wedding', 'birthday', 'gala'})
+
+    rows = [json.loads(line) for line in b''.join(exporter.export(query)).decode().splitlines()]
+    assert [row['EventType'] for row in rows] == ['Wedding', 'Birthday', 'Wedding']
+
+
+def test_gzip_exports_stream_in_chunks(exporter, monkeypatch):
+    monkeypatch.setattr(reports, 'CHUNK_SIZE', 1)
+    query = ReportQuery(format='ndjson', compress=True)
+    chunks = list(exporter.export(query))
+
+    # One chunk per row plus the end of the gzip stream
+    assert len(chunks) == 5
+    assert len(gzip.decompress(b''.join(chunks)).decode().splitlines()) == 4
+    assert query.content_type == 'application/gzip'
+    assert query.filename.endswith('.ndjson.gz')
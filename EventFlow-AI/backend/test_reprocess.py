@@ -0,0 +1,114 @@
+"""Tests for re-running analysis over the Transcripts table in reprocess.py"""
+from concurrent.futures import Future
+
+import pytest
+
+from airtable_client import AirtableError
+from classifier import CategoryClassifier
+from extraction import LeadAttributeExtractor
+from local_store import LocalStore
+from reprocess import TABLE, Checkpoint, analyze_fields, reprocess
+
+LOCAL_SORT = {'sort[0][field]': 'Timestamp', 'sort[0][direction]': 'asc'}
+
+
+def done(value=None, error=None):
+    future = Future()
+    if error:
+        future.set_exception(error)
+    else:
+        future.set_result(value)
+    return future
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LocalStore(str(tmp_path / 'eventflow.db'))
+    for index in range(25):
+        store.insert(TABLE, {
+            'MessageID': f"SM{index}",
+            'Transcription': 'Planning a wedding for 80 guests' if index % 2 else 'Thanks, talk soon',
+            'Timestamp': f"2026-01-01T00:00:{index:02d}Z",
+            'Status': 'new'
+        })
+    return store
+
+
+def writes_to(store, fail=None):
+    def write(record, changes):
+        if fail and record['fields']['MessageID'] == fail:
+            return done(error=AirtableError('422 INVALID_VALUE'))
+        return done(store.update(TABLE, record['localId'], changes))
+    return write
+
+
+def test_analyze_fields_only_fills_empty_details():
+    classifier, extractor = CategoryClassifier.from_config(), LeadAttributeExtractor()
+    fields = {'Transcription': 'A wedding for 80 guests', 'Status': 'new', 'GuestCount': 50,
+              'Categories': 'Corporate Event'}
+
+    changes = analyze_fields(fields, classifier, extractor)
+    assert changes == {'Categories': 'Wedding Planning', 'Status': 'analyzed'}
+    assert analyze_fields(fields, classifier, extractor, overwrite=True)['GuestCount'] == 80
+    assert analyze_fields(dict(fields, **changes, GuestCount=80), classifier, extractor) == {}
+
+
+def test_reprocess_writes_only_changed_rows(store, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'local')
+    result = reprocess(store, writes_to(store), checkpoint, workers=1, page_size=10, **LOCAL_SORT)
+
+    assert (result['processed'], result['updated'], result['failed'], result['complete']) == (25, 12, 0, True)
+    assert store.find_by(TABLE, 'MessageID', 'SM1')[0]['fields']['GuestCount'] == 80
+    assert checkpoint.load() is None
+
+    again = reprocess(store, writes_to(store), checkpoint, workers=1, page_size=10, **LOCAL_SORT)
+    assert (again['processed'], again['updated']) == (25, 0)
+
+
+def test_an_interrupted_run_resumes_from_the_checkpoint(store, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'local')
+    first = reprocess(store, writes_to(store), checkpoint, workers=1, page_size=10, limit=10, **LOCAL_SORT)
+    assert (first['processed'], first['complete']) == (10, False)
+
+    rest = reprocess(store, writes_to(store), checkpoint, workers=1, page_size=10, **LOCAL_SORT)
+    assert (rest['processed'], rest['updated'], rest['complete']) == (25, 12, True)
+
+
+def test_failed_writes_hold_the_checkpoint(store, tmp_path):
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'local')
+    result = reprocess(store, writes_to(store, fail='SM13'), checkpoint, workers=1, page_size=10, **LOCAL_SORT)
+
+    assert (result['processed'], result['failed'], result['complete']) == (10, 1, False)
+    assert checkpoint.load()['processed'] == 10
+
+
+def test_checkpoints_from_another_source_are_ignored(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    Checkpoint(path, 'airtable:appA').save({'offset': 'itr1', 'processed': 100, 'updated': 3})
+    assert Checkpoint(path, 'airtable:appA').load()['offset'] == 'itr1'
+    assert Checkpoint(path, 'airtable:appB').load() is None
+
+
+class ExpiringSource:
+    """Pages one record at a time and rejects the first saved cursor"""
+
+    def __init__(self, records):
+        self.records = records
+        self.expired = {'itrSaved'}
+
+    def list_page(self, table, fields=None, page_size=100, offset=None, **params):
+        if offset in self.expired:
+            raise AirtableError('422 LIST_RECORDS_ITERATOR_NOT_AVAILABLE')
+        position = int(offset[3:]) if offset else 0
+        next_offset = f"itr{position + 1}" if position + 1 < len(self.records) else None
+        return {'records': self.records[position:position + 1], 'offset': next_offset}
+
+
+def test_an_expired_cursor_starts_over(tmp_path):
+    records = [{'id': f"rec{index}", 'fields': {'Transcription': 'Thanks', 'Status': 'analyzed'}}
+               for index in range(3)]
+    checkpoint = Checkpoint(str(tmp_path / 'checkpoint.json'), 'airtable:appA')
+    checkpoint.save({'offset': 'itrSaved', 'processed': 40, 'updated': 2})
+
+    result = reprocess(ExpiringSource(records), lambda record, changes: done(), checkpoint, workers=1)
+    assert (result['processed'], result['updated'], result['complete']) == (3, 2, True)
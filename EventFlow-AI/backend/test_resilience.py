@@ -0,0 +1,118 @@
+"""Tests for the circuit breaker and guarded_call in resilience.py"""
+import time
+
+import pytest
+
+import resilience
+from resilience import (STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, CircuitOpen,
+                        guarded_call)
+
+
+class HttpError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.status = status
+
+
+def open_breaker(circuit):
+    for _ in range(circuit.min_calls):
+        circuit.allow()
+        circuit.record(False)
+
+
+def test_breaker_stays_closed_below_min_calls():
+    circuit = CircuitBreaker('test', min_calls=4, failure_ratio=0.5)
+    for _ in range(3):
+        circuit.allow()
+        circuit.record(False)
+    assert circuit.state == STATE_CLOSED
+
+
+def test_breaker_opens_at_failure_ratio():
+    circuit = CircuitBreaker('test', window=4, min_calls=4, failure_ratio=0.5, open_seconds=30)
+    for success in (True, True, False, False):
+        circuit.allow()
+        circuit.record(success)
+    assert circuit.state == STATE_OPEN
+    with pytest.raises(CircuitOpen) as refused:
+        circuit.allow()
+    assert refused.value.dependency == 'test'
+    assert 0 < refused.value.retry_after <= 30
+
+
+def test_slow_calls_count_as_failures():
+    circuit = CircuitBreaker('test', min_calls=2, slow_call_seconds=1)
+    for _ in range(2):
+        circuit.allow()
+        circuit.record(True, seconds=5)
+    assert circuit.state == STATE_OPEN
+
+
+def test_half_open_allows_one_trial_and_closes_on_success():
+    circuit = CircuitBreaker('test', min_calls=2, open_seconds=0.05)
+    open_breaker(circuit)
+    time.sleep(0.06)
+    assert circuit.state == STATE_HALF_OPEN
+
+    circuit.allow()
+    with pytest.raises(CircuitOpen):
+        circuit.allow()
+    circuit.record(True)
+    assert circuit.state == STATE_CLOSED
+    circuit.allow()
+
+
+def test_half_open_reopens_on_failed_trial():
+    circuit = CircuitBreaker('test', min_calls=2, open_seconds=0.05)
+    open_breaker(circuit)
+    time.sleep(0.06)
+
+    circuit.allow()
+    circuit.record(False)
+    assert circuit.state == STATE_OPEN
+    assert circuit.opened == 2
+
+
+def test_cancelled_trial_lets_another_through():
+    circuit = CircuitBreaker('test', min_calls=2, open_seconds=0.05)
+    open_breaker(circuit)
+    time.sleep(0.06)
+
+    circuit.allow()
+    circuit.cancel()
+    circuit.allow()
+
+
+def test_guarded_call_counts_server_errors(monkeypatch):
+    monkeypatch.setitem(resilience._breakers, 'test', CircuitBreaker('test', min_calls=2))
+    for _ in range(2):
+        with pytest.raises(HttpError):
+            with guarded_call('test', 'GET'):
+                raise HttpError(503)
+    with pytest.raises(CircuitOpen):
+        with guarded_call('test', 'GET'):
+            pass
+
+
+def test_guarded_call_ignores_client_errors(monkeypatch):
+    monkeypatch.setitem(resilience._breakers, 'test', CircuitBreaker('test', min_calls=2))
+    for _ in range(4):
+        with pytest.raises(HttpError):
+            with guarded_call('test', 'GET'):
+                raise HttpError(404)
+    assert resilience.breaker('test').state == STATE_CLOSED
+
+
+def test_guarded_call_can_leave_throttling_uncounted(monkeypatch):
+    monkeypatch.setitem(resilience._breakers, 'test', CircuitBreaker('test', min_calls=2))
+    for _ in range(4):
+        with pytest.raises(HttpError):
+            with guarded_call('test', 'POST', count_throttled=False):
+                raise HttpError(429)
+    assert resilience.breaker('test').state == STATE_CLOSED
+
+    for _ in range(2):
+        with pytest.raises(HttpError):
+            with guarded_call('test', 'POST'):
+                raise HttpError(429)
+    assert resilience.breaker('test').state == STATE_OPEN
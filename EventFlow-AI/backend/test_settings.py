@@ -0,0 +1,49 @@
+"""Tests for reading and validating settings in settings.py"""
+import dataclasses
+import os
+
+import pytest
+
+from settings import ConfigError, Settings
+
+
+def test_paths_follow_the_data_dir(tmp_path):
+    settings = Settings.from_env({'DATA_DIR': str(tmp_path), 'JOB_QUEUE_PATH': '/var/eventflow/jobs.db'})
+    assert settings.local_store_path == os.path.join(str(tmp_path), 'eventflow.db')
+    assert settings.event_log_dir == os.path.join(str(tmp_path), 'events')
+    assert settings.job_queue_path == '/var/eventflow/jobs.db'
+
+
+def test_values_are_parsed():
+    settings = Settings.from_env({
+        'PORT': '8080', 'EVENT_LOG_COMPRESS': 'yes', 'AUDIO_NORMALIZE': 'off', 'DEFAULT_COUNTRY_CODE': '+44',
+        'TWILIO_PHONE_NUMBER': '+15550000001', 'PUBLIC_BASE_URL': 'https://eventflow.example/', 'JOB_WORKERS': ''
+    })
+    assert (settings.port, settings.event_log_compress, settings.audio_normalize) == (8080, True, False)
+    assert settings.default_country_code == '44'
+    assert settings.twilio_messaging_numbers == ('+15550000001',)
+    assert settings.public_base_url == 'https://eventflow.example'
+    assert settings.job_workers == 4
+
+
+def test_messaging_numbers_override_the_phone_number():
+    settings = Settings.from_env({'TWILIO_PHONE_NUMBER': '+15550000001',
+                                  'TWILIO_MESSAGING_NUMBERS': '+15550000002, +15550000003,'})
+    assert settings.twilio_messaging_numbers == ('+15550000002', '+15550000003')
+
+
+@pytest.mark.parametrize('name, value', [
+    ('PORT', 'eighty'),
+    ('JOB_WORKERS', '0'),
+    ('CIRCUIT_FAILURE_RATIO', '1.5'),
+    ('IDEMPOTENCY_BACKEND', 'redis'),
+    ('DEFAULT_COUNTRY_CODE', 'UK'),
+])
+def test_invalid_values_are_rejected(name, value):
+    with pytest.raises(ConfigError, match=name):
+        Settings.from_env({name: value})
+
+
+def test_settings_are_frozen():
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        Settings.from_env({}).port = 1
@@ -0,0 +1,57 @@
+"""Tests for the dashboard counters in stats.py"""
+from stats import StatsStore, split_categories
+
+
+class FakeTables:
+    """iter_records over fixed tables, optionally recording a write mid-scan"""
+
+    def __init__(self, tables, during_scan=None):
+        self.tables = tables
+        self.during_scan = during_scan
+
+    def iter_records(self, table, fields=None):
+        for record in self.tables[table]:
+            if self.during_scan is not None:
+                self.during_scan()
+                self.during_scan = None
+            yield record
+
+
+def test_counters_follow_the_ingest_paths():
+    stats = StatsStore()
+    stats.record_lead('new')
+    stats.record_lead('booked')
+    stats.record_lead('planning')
+    stats.record_transcript('sms')
+    stats.record_transcript(None)
+    stats.record_categories(['Wedding Planning', 'Catering Services'])
+
+    snapshot = stats.snapshot()
+    assert (snapshot['totalLeads'], snapshot['newLeads'], snapshot['convertedLeads'],
+            snapshot['activeEvents']) == (3, 1, 1, 1)
+    assert snapshot['transcriptsBySource'] == {'sms': 1, 'unknown': 1}
+    assert snapshot['categories'] == {'Wedding Planning': 1, 'Catering Services': 1}
+
+
+def test_reconcile_recounts_and_keeps_writes_made_during_the_scan():
+    stats = StatsStore()
+    stats.record_lead('new')
+    tables = {
+        'Leads': [{'fields': {'Status': 'booked'}}, {'fields': {}}],
+        'Transcripts': [{'fields': {'Source': 'voice', 'Categories': 'Conference, Venue Booking'}},
+                        {'fields': {'Categories': ['Conference']}}]
+    }
+    stats.reconcile(FakeTables(tables, during_scan=lambda: stats.record_lead('new')))
+
+    snapshot = stats.snapshot()
+    assert (snapshot['totalLeads'], snapshot['newLeads'], snapshot['convertedLeads']) == (3, 2, 1)
+    assert snapshot['totalTranscripts'] == 2
+    assert snapshot['transcriptsBySource'] == {'voice': 1, 'unknown': 1}
+    assert snapshot['categories'] == {'Conference': 2, 'Venue Booking': 1}
+    assert snapshot['lastReconciled'] is not None
+
+
+def test_split_categories():
+    assert split_categories('Conference, Venue Booking,') == ['Conference', 'Venue Booking']
+    assert split_categories(['Conference']) == ['Conference']
+    assert split_categories(None) == []
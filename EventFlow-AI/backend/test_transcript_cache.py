@@ -0,0 +1,53 @@
+"""Tests for the content-addressed transcript cache in transcript_cache.py"""
+import itertools
+import threading
+
+import pytest
+
+import transcript_cache
+from transcript_cache import TranscriptCache
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    ticks = itertools.count(1_800_000_000)
+    monkeypatch.setattr(transcript_cache.time, 'time', lambda: next(ticks))
+
+
+def test_keys_depend_on_audio_and_settings():
+    key = TranscriptCache.key('abc', {'normalize': True}, {'language_code': 'en_us'})
+    assert key == TranscriptCache.key('abc', {'normalize': True}, {'language_code': 'en_us'})
+    assert key != TranscriptCache.key('abd', {'normalize': True}, {'language_code': 'en_us'})
+    assert key != TranscriptCache.key('abc', {'normalize': False}, {'language_code': 'en_us'})
+
+
+def test_round_trip_and_counters(tmp_path):
+    cache = TranscriptCache(str(tmp_path / 'transcripts.db'))
+    assert cache.get('k') is None
+    cache.put('k', 'Hello there', {'confidence': 0.9})
+
+    assert cache.get('k') == {'text': 'Hello there', 'confidence': 0.9}
+    stats = cache.stats()
+    assert (stats['size'], stats['bytes'], stats['hits'], stats['misses'], stats['hitRate']) == (1, 11, 1, 1, 0.5)
+
+
+def test_least_recently_used_are_evicted(tmp_path):
+    cache = TranscriptCache(str(tmp_path / 'transcripts.db'), max_bytes=20)
+    cache.put('a', 'x' * 8)
+    cache.put('b', 'x' * 8)
+    cache.get('a')
+    cache.put('c', 'x' * 8)
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+
+def test_entries_are_shared_across_threads_and_processes(tmp_path):
+    path = str(tmp_path / 'transcripts.db')
+    cache = TranscriptCache(path)
+    thread = threading.Thread(target=cache.put, args=('k', 'Hello'))
+    thread.start()
+    thread.join()
+
+    assert TranscriptCache(path).get('k')['text'] == 'Hello'
@@ -0,0 +1,123 @@
+"""Tests for AssemblyAI transcript tracking in transcription.py"""
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import resilience
+from jobs import JobQueue
+from resilience import CircuitBreaker
+from transcription import (STATUS_COMPLETED, STATUS_COMPLETING, STATUS_FAILED, STATUS_PENDING,
+                           TranscriptionJobs)
+
+
+class FakeTranscriber:
+    def __init__(self):
+        self.statuses = {}
+        self.submitted = []
+
+    def upload(self, path):
+        return f"https://upload.example/{path}"
+
+    def submit(self, audio_url, webhook_url=None):
+        self.submitted.append((audio_url, webhook_url))
+        return f"tr{len(self.submitted)}"
+
+    def get(self, transcript_id):
+        status = self.statuses.get(transcript_id, 'processing')
+        if isinstance(status, Exception):
+            raise status
+        return {'status': status, 'text': 'Hello', 'confidence': 0.9, 'duration': 12, 'error': None}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'jobs.db'))
+    yield queue
+    queue.close()
+
+
+@pytest.fixture
+def transcriber():
+    return FakeTranscriber()
+
+
+@pytest.fixture
+def tracker(tmp_path, transcriber, queue, monkeypatch):
+    monkeypatch.setitem(resilience._breakers, 'assemblyai', CircuitBreaker('assemblyai', min_calls=2))
+    tracker = TranscriptionJobs(str(tmp_path / 'transcriptions.db'), transcriber, queue,
+                                poll_interval=0, timeout=60)
+    tracker._executor = ThreadPoolExecutor(2)
+    yield tracker
+    tracker.stop()
+
+
+def completion_jobs(queue):
+    jobs = []
+    while True:
+        job = queue.claim(timeout=0)
+        if job is None:
+            return jobs
+        jobs.append(job['payload']['transcript_id'])
+
+
+def test_a_finished_transcript_is_claimed_once(tracker, transcriber, queue):
+    transcript_id = tracker.submit('https://media.example/a.wav', 'CA1', '+14155550123')
+    transcriber.statuses[transcript_id] = 'completed'
+
+    assert tracker.handle_callback(transcript_id, 'completed')
+    assert tracker.handle_callback(transcript_id, 'completed')
+    assert tracker.poll_once() == 0
+    assert completion_jobs(queue) == [transcript_id]
+    assert tracker.get(transcript_id)['jobStatus'] == STATUS_COMPLETING
+
+    tracker.finish(transcript_id)
+    assert tracker.counts()[STATUS_COMPLETED] == 1
+
+
+def test_unknown_callbacks_are_rejected(tracker):
+    assert not tracker.handle_callback('trUnknown', 'completed')
+
+
+def test_polling_claims_finished_transcripts(tracker, transcriber, queue):
+    done = tracker.submit('https://media.example/a.wav', 'CA1', None)
+    waiting = tracker.submit('https://media.example/b.wav', 'CA2', None, upload_path='b.wav')
+    transcriber.statuses[done] = 'error'
+
+    assert tracker.poll_once() == 2
+    assert completion_jobs(queue) == [done]
+    assert tracker.get(waiting)['jobStatus'] == STATUS_PENDING
+    assert tracker.get(waiting)['polls'] == 1
+    assert transcriber.submitted[1][0] == 'https://upload.example/b.wav'
+
+
+def test_polling_gives_up_after_the_timeout(tracker, transcriber):
+    transcript_id = tracker.submit('https://media.example/a.wav', 'CA1', None)
+    tracker.timeout = -1
+    tracker.poll_once()
+
+    job = tracker.get(transcript_id)
+    assert (job['jobStatus'], job['jobError']) == (STATUS_FAILED, 'timed out')
+
+
+def test_polling_waits_while_the_breaker_is_open(tracker, transcriber):
+    transcript_id = tracker.submit('https://media.example/a.wav', 'CA1', None)
+    circuit = resilience.breaker('assemblyai')
+    for _ in range(circuit.min_calls):
+        circuit.allow()
+        circuit.record(False)
+
+    tracker.timeout = -1
+    assert tracker.poll_once() == 0
+    assert tracker.get(transcript_id)['jobStatus'] == STATUS_PENDING
+
+
+def test_callbacks_delay_the_first_poll(tmp_path, transcriber, queue):
+    tracker = TranscriptionJobs(str(tmp_path / 'transcriptions.db'), transcriber, queue,
+                                webhook_url='https://eventflow.example/webhooks/assemblyai',
+                                poll_interval=0, callback_grace=60)
+    tracker._executor = ThreadPoolExecutor(1)
+    tracker.submit('https://media.example/a.wav', 'CA1', None)
+
+    assert transcriber.submitted[0][1] == 'https://eventflow.example/webhooks/assemblyai'
+    assert tracker.poll_once() == 0
+    tracker.stop()
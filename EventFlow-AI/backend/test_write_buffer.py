@@ -0,0 +1,105 @@
+"""Tests for write-behind batching in write_buffer.py"""
+import threading
+
+import pytest
+
+from write_buffer import BatchWriter
+
+
+class FakeResponse:
+    def __init__(self, records, status_code=200):
+        self.status_code = status_code
+        self.text = 'error'
+        self._records = records
+
+    def json(self):
+        return {'records': self._records}
+
+
+class FakeClient:
+    """Records each batch request and echoes the records back"""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def create_records(self, table, fields_list):
+        with self._lock:
+            self.batches.append(('create', table, fields_list))
+            start = sum(len(batch[2]) for batch in self.batches) - len(fields_list)
+        return FakeResponse([{'id': f"rec{start + index}", 'fields': fields}
+                             for index, fields in enumerate(fields_list)], self.status_code)
+
+    def update_records(self, table, updates):
+        with self._lock:
+            self.batches.append(('update', table, updates))
+        return FakeResponse(updates, self.status_code)
+
+
+def test_creates_are_sent_ten_at_a_time():
+    client = FakeClient()
+    writer = BatchWriter(client, max_delay=60)
+    futures = [writer.create('Transcripts', {'n': index}) for index in range(25)]
+    writer.close()
+
+    assert [len(batch[2]) for batch in client.batches] == [10, 10, 5]
+    assert [future.result(1)['fields']['n'] for future in futures] == list(range(25))
+
+
+def test_updates_to_one_record_are_merged():
+    client = FakeClient()
+    writer = BatchWriter(client, max_delay=60)
+    first = writer.update('Leads', 'rec1', {'Status': 'new'})
+    second = writer.update('Leads', 'rec1', {'Categories': 'Wedding Planning'})
+    writer.update('Leads', 'rec2', {'Status': 'new'})
+    writer.close()
+
+    assert len(client.batches) == 1
+    op, table, updates = client.batches[0]
+    assert [update['id'] for update in updates] == ['rec1', 'rec2']
+    assert updates[0]['fields'] == {'Status': 'new', 'Categories': 'Wedding Planning'}
+    assert first.result(1) == second.result(1)
+
+
+def test_concurrent_updates_never_repeat_a_record_in_a_batch():
+    client = FakeClient()
+    writer = BatchWriter(client, max_delay=0.01)
+    barrier = threading.Barrier(8)
+
+    def patch(worker):
+        barrier.wait()
+        for index in range(50):
+            writer.update('Leads', f"rec{index % 3}", {f"f{worker}": index})
+
+    threads = [threading.Thread(target=patch, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    for _, _, updates in client.batches:
+        ids = [update['id'] for update in updates]
+        assert len(ids) == len(set(ids))
+
+
+def test_failed_batches_fail_every_caller():
+    writer = BatchWriter(FakeClient(status_code=422), max_delay=60)
+    futures = [writer.create('Transcripts', {'n': index}) for index in range(3)]
+    writer.close()
+
+    for future in futures:
+        with pytest.raises(Exception):
+            future.result(1)
+
+
+def test_writes_after_close_are_rejected():
+    writer = BatchWriter(FakeClient())
+    writer.update('Leads', 'rec1', {'Status': 'new'})
+    writer.close()
+
+    with pytest.raises(RuntimeError):
+        writer.update('Leads', 'rec1', {'Status': 'contacted'})
+    with pytest.raises(RuntimeError):
+        writer.create('Leads', {'Status': 'new'})
@@ -0,0 +1,98 @@
+"""Content-addressed transcript cache for EventFlow-AI
+
+Transcripts are stored under a hash of the recording's bytes plus the
+settings that shape the transcript, so the same audio is only sent to
+AssemblyAI once, whatever URL it arrived from and however many times it is
+reprocessed. Entries live in SQLite, shared by every worker process, and the
+least recently used are evicted once the texts exceed ``max_bytes``.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+
+class TranscriptCache:
+    """Disk-backed LRU of transcripts keyed by audio content"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transcripts (
+            key TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            metadata TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_used REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transcripts_last_used ON transcripts (last_used);
+    """
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def key(audio_digest: str, *configs: Dict[str, Any]) -> str:
+        """Combine an audio hash with the settings that affect the transcript"""
+        fingerprint = json.dumps(configs, sort_keys=True)
+        return hashlib.sha256(f"{audio_digest}:{fingerprint}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return ``{'text': ..., **metadata}`` for a cached transcript"""
+        conn = self._conn()
+        row = conn.execute("SELECT text, metadata FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        conn.execute("UPDATE transcripts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return dict(json.loads(row[1]), text=row[0])
+
+    def put(self, key: str, text: str, metadata: Optional[Dict[str, Any]] = None):
+        """Store a transcript, evicting the least recently used over ``max_bytes``"""
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO transcripts (key, text, metadata, size, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (key, text, json.dumps(metadata or {}), len(text.encode()), now, now)
+        )
+        conn.execute(
+            "DELETE FROM transcripts WHERE key IN ("
+            "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS total FROM transcripts) "
+            "WHERE total > ?)",
+            (self.max_bytes,)
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return size and hit/miss counters"""
+        entries, size = self._conn().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM transcripts").fetchone()
+        total = self.hits + self.misses
+        return {
+            'size': entries,
+            'bytes': size,
+            'maxBytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': round(self.hits / total, 4) if total else 0.0
+        }
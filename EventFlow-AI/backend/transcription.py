@@ -0,0 +1,375 @@
+"""AssemblyAI transcription jobs for EventFlow-AI
+
+Recordings are submitted to AssemblyAI and tracked in a small SQLite table
+instead of holding a thread open while AssemblyAI works. When a
+``webhook_url`` is configured AssemblyAI calls back once the transcript is
+ready; a poller checks anything still pending (a missed callback, or no
+public URL at all) with a bounded number of threads and gives up after the
+configured timeout.
+
+A finished transcript is claimed exactly once, whichever of the callback and
+the poller sees it first, and handed to the durable job queue as a
+``complete_transcription`` job.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+from urllib.parse import urlencode
+
+from config_loader import load_config
+from jobs import JobQueue
+from resilience import breaker, guarded_call
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_COMPLETING = 'completing'
+STATUS_COMPLETED = 'completed'
+STATUS_FAILED = 'failed'
+
+# Transcript statuses that will not change again
+FINAL_STATUSES = {'completed', 'error'}
+
+
+class AssemblyAITranscriber:
+    """Submits recordings to AssemblyAI and reads transcript status
+
+    Each call is a single HTTP request; nothing here waits for AssemblyAI to
+    finish. ``base_url`` points the client at a local stand-in for testing.
+    Calls fail fast with ``resilience.CircuitOpen`` while AssemblyAI is
+    failing.
+    """
+
+    # Transcription options sent with every request
+    CONFIG = {'speaker_labels': True, 'language_code': 'en_us'}
+
+    def __init__(self, api_key: str, base_url: Optional[str] = None, timeout: float = 30):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    import assemblyai as aai
+                    settings = aai.types.Settings(api_key=self.api_key, http_timeout=self.timeout)
+                    if self.base_url:
+                        settings.base_url = self.base_url
+                    self._client = aai.Client(settings=settings)
+        return self._client
+
+    def upload(self, path: str) -> str:
+        """Upload a local audio file, streaming it from disk
+
+        Returns:
+            The URL to submit for transcription
+        """
+        from assemblyai import api
+        with open(path, 'rb') as audio, guarded_call('assemblyai', 'POST upload', count_slow=False) as call:
+            upload_url = api.upload_file(self.client.http_client, audio)
+            call.status = 200
+        return upload_url
+
+    def submit(self, audio_url: str, webhook_url: Optional[str] = None) -> str:
+        """Queue a recording for transcription
+
+        Returns:
+            The AssemblyAI transcript id
+        """
+        from assemblyai import api, types
+        config = types.TranscriptionConfig(**self.CONFIG)
+        if webhook_url:
+            config.set_webhook(webhook_url)
+        request = types.TranscriptRequest(audio_url=audio_url, **config.raw.dict(exclude_none=True))
+        with guarded_call('assemblyai', 'POST transcript') as call:
+            response = api.create_transcript(self.client.http_client, request)
+            call.status = response.status.value
+        return response.id
+
+    def get(self, transcript_id: str) -> Dict[str, Any]:
+        """Return a transcript's current ``status``, ``text`` and ``error``"""
+        from assemblyai import api
+        with guarded_call('assemblyai', 'GET transcript') as call:
+            response = api.get_transcript(self.client.http_client, transcript_id)
+            call.status = response.status.value
+        return {
+            'status': response.status.value,
+            'text': response.text,
+            'confidence': response.confidence,
+            'duration': response.audio_duration,
+            'error': response.error
+        }
+
+
+class TranscriptionJobs:
+    """Pending AssemblyAI transcripts, completed by callback or polling"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transcriptions (
+            transcript_id TEXT PRIMARY KEY,
+            call_sid TEXT,
+            from_number TEXT,
+            audio_url TEXT,
+            cache_key TEXT,
+            status TEXT NOT NULL,
+            polls INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            next_poll REAL NOT NULL,
+            submitted_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_transcriptions_status ON transcriptions (status, next_poll);
+    """
+
+    def __init__(self, path: str, transcriber: AssemblyAITranscriber, job_queue: JobQueue,
+                 webhook_url: Optional[str] = None, poll_interval: float = 5, poll_concurrency: int = 4,
+                 callback_grace: float = 60, timeout: float = 300):
+        self.path = path
+        self.transcriber = transcriber
+        self.job_queue = job_queue
+        self.webhook_url = webhook_url
+        self.poll_interval = poll_interval
+        self.poll_concurrency = poll_concurrency
+        self.callback_grace = callback_grace
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(transcriptions)")}
+        if 'cache_key' not in columns:
+            self._conn.execute("ALTER TABLE transcriptions ADD COLUMN cache_key TEXT")
+
+    @classmethod
+    def from_config(cls, path: str, transcriber: AssemblyAITranscriber, job_queue: JobQueue,
+                    public_base_url: str = '', webhook_secret: Optional[str] = None,
+                    **kwargs) -> 'TranscriptionJobs':
+        """Build from the ``processing`` section of config/assemblyai_config.json
+
+        Callbacks are only requested when ``public_base_url`` is set;
+        otherwise every transcript is polled. The callback URL carries
+        ``webhook_secret`` as its ``token`` parameter (this SDK version does
+        not send AssemblyAI's webhook auth header).
+        """
+        processing = load_config('assemblyai_config.json').get('assemblyai', {}).get('processing', {})
+        webhook_path = processing.get('webhook_url')
+        webhook_url = None
+        if public_base_url and webhook_path:
+            webhook_url = f"{public_base_url}{webhook_path}"
+            if webhook_secret:
+                webhook_url += f"?{urlencode({'token': webhook_secret})}"
+        return cls(path, transcriber, job_queue, webhook_url=webhook_url,
+                   timeout=processing.get('timeout', 300), **kwargs)
+
+    def submit(self, audio_url: str, call_sid: Optional[str], from_number: Optional[str],
+               upload_path: Optional[str] = None, cache_key: Optional[str] = None) -> str:
+        """Send a recording to AssemblyAI and start tracking it
+
+        Args:
+            audio_url: The recording's URL
+            call_sid: The call the recording belongs to
+            from_number: The caller
+            upload_path: A local copy of the recording to upload and
+                transcribe instead of fetching ``audio_url``
+            cache_key: Transcript cache key to store the result under
+
+        Returns:
+            The AssemblyAI transcript id
+        """
+        source = self.transcriber.upload(upload_path) if upload_path else audio_url
+        transcript_id = self.transcriber.submit(source, self.webhook_url)
+        now = time.time()
+        # With a callback on the way, only poll once it is overdue
+        first_poll = now + (self.callback_grace if self.webhook_url else self.poll_interval)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO transcriptions "
+                "(transcript_id, call_sid, from_number, audio_url, cache_key, status, next_poll, submitted_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (transcript_id, call_sid, from_number, audio_url, cache_key, STATUS_PENDING, first_poll, now, now)
+            )
+        return transcript_id
+
+    def handle_callback(self, transcript_id: str, status: str) -> bool:
+        """Record an AssemblyAI completion callback
+
+        Returns:
+            False if the transcript is not one of ours
+        """
+        if self.get(transcript_id) is None:
+            return False
+        if status in FINAL_STATUSES:
+            self._claim(transcript_id)
+        return True
+
+    def _claim(self, transcript_id: str) -> bool:
+        """Hand a finished transcript to the job queue, once"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE transcriptions SET status = ?, updated_at = ? WHERE transcript_id = ? AND status = ?",
+                (STATUS_COMPLETING, time.time(), transcript_id, STATUS_PENDING)
+            )
+        if cursor.rowcount != 1:
+            return False
+        self.job_queue.enqueue('complete_transcription', {'transcript_id': transcript_id})
+        return True
+
+    def fetch(self, transcript_id: str) -> Dict[str, Any]:
+        """Read a finished transcript along with the call it belongs to
+
+        Raises:
+            KeyError: If the transcript is not tracked here
+        """
+        job = self.get(transcript_id)
+        if job is None:
+            raise KeyError(transcript_id)
+        job.update(self.transcriber.get(transcript_id))
+        return job
+
+    def finish(self, transcript_id: str, error: Optional[str] = None):
+        """Mark a transcript as stored, or as failed with ``error``"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE transcriptions SET status = ?, error = ?, updated_at = ? WHERE transcript_id = ?",
+                (STATUS_FAILED if error else STATUS_COMPLETED, error, time.time(), transcript_id)
+            )
+
+    def get(self, transcript_id: str) -> Optional[Dict[str, Any]]:
+        """Return a tracked transcript, or None if it does not exist"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT transcript_id, call_sid, from_number, audio_url, status, polls, error, submitted_at, "
+                "cache_key FROM transcriptions WHERE transcript_id = ?",
+                (transcript_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'transcriptId': row[0],
+            'callSid': row[1],
+            'fromNumber': row[2],
+            'audioUrl': row[3],
+            'jobStatus': row[4],
+            'polls': row[5],
+            'jobError': row[6],
+            'submittedAt': row[7],
+            'cacheKey': row[8]
+        }
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of transcripts in each status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM transcriptions GROUP BY status").fetchall()
+        counts = {status: 0 for status in (STATUS_PENDING, STATUS_COMPLETING, STATUS_COMPLETED, STATUS_FAILED)}
+        counts.update(dict(rows))
+        return counts
+
+    # Polling fallback
+
+    def _due(self, limit: int):
+        """Lease up to ``limit`` pending transcripts whose next poll is due
+
+        Pushing ``next_poll`` forward in the same transaction keeps other
+        processes sharing the table from polling them too.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    "SELECT transcript_id, polls, submitted_at FROM transcriptions "
+                    "WHERE status = ? AND next_poll <= ? ORDER BY next_poll LIMIT ?",
+                    (STATUS_PENDING, now, limit)
+                ).fetchall()
+                for transcript_id, polls, _ in rows:
+                    backoff = self.poll_interval * 2 ** min(polls, 4)
+                    self._conn.execute(
+                        "UPDATE transcriptions SET polls = polls + 1, next_poll = ?, updated_at = ? "
+                        "WHERE transcript_id = ?",
+                        (now + backoff, now, transcript_id)
+                    )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def _poll(self, transcript_id: str, submitted_at: float):
+        try:
+            status = self.transcriber.get(transcript_id)['status']
+        except Exception as e:
+            logger.warning(f"Error checking transcript {transcript_id}: {str(e)}")
+            status = None
+        if status in FINAL_STATUSES:
+            self._claim(transcript_id)
+        elif time.time() - submitted_at > self.timeout:
+            logger.error(f"Transcript {transcript_id} not ready after {self.timeout}s; giving up")
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE transcriptions SET status = ?, error = ?, updated_at = ? "
+                    "WHERE transcript_id = ? AND status = ?",
+                    (STATUS_FAILED, 'timed out', time.time(), transcript_id, STATUS_PENDING)
+                )
+
+    def poll_once(self) -> int:
+        """Check every due transcript, ``poll_concurrency`` at a time
+
+        Returns:
+            The number of transcripts checked
+        """
+        if breaker('assemblyai').is_open:
+            # Leave them due; polling now would only fail and run down their timeout
+            return 0
+        rows = self._due(self.poll_concurrency * 4)
+        if not rows:
+            return 0
+        futures = [self._executor.submit(self._poll, transcript_id, submitted_at)
+                   for transcript_id, _, submitted_at in rows]
+        for future in futures:
+            future.result()
+        return len(rows)
+
+    def start(self):
+        """Start the polling thread"""
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(self.poll_concurrency, thread_name_prefix='eventflow-transcript-poll')
+
+        def run():
+            while not self._stop.wait(self.poll_interval):
+                try:
+                    self.poll_once()
+                except Exception as e:
+                    logger.error(f"Error polling transcripts: {str(e)}")
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run, name='eventflow-transcript-poller', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop polling; pending transcripts are picked up on the next start"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.poll_interval + 5)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        with self._lock:
+            self._conn.close()
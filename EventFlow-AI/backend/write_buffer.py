@@ -0,0 +1,194 @@
+"""Write-behind batching for Airtable creates and updates
+
+Airtable accepts up to 10 records per create/update request. BatchWriter
+collects pending writes per table and operation, and sends them as one
+request when 10 are waiting or the oldest has waited ``max_delay`` seconds.
+Each caller gets a Future resolving to its own record from the response.
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Tuple
+
+from airtable_client import AirtableClient, AirtableError, MAX_RECORDS_PER_REQUEST
+
+logger = logging.getLogger(__name__)
+
+OP_CREATE = 'create'
+OP_UPDATE = 'update'
+
+
+class _PendingWrite:
+    """A queued record plus every caller waiting on it"""
+
+    __slots__ = ('record_id', 'fields', 'futures', 'enqueued_at')
+
+    def __init__(self, record_id: Optional[str], fields: Dict[str, Any]):
+        self.record_id = record_id
+        self.fields = dict(fields)
+        self.futures: List[Future] = [Future()]
+        self.enqueued_at = time.monotonic()
+
+
+class BatchWriter:
+    """Coalesces Airtable writes into batched requests"""
+
+    def __init__(self, client: AirtableClient, batch_size: int = MAX_RECORDS_PER_REQUEST,
+                 max_delay: float = 0.2, senders: int = 5):
+        self.client = client
+        self.batch_size = min(batch_size, MAX_RECORDS_PER_REQUEST)
+        self.max_delay = max_delay
+        self._pending: Dict[Tuple[str, str], List[_PendingWrite]] = {}
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+        self._batches: 'queue.Queue[Optional[Tuple[str, str, List[_PendingWrite]]]]' = queue.Queue()
+        self._senders = [
+            threading.Thread(target=self._send_loop, name=f"eventflow-airtable-{index}", daemon=True)
+            for index in range(senders)
+        ]
+        for sender in self._senders:
+            sender.start()
+        self._thread = threading.Thread(target=self._run, name='eventflow-batch-writer', daemon=True)
+        self._thread.start()
+
+    def create(self, table: str, fields: Dict[str, Any]) -> Future:
+        """Queue a record for creation
+
+        Returns:
+            A Future resolving to the created Airtable record
+        """
+        return self._submit(OP_CREATE, table, _PendingWrite(None, fields))
+
+    def update(self, table: str, record_id: str, fields: Dict[str, Any]) -> Future:
+        """Queue a patch; patches to the same pending record are merged
+
+        Returns:
+            A Future resolving to the updated Airtable record
+        """
+        return self._submit(OP_UPDATE, table, _PendingWrite(record_id, fields))
+
+    def _submit(self, op: str, table: str, pending: _PendingWrite) -> Future:
+        # Merging and queueing under one lock keeps a record id to a single
+        # entry per batch; Airtable rejects a PATCH that repeats an id.
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchWriter is closed")
+            items = self._pending.setdefault((op, table), [])
+            if op == OP_UPDATE:
+                for queued in items:
+                    if queued.record_id == pending.record_id:
+                        queued.fields.update(pending.fields)
+                        future = Future()
+                        queued.futures.append(future)
+                        return future
+            items.append(pending)
+            self._cond.notify()
+        return pending.futures[0]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batches = self._take_ready_batches()
+                while not batches:
+                    if self._closed and not self._pending:
+                        return
+                    self._cond.wait(self._next_deadline())
+                    batches = self._take_ready_batches()
+                self._in_flight += len(batches)
+            for batch in batches:
+                self._batches.put(batch)
+
+    def _send_loop(self):
+        while True:
+            batch = self._batches.get()
+            if batch is None:
+                return
+            self._send(*batch)
+
+    def _take_ready_batches(self) -> List[Tuple[str, str, List[_PendingWrite]]]:
+        """Pop every batch that is full or past its deadline (lock held)"""
+        now = time.monotonic()
+        force = self._closed or self._flush_requested
+        batches = []
+        for (op, table), items in list(self._pending.items()):
+            while items and (force or len(items) >= self.batch_size
+                             or now - items[0].enqueued_at >= self.max_delay):
+                batches.append((op, table, items[:self.batch_size]))
+                del items[:self.batch_size]
+            if not items:
+                del self._pending[(op, table)]
+        if not self._pending:
+            self._flush_requested = False
+        return batches
+
+    def _next_deadline(self) -> Optional[float]:
+        """Seconds until the oldest pending write is due (lock held)"""
+        if not self._pending:
+            return None
+        oldest = min(items[0].enqueued_at for items in self._pending.values())
+        return max(0.0, oldest + self.max_delay - time.monotonic())
+
+    def _send(self, op: str, table: str, items: List[_PendingWrite]):
+        try:
+            if op == OP_CREATE:
+                response = self.client.create_records(table, [item.fields for item in items])
+            else:
+                response = self.client.update_records(
+                    table, [{"id": item.record_id, "fields": item.fields} for item in items]
+                )
+            if response.status_code != 200:
+                raise AirtableError(f"Airtable error: {response.text}")
+            records = response.json().get('records', [])
+            if len(records) != len(items):
+                raise AirtableError(f"Airtable returned {len(records)} records for a batch of {len(items)}")
+            for item, record in zip(items, records):
+                for future in item.futures:
+                    future.set_result(record)
+        except Exception as e:
+            logger.error(f"Batched Airtable {op} on {table} failed: {str(e)}")
+            for item in items:
+                for future in item.futures:
+                    if not future.done():
+                        future.set_exception(e)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        """Number of writes waiting to be sent"""
+        with self._cond:
+            return sum(len(items) for items in self._pending.values())
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Send everything pending now and wait for the requests to finish
+
+        Returns:
+            True if the buffer drained before the timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 30.0):
+        """Flush pending writes and stop the background threads"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self.flush(timeout)
+        for _ in self._senders:
+            self._batches.put(None)
+        for sender in self._senders:
+            sender.join(timeout)
@@ -85,15 +85,9 @@ const handleBulkSMS = async () => {
   }
 };
 
-const handleGenerateReport = async () => {
-  try {
-    const response = await fetch('https://eventflow-ai-backend.onrender.com/api/reports');
-    const data = await response.json();
-    alert('Report: ' + JSON.stringify(data));
-  } catch (error) {
-    console.error('Error generating report:', error);
-    alert('Error: ' + error.message);
-  }
+const handleGenerateReport = () => {
+  // Streamed CSV download; the browser saves it as it arrives
+  window.location.assign('https://eventflow-ai-backend.onrender.com/api/reports?type=leads&format=csv');
 };
 
   return (
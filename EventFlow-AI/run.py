@@ -1,28 +1,116 @@
 #!/usr/bin/env python3
 """
 EventFlow-AI Startup Script
-This script provides a convenient way to start the backend server.
+Starts the backend with a pre-forking gunicorn server for production, or the
+Flask development server with --dev.
+
+    python run.py           # WEB_CONCURRENCY workers x WEB_THREADS threads
+    python run.py --dev     # single-process development server
+
+The app and SDKs are loaded once in the master and shared by the forked
+workers. Each worker then opens its own databases and starts its background
+threads. On SIGTERM workers finish in-flight requests and running jobs and
+push pending writes to Airtable before exiting (up to GRACEFUL_TIMEOUT).
 """
 
+import argparse
+import glob
+import multiprocessing
 import os
 import sys
 
 # Add backend directory to path
-backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
+backend_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend')
 sys.path.insert(0, backend_dir)
 
+
+def run_dev(settings):
+    from app import create_app
+    print("Starting EventFlow-AI development server...")
+    print(f"Server running at http://localhost:{settings.port}")
+    # No reloader: it would run a second copy of the background services
+    create_app(settings).run(host='0.0.0.0', port=settings.port, debug=settings.debug, use_reloader=False)
+
+
+def run_production(settings, workers, threads):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        # Not installed, or a platform without fork (Windows)
+        print("gunicorn is not available on this platform; using the development server")
+        run_dev(settings)
+        return
+
+    import app as app_module
+    from services import recover_jobs
+
+    class EventFlowServer(BaseApplication):
+        def load_config(self):
+            options = {
+                'bind': f"{os.getenv('HOST', '0.0.0.0')}:{settings.port}",
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread',
+                'preload_app': True,
+                'graceful_timeout': int(os.getenv('GRACEFUL_TIMEOUT', 60)),
+                'timeout': int(os.getenv('WORKER_TIMEOUT', 60)),
+                'keepalive': 5,
+                'on_starting': on_starting,
+                'post_fork': post_fork,
+                'worker_exit': worker_exit
+            }
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            app_module.preload_sdks()
+            return app_module.create_app(settings, start_services=False)
+
+    def on_starting(server):
+        recover_jobs(settings)
+        if settings.metrics_dir:
+            # Samples from the previous run would otherwise be added to this one's
+            for path in glob.glob(os.path.join(settings.metrics_dir, '*.json')):
+                os.remove(path)
+
+    def post_fork(server, worker):
+        app_module.init_services(settings, recover_jobs=False)
+
+    def worker_exit(server, worker):
+        app_module.shutdown_services()
+
+    print(f"Starting EventFlow-AI on port {settings.port} with {workers} workers x {threads} threads")
+    EventFlowServer().run()
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Start the EventFlow-AI backend")
+    parser.add_argument('--dev', action='store_true', help="run the Flask development server")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count())))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('WEB_THREADS', 4)))
+    args = parser.parse_args()
+
     # Change to backend directory
     os.chdir(backend_dir)
-    
-    # Import and run the Flask app
+
     try:
-        from app import app
-        print("Starting EventFlow-AI Backend Server...")
-        print("Server running at http://localhost:5000")
-        app.run(debug=True, host='0.0.0.0', port=5000)
+        from dotenv import load_dotenv
+        load_dotenv()
+        if not args.dev and args.workers > 1 and not os.getenv('METRICS_DIR'):
+            # Let every worker's metrics reach /metrics
+            os.environ['METRICS_DIR'] = os.path.join(os.getenv('DATA_DIR') or os.path.join(backend_dir, 'data'),
+                                                     'metrics')
+
+        from settings import load_settings
+        settings = load_settings()
     except ImportError as e:
         print(f"Error: {e}")
         print("Please make sure you have installed the requirements:")
         print("  pip install -r requirements.txt")
         sys.exit(1)
+
+    if args.dev:
+        run_dev(settings)
+    else:
+        run_production(settings, args.workers, args.threads)
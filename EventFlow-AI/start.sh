@@ -58,8 +58,8 @@ start_backend() {
         exit 1
     fi
     
-    # Start Flask server
-    python3 app.py &
+    # Start the server (pre-forking gunicorn; see run.py)
+    python3 ../run.py &
     BACKEND_PID=$!
     echo "Backend started with PID: $BACKEND_PID"
     cd ..